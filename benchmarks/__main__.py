@@ -0,0 +1,6 @@
+# benchmarks/__main__.py
+
+from .run import main
+
+if __name__ == '__main__':
+    main()
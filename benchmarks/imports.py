@@ -0,0 +1,103 @@
+# benchmarks/imports.py
+
+import json
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Third-party packages that dominate start-up time
+HEAVY_MODULES = ['numpy', 'pandas', 'matplotlib', 'matplotlib.pyplot']
+
+# Import-time budget of the package's own entry points: (module, time budget
+# in ms on top of the heavy packages it loads, heavy packages it must not load).
+# Analysis and ingestion (and their worker processes) must start without
+# matplotlib; the command line must start without any heavy package.
+IMPORT_BUDGETS = [
+    ('src.config', 20, ['numpy', 'pandas', 'matplotlib']),
+    ('src.cli', 60, ['numpy', 'pandas', 'matplotlib']),
+    ('src.pipeline', 60, ['numpy', 'pandas', 'matplotlib']),
+    ('src.data_processing', 100, ['matplotlib']),
+    ('src.cluster_stats', 100, ['matplotlib']),
+    ('src.analysis', 100, ['matplotlib']),
+    ('src.slopes', 100, ['matplotlib']),
+    ('src.rendering', 150, []),
+]
+
+# Run in a fresh interpreter: time the import and list the heavy packages it loaded
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in sys.argv[2:]:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({'s': elapsed, 'loaded': [m for m in json.loads(sys.argv[1]) if m in sys.modules]}))
+"""
+
+
+def _probe(modules):
+    out = subprocess.run([sys.executable, '-c', _PROBE, json.dumps(HEAVY_MODULES)] + list(modules),
+                         cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def measure_import_times(budgets=None, repeats=5):
+    """
+    Measures the import time of every entry point of the package in fresh
+    interpreters (the start-up cost of a spawned worker process) and checks
+    it against its budget.
+
+    The cost of the heavy packages a module loads is measured separately and
+    subtracted, so that the budget covers the package's own import overhead
+    and does not depend on how fast numpy or pandas load on this machine.
+
+    Args:
+        budgets (list): (module, budget_ms, forbidden) tuples. Defaults to
+                        IMPORT_BUDGETS.
+        repeats (int): Fresh interpreters per measurement; the median is kept.
+
+    Returns:
+        list: One dict per module with 'total_ms', 'heavy_ms', 'own_ms',
+              'budget_ms', 'loaded', 'forbidden_loaded' and 'ok'.
+    """
+    if budgets is None:
+        budgets = IMPORT_BUDGETS
+    heavy_ms = {}
+    results = []
+    for module, budget_ms, forbidden in budgets:
+        probes = [_probe([module]) for _ in range(repeats)]
+        total_ms = _median([p['s'] for p in probes]) * 1000
+        loaded = probes[0]['loaded']
+        key = tuple(loaded)
+        if key not in heavy_ms:
+            heavy_ms[key] = _median([_probe(loaded)['s'] for _ in range(repeats)]) * 1000 if loaded else 0.0
+        own_ms = max(total_ms - heavy_ms[key], 0.0)
+        forbidden_loaded = [m for m in loaded if m.split('.')[0] in forbidden]
+        results.append({
+            'module': module,
+            'total_ms': total_ms,
+            'heavy_ms': heavy_ms[key],
+            'own_ms': own_ms,
+            'budget_ms': budget_ms,
+            'loaded': loaded,
+            'forbidden_loaded': forbidden_loaded,
+            'ok': own_ms <= budget_ms and not forbidden_loaded,
+        })
+    return results
+
+
+def print_import_times(results):
+    """Prints the import-time table; returns whether every budget is met."""
+    print(f"{'module':<22}{'total ms':>10}{'own ms':>9}{'budget':>8}  heavy packages")
+    for r in results:
+        flag = '' if r['ok'] else '  OVER BUDGET' if not r['forbidden_loaded'] \
+            else f"  loads {', '.join(r['forbidden_loaded'])}"
+        print(f"{r['module']:<22}{r['total_ms']:>10.0f}{r['own_ms']:>9.0f}{r['budget_ms']:>8}  "
+              f"{', '.join(r['loaded']) or '-'}{flag}")
+    return all(r['ok'] for r in results)
@@ -0,0 +1,297 @@
+# benchmarks/run.py
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from src import config
+from src.instrumentation import children_peak_rss_mb, cpu_seconds, peak_rss_mb, reset_peak_rss
+from src.prefetch import prefetch_counters, reset_prefetch_counters
+from . import synthetic
+from .imports import measure_import_times, print_import_times
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_OUTPUT_DIR = os.path.join(ROOT_DIR, 'results', 'benchmarks')
+
+
+# --- Measurement ---
+
+def time_stage(name, func, rows=None, quiet=True):
+    """
+    Runs one stage and measures it.
+
+    Args:
+        name (str): Stage name used in the report.
+        func (callable): The stage, called without arguments.
+        rows (callable): Optional callable returning the number of rows the
+                         stage processed, evaluated after it ran.
+        quiet (bool): Suppress the stage's own progress output.
+
+    Returns:
+        dict: Wall and CPU time (including worker processes), rows and
+              rows/s, and peak RSS of the main and worker processes.
+    """
+    peak_resettable = reset_peak_rss()
+    cpu_start = cpu_seconds()
+    start = time.perf_counter()
+    output = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+    with output:
+        func()
+    wall = time.perf_counter() - start
+    result = {
+        'name': name,
+        'wall_s': wall,
+        'cpu_s': cpu_seconds() - cpu_start,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_is_per_stage': peak_resettable,
+        'peak_rss_children_mb': children_peak_rss_mb(),
+    }
+    if rows is not None:
+        n = rows()
+        result['rows'] = n
+        result['rows_per_s'] = n / wall if wall > 0 else None
+    return result
+
+
+# --- Stages ---
+
+def _count_csv_rows(paths):
+    n = 0
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                n += sum(1 for _ in f) - 1
+    return n
+
+
+def _subbox_csv_paths():
+    paths = []
+    for base, prefix in [(config.OVERDENSE_BASE_DIR, 'CD_OD1'), (config.UNDERDENSE_BASE_DIR, 'CD_UD1')]:
+        paths += [os.path.join(base, f'subbox{i}', f'{prefix}_SF_SB{i}.csv')
+                  for i in range(1, config.NUM_SUBBOXES + 1)]
+    return paths
+
+
+def get_stages():
+    """
+    The benchmarked stages in pipeline order, as (name, run, rows) tuples.
+    Per-redshift analysis results are passed on to the plotting stage so that
+    plotting is timed separately from the analysis. The cluster_stats stage
+    rewrites the control files from the Cluster_stat files.
+    """
+    from src import data_processing, analysis, rendering
+
+    results = {}
+
+    def control_files():
+        data_processing.create_control_file(config.CD_OD1_SF_EB_CSV, config.CD_OD1_CS_EB_CSV)
+        data_processing.create_control_file(config.CD_UD1_SF_EB_CSV, config.CD_UD1_CS_EB_CSV)
+
+    def cluster_stats():
+        from src.cluster_stats import load_cluster_stats, percolation_onset
+        results['cluster_stats'] = stats = load_cluster_stats()
+        percolation_onset(stats)
+        data_processing.create_control_file_from_cluster_stats('CD_OD1', config.CD_OD1_CS_EB_CSV, stats)
+        data_processing.create_control_file_from_cluster_stats('CD_UD1', config.CD_UD1_CS_EB_CSV, stats)
+
+    def ingest():
+        data_processing.process_all_subboxes([(config.OVERDENSE_BASE_DIR, 'CD_OD1'),
+                                              (config.UNDERDENSE_BASE_DIR, 'CD_UD1')])
+
+    def combine():
+        data_processing.create_shapefinders_all_small_box_csv()
+        data_processing.generate_common_redshifts_txt()
+
+    def sb_analysis():
+        results['sb'] = analysis.run_sb_analysis()
+
+    def per_redshift_analysis():
+        with open(config.COMMON_REDSHIFTS_TXT, 'r') as f:
+            z_list = [float(l.strip()) for l in f if l.strip()]
+        results['shapefinders'] = [analysis.process_shapefinders_for_redshift(z) for z in z_list]
+        results['txb'] = analysis.process_txb_for_redshifts(config.FIVE_Z_FOR_TXB)
+
+    def plotting():
+        for _ in rendering.render_shapefinder_plots(results['shapefinders']):
+            pass
+        rendering.render_summary_plots(results.get('sb'), results['txb'])
+
+    eb_csvs = [config.CD_OD1_SF_EB_CSV, config.CD_UD1_SF_EB_CSV]
+    return [
+        ('control_files', control_files, lambda: _count_csv_rows(eb_csvs)),
+        ('cluster_stats', cluster_stats, lambda: len(results['cluster_stats'])),
+        ('process_subboxes', ingest, lambda: _count_csv_rows(_subbox_csv_paths())),
+        ('combine', combine, lambda: _count_csv_rows(_subbox_csv_paths())),
+        ('sb_analysis', sb_analysis, lambda: _count_csv_rows(eb_csvs)),
+        ('per_redshift_analysis', per_redshift_analysis,
+         lambda: _count_csv_rows([config.SHAPEFINDERS_ALL_SMALL_BOX_CSV])),
+        ('plotting', plotting, lambda: len(results['shapefinders'])),
+    ]
+
+
+# --- Report ---
+
+def _git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment():
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': _git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmarks(workdir, n_clusters, n_redshifts=20, n_subboxes=8, seed=0,
+                   workers=None, stages=None, regenerate=False, quiet=True):
+    """
+    Generates (or reuses) a synthetic dataset and times every pipeline stage on it.
+
+    Args:
+        workdir (str): Scratch directory holding the dataset and all outputs.
+        n_clusters (int): Clusters per region over all snapshots.
+        n_redshifts (int): Number of snapshots.
+        n_subboxes (int): Number of sub-boxes per region.
+        seed (int): Seed of the synthetic data.
+        workers (int): Worker processes for ingest and rendering. Defaults to
+                       the values in `config`.
+        stages (list): Names of the stages to report. Stages up to the last
+                       selected one run, since each depends on the earlier ones.
+        regenerate (bool): Regenerate the dataset even if a matching one exists.
+        quiet (bool): Suppress the stages' own progress output.
+
+    Returns:
+        dict: Report with the environment, dataset summary and per-stage timings.
+    """
+    params = {'n_clusters': n_clusters, 'n_redshifts': n_redshifts,
+              'n_subboxes': n_subboxes, 'seed': seed}
+    manifest = synthetic.load_manifest(workdir)
+    reuse = (not regenerate and manifest is not None
+             and all(manifest.get(k) == v for k, v in params.items()))
+    if reuse:
+        print(f"Reusing synthetic dataset in {workdir}")
+        synthetic.configure_workspace(workdir)
+        generation = None
+    else:
+        start = time.perf_counter()
+        manifest = synthetic.generate_dataset(workdir, **params)
+        generation = {'wall_s': time.perf_counter() - start}
+    config.NUM_SUBBOXES = n_subboxes
+    config.FIVE_Z_FOR_TXB = manifest['redshifts'][:5]
+    if workers is not None:
+        config.INGEST_WORKERS = workers
+        config.RENDER_WORKERS = workers
+
+    all_stages = get_stages()
+    names = [name for name, _, _ in all_stages]
+    if stages is not None:
+        unknown = [name for name in stages if name not in names]
+        if unknown:
+            raise ValueError(f"Unknown stage(s) {unknown}, expected some of {names}")
+        all_stages = all_stages[:max(names.index(name) for name in stages) + 1]
+
+    timings = []
+    for name, func, rows in all_stages:
+        print(f"Running {name} ...")
+        reset_prefetch_counters()
+        timing = time_stage(name, func, rows, quiet=quiet)
+        peak = timing['peak_rss_mb']
+        print(f"  {timing['wall_s']:.2f} s, peak RSS " + (f"{peak:.0f} MB" if peak is not None else "n/a"))
+        prefetched = prefetch_counters()
+        if prefetched['files']:
+            timing['prefetch'] = prefetched
+            print(f"  read {prefetched['files']} files ahead, overlap efficiency "
+                  f"{prefetched['overlap_efficiency']:.0%}")
+        if stages is None or name in stages:
+            timings.append(timing)
+
+    return {
+        'environment': _environment(),
+        'dataset': manifest,
+        'generation': generation,
+        'settings': {
+            'ingest_workers': config.INGEST_WORKERS,
+            'render_workers': config.RENDER_WORKERS,
+            'catalog_cache': config.USE_CATALOG_CACHE,
+            'streaming': config.STREAMING,
+            'memory_budget_mb': config.MEMORY_BUDGET_MB,
+            'prefetch_depth': config.PREFETCH_DEPTH,
+            'prefetch_threads': config.PREFETCH_THREADS,
+            'read_buffer_kb': config.READ_BUFFER_KB,
+            'io_throttle': config.IO_THROTTLE,
+        },
+        'stages': timings,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description="Time the pipeline stages on a synthetic SURFGEN dataset.")
+    parser.add_argument('--clusters', type=float, default=1e5,
+                        help="clusters per region over all snapshots (default: 1e5)")
+    parser.add_argument('--redshifts', type=int, default=20, help="number of snapshots (default: 20)")
+    parser.add_argument('--subboxes', type=int, default=8, help="sub-boxes per region (default: 8)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes for ingest and rendering (default: from config)")
+    parser.add_argument('--workdir', default=os.path.join(ROOT_DIR, 'benchmarks', 'workdir'),
+                        help="scratch directory for the dataset and outputs")
+    parser.add_argument('--stages', nargs='+', default=None, help="only report these stages")
+    parser.add_argument('--prefetch', type=int, default=None, metavar='DEPTH',
+                        help="raw files read ahead of the parser, 0 to disable (default: from config)")
+    parser.add_argument('--io-throttle', default=None, metavar='LATENCY_MS,MB_PER_S',
+                        help="throttle raw file reads like a slow shared filesystem, e.g. 20,50")
+    parser.add_argument('--regenerate', action='store_true', help="regenerate the dataset")
+    parser.add_argument('--verbose', action='store_true', help="show the stages' own output")
+    parser.add_argument('--output', default=None,
+                        help="JSON report path (default: results/benchmarks/benchmark_<timestamp>.json)")
+    parser.add_argument('--imports', action='store_true',
+                        help="only measure the import time of the package's entry points against "
+                             "their budgets; exits with status 1 if one is over budget")
+    args = parser.parse_args(argv)
+
+    if args.prefetch is not None:
+        config.PREFETCH_DEPTH = args.prefetch
+    if args.io_throttle is not None:
+        config.IO_THROTTLE = args.io_throttle
+
+    if args.imports:
+        imports = measure_import_times()
+        within_budget = print_import_times(imports)
+        report = {'environment': _environment(), 'imports': imports}
+    else:
+        within_budget = True
+        report = run_benchmarks(args.workdir, int(args.clusters), args.redshifts, args.subboxes,
+                                seed=args.seed, workers=args.workers, stages=args.stages,
+                                regenerate=args.regenerate, quiet=not args.verbose)
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output = os.path.join(DEFAULT_OUTPUT_DIR, f'benchmark_{stamp}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark report written to {output}")
+    if not within_budget:
+        sys.exit(1)
@@ -0,0 +1,241 @@
+# benchmarks/synthetic.py
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from src import config
+
+# Region directories below the raw data root, as in the real SURFGEN output
+REGIONS = [
+    ('CD_OD1', 'CD_overdensity_SURFGEN'),
+    ('CD_UD1', 'CD_underdensity_SURFGEN'),
+]
+# Power-law index of the cluster volume distribution (in grid cells)
+VOLUME_SLOPE = 1.2
+# Filling factor of each region at the lowest and highest redshift; the
+# percolating cluster grows or shrinks so that every snapshot matches
+FF_RANGE = {'CD_OD1': (0.999, 0.2), 'CD_UD1': (1e-3, 0.4)}
+# Number of columns in a raw Shapefinders_copy row
+RAW_COLUMNS = 14
+# Description of a generated dataset, stored in its root directory
+MANIFEST = 'dataset.json'
+# Clusters holding more than this fraction of the ionized volume are
+# reported as percolating in the synthetic Cluster_stat files
+PERCOLATING_LCS = 0.5
+
+
+def configure_workspace(root):
+    """
+    Points every input and output path of `config` into a scratch directory
+    laid out like the repository, so benchmarks never touch the real data.
+    """
+    root = os.path.abspath(root)
+    config.DATA_DIR = os.path.join(root, 'data')
+    config.RAW_DATA_DIR = os.path.join(config.DATA_DIR, 'raw')
+    config.PROCESSED_DATA_DIR = os.path.join(config.DATA_DIR, 'processed')
+    config.CATALOG_CACHE_DIR = os.path.join(config.DATA_DIR, 'cache')
+    config.RESULTS_CACHE_DIR = os.path.join(config.CATALOG_CACHE_DIR, 'results')
+    config.RESULTS_DIR = os.path.join(root, 'results')
+    config.PLOTS_DIR = os.path.join(config.RESULTS_DIR, 'plots')
+    config.RESULTS_DATA_DIR = os.path.join(config.RESULTS_DIR, 'data')
+    config.INSTRUMENT_REPORT_DIR = os.path.join(config.RESULTS_DIR, 'instrumentation')
+
+    config.SHAPEFINDERS_ALL_SMALL_BOX_CSV = os.path.join(config.PROCESSED_DATA_DIR, 'shapefinders_all_small_box.csv')
+    config.SHAPEFINDERS_ALL_THRESHOLDS_CSV = os.path.join(config.PROCESSED_DATA_DIR, 'shapefinders_all_thresholds.csv')
+    config.CD_OD1_SF_EB_CSV = os.path.join(config.PROCESSED_DATA_DIR, 'CD_OD1_SF_EB.csv')
+    config.CD_UD1_SF_EB_CSV = os.path.join(config.PROCESSED_DATA_DIR, 'CD_UD1_SF_EB.csv')
+    config.CD_OD1_CS_EB_CSV = os.path.join(config.PROCESSED_DATA_DIR, 'CD_OD1_CS_EB.csv')
+    config.CD_UD1_CS_EB_CSV = os.path.join(config.PROCESSED_DATA_DIR, 'CD_UD1_CS_EB.csv')
+    config.COMMON_REDSHIFTS_TXT = os.path.join(config.RESULTS_DATA_DIR, 'common_redshifts.txt')
+    config.SLOPES_CSV = os.path.join(config.RESULTS_DATA_DIR, 'slopes.csv')
+    config.PIPELINE_STATE_JSON = os.path.join(config.RESULTS_DATA_DIR, 'pipeline_state.json')
+
+    raw_dirs = dict(REGIONS)
+    config.OVERDENSE_BASE_DIR = os.path.join(config.RAW_DATA_DIR, raw_dirs['CD_OD1'], 'output1/Shapefinder_stat/small_box/')
+    config.UNDERDENSE_BASE_DIR = os.path.join(config.RAW_DATA_DIR, raw_dirs['CD_UD1'], 'output1/Shapefinder_stat/small_box/')
+    config.REGION_RAW_DIRS = {prefix: os.path.join(config.RAW_DATA_DIR, raw_dir) for prefix, raw_dir in REGIONS}
+    for d in [config.PROCESSED_DATA_DIR, config.PLOTS_DIR, config.RESULTS_DATA_DIR]:
+        os.makedirs(d, exist_ok=True)
+
+
+def redshift_grid(n_redshifts, z_min=9.0, z_max=19.0):
+    """Snapshot redshifts, rounded to 3 decimals like the SURFGEN file names."""
+    return np.round(np.linspace(z_min, z_max, n_redshifts), 3)
+
+
+def synthetic_clusters(rng, n, cells_total=None, filling_factor=None):
+    """
+    Draws n clusters with realistic shapefinder relations, in grid units.
+
+    Volumes follow a power law. Thickness, breadth and length grow with volume
+    like those of ionized bubbles (near-spherical when small, increasingly
+    filamentary when large), and the area and integrated mean curvature follow
+    from the shapefinder definitions T = 3V/S, B = S/C and L = C/(4*pi).
+    If cells_total and filling_factor are given, the first cluster becomes
+    the percolating one, sized so that all clusters fill that fraction.
+
+    Returns:
+        dict: Arrays 'V', 'S', 'C', 'Genus', 'T', 'B', 'L' of length n.
+    """
+    V = np.floor(rng.pareto(VOLUME_SLOPE, n) * 4.0 + 1.0)
+    if n and cells_total is not None:
+        V[0] = max(filling_factor * cells_total - V[1:].sum(), V.max())
+    T = 0.62 * V ** 0.2 * rng.lognormal(0.0, 0.1, n)
+    B = T * V ** 0.08 * rng.lognormal(0.05, 0.1, n)
+    L = 3.0 * V / (4.0 * np.pi * T * B)
+    S = 3.0 * V / T
+    C = S / B
+    genus = (rng.poisson(0.05 * V ** 0.7) - rng.binomial(1, 0.1, n)).astype(np.float64)
+    return {'V': V, 'S': S, 'C': C, 'Genus': genus, 'T': T, 'B': B, 'L': L}
+
+
+def _filling_factors(prefix, z_values):
+    ff_lo, ff_hi = FF_RANGE[prefix]
+    return np.geomspace(ff_lo, ff_hi, len(z_values))
+
+
+def write_raw_snapshot(path, rng, n, subbox_cells, filling_factor):
+    """
+    Writes one raw `Shapefinders_copy.z*` file with n clusters: a comment
+    header and RAW_COLUMNS whitespace-separated columns, of which the
+    pipeline reads volume (2), area (3), genus (5), IMC (6) and the three
+    unordered, signed shapefinders (8-10).
+    """
+    c = synthetic_clusters(rng, n, subbox_cells, filling_factor)
+    shapefinders = np.column_stack([c['T'], c['B'], c['L']])
+    # Raw files carry the shapefinders in no particular order or sign
+    order = np.argsort(rng.random((n, 3)), axis=1)
+    shapefinders = np.take_along_axis(shapefinders, order, axis=1)
+    shapefinders *= rng.choice([-1.0, 1.0], size=(n, 3), p=[0.1, 0.9])
+    rows = np.zeros((n, RAW_COLUMNS))
+    rows[:, 0] = np.arange(n)
+    rows[:, 1] = c['V']
+    rows[:, 2] = c['V']
+    rows[:, 3] = c['S']
+    rows[:, 5] = c['Genus']
+    rows[:, 6] = c['C']
+    rows[:, 8:11] = shapefinders
+    rows[:, 11:] = rng.normal(size=(n, RAW_COLUMNS - 11))
+    with open(path, 'w') as f:
+        f.write('# id ncell V S chi G C <r> sf1 sf2 sf3 x y z\n')
+        pd.DataFrame(rows).to_csv(f, sep=' ', header=False, index=False, float_format='%.6f')
+    return c
+
+
+def write_cluster_stat(path, clusters, cells_total, rho_th=1.0):
+    """
+    Writes the `Cluster_stat_copy.z*` file of one snapshot, whose FF and LCS
+    match the given clusters (from `synthetic_clusters`).
+    """
+    V = clusters['V']
+    total = V.sum()
+    count_max = V.max() if len(V) else 0.0
+    lcs = count_max / total if total > 0 else 0.0
+    row = [rho_th, len(V), total, cells_total, total / cells_total, int(lcs > PERCOLATING_LCS),
+           count_max, lcs, 1, count_max, count_max, 1, count_max]
+    with open(path, 'w') as f:
+        f.write('# rho_th NC Total_count NIJK FF percolation_no count_max LCS '
+                'NN_max count_max_vol vol_max NN_max_vol vol_max_count\n')
+        f.write(' '.join(repr(float(v)) for v in row) + '\n')
+
+
+def physical_catalog(c, z):
+    """Clusters from `synthetic_clusters` as a processed (*_SF_EB.csv) table."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        P = (c['B'] - c['T']) / (c['B'] + c['T'])
+        F = (c['L'] - c['B']) / (c['L'] + c['B'])
+    cell = config.CELL_SIZE_MPC_H
+    return pd.DataFrame({
+        'redshift': np.full(len(c['V']), z),
+        'Volume_phys': c['V'] * cell ** 3,
+        'Area_phys': c['S'] * cell ** 2,
+        'Genus': c['Genus'],
+        'IMC_phys': c['C'] * cell,
+        'L_phys': c['L'] * cell,
+        'B_phys': c['B'] * cell,
+        'T_phys': c['T'] * cell,
+        'P': P,
+        'F': F,
+    })
+
+
+def generate_dataset(root, n_clusters, n_redshifts=20, n_subboxes=8, seed=0, log=print):
+    """
+    Generates a synthetic dataset in a scratch directory: raw sub-box
+    snapshot files and Cluster_stat files (sub-boxes and entire box) for
+    both regions, and the processed entire-box catalogs.
+
+    Args:
+        root (str): Scratch directory, configured with `configure_workspace`.
+        n_clusters (int): Clusters per region summed over all snapshots, for
+                          the sub-boxes and the entire box each.
+        n_redshifts (int): Number of snapshots.
+        n_subboxes (int): Number of sub-boxes per region.
+        seed (int): Seed of the random generator.
+        log (callable): Progress output.
+
+    Returns:
+        dict: Summary with the redshifts and the number of files and rows written.
+    """
+    configure_workspace(root)
+    config.NUM_SUBBOXES = n_subboxes
+    rng = np.random.default_rng(seed)
+    z_values = redshift_grid(n_redshifts)
+    box_cells = config.GRID_SIZE ** 3
+    per_file = max(1, n_clusters // (n_subboxes * n_redshifts))
+    per_snapshot = max(1, n_clusters // n_redshifts)
+    n_files, raw_rows, eb_rows = 0, 0, 0
+
+    for prefix, raw_dir in REGIONS:
+        log(f"Generating {prefix}: {n_subboxes} sub-boxes x {n_redshifts} snapshots x {per_file} clusters")
+        base = os.path.join(config.RAW_DATA_DIR, raw_dir, 'output1/Shapefinder_stat/small_box')
+        stat_base = os.path.join(config.RAW_DATA_DIR, raw_dir, 'output1/Cluster_stat')
+        ffs = _filling_factors(prefix, z_values)
+        for i in range(1, n_subboxes + 1):
+            subbox_dir = os.path.join(base, f'subbox{i}')
+            stat_dir = os.path.join(stat_base, 'small_box', f'subbox{i}')
+            os.makedirs(subbox_dir, exist_ok=True)
+            os.makedirs(stat_dir, exist_ok=True)
+            for z, ff in zip(z_values, ffs):
+                path = os.path.join(subbox_dir, f'Shapefinders_copy.z{z:.6f}_scen0_subbox{i}')
+                clusters = write_raw_snapshot(path, rng, per_file, box_cells / n_subboxes, ff)
+                write_cluster_stat(os.path.join(stat_dir, f'Cluster_stat_copy.z{z:.6f}_scen0_subbox{i}'),
+                                   clusters, box_cells / n_subboxes)
+                n_files += 1
+                raw_rows += per_file
+
+        # Entire-box catalog, written one snapshot at a time
+        eb_path = config.CD_OD1_SF_EB_CSV if prefix == 'CD_OD1' else config.CD_UD1_SF_EB_CSV
+        os.makedirs(os.path.join(stat_base, 'subbox0'), exist_ok=True)
+        with open(eb_path, 'w', newline='') as f:
+            for j, (z, ff) in enumerate(zip(z_values, ffs)):
+                clusters = synthetic_clusters(rng, per_snapshot, box_cells, ff)
+                write_cluster_stat(os.path.join(stat_base, 'subbox0', f'Cluster_stat_copy.z{z:.6f}_scen0_subbox0'),
+                                   clusters, box_cells)
+                df = physical_catalog(clusters, z)
+                df.to_csv(f, index=False, header=(j == 0))
+                eb_rows += len(df)
+
+    summary = {
+        'n_clusters': n_clusters,
+        'n_redshifts': n_redshifts,
+        'n_subboxes': n_subboxes,
+        'seed': seed,
+        'redshifts': [float(z) for z in z_values],
+        'raw_files': n_files,
+        'raw_rows': raw_rows,
+        'eb_rows': eb_rows,
+    }
+    with open(os.path.join(root, MANIFEST), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def load_manifest(root):
+    """Summary written by `generate_dataset` for an existing dataset, or None."""
+    try:
+        with open(os.path.join(root, MANIFEST), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -1,15 +1,47 @@
 # src/analysis.py
 
+import os
 import pandas as pd
 import numpy as np
 from . import config
+from .catalog import load_catalog, open_catalog, catalog_signature
+from .stats import (grouped_binned_stats, bin_catalog, quantity_values, quantile_label, volume_bin_edges,
+                    check_band_quantiles, DEFAULT_QUANTITIES)
+from .streaming import stream_select_redshifts, stream_binned_stats
+from .snapshots import canonical_redshift, build_snapshot_index, snapshot
+from .filling_factor import build_ff_map, resolve_ff_targets
+from .instrumentation import add_rows
+from .results_cache import code_fingerprint, load_results, results_key, source_fingerprint, store_results
+from .columnar import columnar_snapshot_index
+from .compact import compact_frame
+from .resampling import (
+    unit_bin_sums,
+    jackknife_errors,
+    bootstrap_errors,
+    cluster_jackknife_errors,
+    cluster_bootstrap_errors
+)
+
+# Memoized output of get_small_box_binned_stats, keyed by catalog version and
+# options; only the entries of the current catalog version are kept, so the
+# shapefinders (with resampling errors) and txb (without) statistics coexist
+_SMALL_BOX_STATS = {}
+
+def _results_code_fingerprint():
+    """
+    Hash of the code that determines the binned statistics kept in the
+    results cache: this module and every package module it imports, loaders
+    included.
+    """
+    from .pipeline import _code_closure
+    return code_fingerprint(_code_closure(['analysis.py']))
 
 def find_snapshot_redshift(df_ff_map, target_ff):
     """
     Finds the redshift of the snapshot that has the filling factor closest to the target.
+    For many targets at once, use `filling_factor.resolve_ff_targets`.
     """
-    closest_idx = (df_ff_map['FF'] - target_ff).abs().idxmin()
-    return df_ff_map.loc[closest_idx, 'redshift']
+    return resolve_ff_targets(build_ff_map(df_ff_map), [target_ff])['z'].iloc[0]
 
 def get_binned_statistic(df, bins):
     """
@@ -23,162 +55,553 @@ def get_binned_statistic(df, bins):
     binned_df['vol_center'] = [np.sqrt(bin.left * bin.right) if bin.left > 0 else 0 for bin in binned_df.index]
     return binned_df.dropna(subset=['vol_center'])
 
-def run_sb_analysis():
+def _load_redshift_rows(csv_path, z_values=None):
+    """
+    Loads a catalog with rounded redshifts, either whole or, when z_values is
+    given, streaming only the rows of those snapshots.
+    """
+    if z_values is None:
+        df = load_catalog(csv_path)
+    else:
+        df = stream_select_redshifts(csv_path, z_values)
+    df.columns = df.columns.str.strip()
+    if 'redshift' in df.columns:
+        df['redshift'] = canonical_redshift(df['redshift'])
+    return df
+
+def _load_snapshot_index(csv_path, z_values=None):
+    """
+    Snapshot index of an entire-box catalog: its memory-mapped columnar
+    cache, or, when z_values is given, the streamed rows of those snapshots.
+    """
+    if z_values is None:
+        return open_catalog(csv_path, 'redshift')
+    return build_snapshot_index(_load_redshift_rows(csv_path, z_values), 'redshift')
+
+def load_subbox_catalogs(base_directory, region_prefix, num_subboxes=None, z_values=None):
+    """
+    Loads the shapefinder CSVs of all sub-boxes of one region into a single
+    table with an extra 'subbox' column, returned as a snapshot index
+    (see `snapshots.build_snapshot_index`).
+
+    Args:
+        num_subboxes (int): Number of sub-boxes. Defaults to `config.NUM_SUBBOXES`.
+        z_values (list): If given, only the rows of these redshifts are read,
+                         streaming through each file in bounded chunks.
+    """
+    if num_subboxes is None:
+        num_subboxes = config.NUM_SUBBOXES
+    frames = []
+    for i in range(1, num_subboxes + 1):
+        f = f"{base_directory}subbox{i}/{region_prefix}_SF_SB{i}.csv"
+        try:
+            df_sb = load_catalog(f) if z_values is None else stream_select_redshifts(f, z_values)
+        except FileNotFoundError:
+            print(f"Warning: Sub-box file not found, skipping: {f}")
+            continue
+        df_sb['subbox'] = i
+        frames.append(df_sb)
+    if not frames:
+        return None
+    return build_snapshot_index(pd.concat(frames, ignore_index=True), 'redshift')
+
+def _resampled_subbox_errors(df, method):
+    """
+    Jackknife or bootstrap error of the binned statistic of all sub-boxes
+    combined, resampling whole sub-boxes. Same layout as the scatter estimate.
+    """
+    categories = df['vol_bin'].cat.categories
+    bin_codes = df['vol_bin'].cat.codes.to_numpy()
+    inside = bin_codes >= 0
+    columns = [c for c in df.select_dtypes(include=['number']).columns if c != 'subbox']
+    subbox_ids, unit = np.unique(df['subbox'].to_numpy()[inside], return_inverse=True)
+    values = df[columns].to_numpy(dtype=np.float64)[inside]
+    S0, S1, S2 = unit_bin_sums(unit, bin_codes[inside], len(subbox_ids), len(categories),
+                               values, np.ones(len(values)))
+    if method == 'jackknife':
+        mean_err, _ = jackknife_errors(S0, S1, S2)
+    else:
+        mean_err, _ = bootstrap_errors(S0, S1, S2, config.N_BOOTSTRAP, config.BOOTSTRAP_SEED)
+    occupied = S0.sum(axis=0) > 0
+    if not occupied.any():
+        return pd.DataFrame()
+    index = pd.CategoricalIndex(categories[occupied], categories=categories, name='vol_bin')
+    errors = pd.DataFrame(mean_err[occupied], columns=columns, index=index)
+    # The bin centre is fixed by the bin edges and has no sampling error
+    errors['vol_center'] = 0.0
+    return errors
+
+def get_subbox_errors(df_sb_z, bins, method='std'):
+    """
+    Error of the binned statistic estimated from the sub-boxes, for all
+    sub-boxes at once.
+
+    With method='std' this is the standard deviation across sub-boxes of the
+    binned statistic of each sub-box, equivalent to applying
+    `get_binned_statistic` to every sub-box separately and taking
+    `pd.concat(results).groupby(level=0).std()`. With 'jackknife' or
+    'bootstrap' it is the resampling error of the combined sub-box statistic,
+    leaving out or resampling whole sub-boxes.
+    """
+    df = df_sb_z[df_sb_z['Volume_phys'] > 0].copy()
+    if df.empty or bins is None or len(bins) < 2:
+        return pd.DataFrame()
+    df['vol_bin'] = pd.cut(df['Volume_phys'], bins=bins, right=False)
+    if method != 'std':
+        return _resampled_subbox_errors(df, method)
+    binned_df = df.groupby(['vol_bin', 'subbox'], observed=True).mean(numeric_only=True)
+    if binned_df.empty:
+        return pd.DataFrame()
+    intervals = pd.IntervalIndex(binned_df.index.get_level_values('vol_bin'))
+    left = np.asarray(intervals.left, dtype=float)
+    right = np.asarray(intervals.right, dtype=float)
+    binned_df['vol_center'] = np.where(left > 0, np.sqrt(left * right), 0)
+    return binned_df.groupby(level='vol_bin', observed=True).std()
+
+def _binned_with_subbox_errors(eb_index, sb_index, z, error_method='std'):
+    """
+    Binned statistic of the entire box at redshift z, and its error estimated
+    from the scatter between sub-boxes in the same bins. Both catalogs are
+    given as snapshot indexes.
+
+    Returns:
+        tuple: (binned statistic, errors, volume bin edges or None).
+    """
+    data_z_eb = snapshot(eb_index, z)
+    if data_z_eb.empty:
+        return pd.DataFrame(), pd.DataFrame(), None
+    if config.BINNING_STRATEGY == 'log':
+        min_vol, max_vol = np.log10(data_z_eb['Volume_phys'].min()), np.log10(data_z_eb['Volume_phys'].max())
+        log_bins = np.logspace(min_vol, max_vol, num=config.NUM_BINS)
+    else:
+        log_bins = volume_bin_edges(data_z_eb['Volume_phys'], config.NUM_BINS - 1, config.BINNING_STRATEGY)
+    binned_eb = get_binned_statistic(data_z_eb, bins=log_bins)
+    if sb_index is None:
+        return binned_eb, pd.DataFrame(), log_bins
+    return binned_eb, get_subbox_errors(snapshot(sb_index, z), bins=log_bins, method=error_method), log_bins
+
+def _by_bin_number(binned, log_bins):
+    """A binned table indexed by bin number (0 = smallest volumes) instead of interval."""
+    if binned.empty:
+        return binned
+    # Interval labels carry rounded edges; match them to the nearest bin edge
+    lefts = np.log([interval.left for interval in binned.index])
+    numbers = np.abs(lefts[:, None] - np.log(log_bins[:-1])[None, :]).argmin(axis=1)
+    return binned.set_axis(pd.Index(numbers, name='vol_bin'))
+
+def _interpolated_binned(lo, hi, frac):
+    """
+    Binned statistic and errors between two snapshots, interpolated linearly
+    bin by bin: every column of the i-th volume bin of one snapshot (the bin
+    centre included) with those of the i-th bin of the other. lo and hi are
+    `_binned_with_subbox_errors` outputs; bins missing in either are dropped.
+    """
+    tables = []
+    for table_lo, table_hi in [(lo[0], hi[0]), (lo[1], hi[1])]:
+        table_lo, table_hi = _by_bin_number(table_lo, lo[2]), _by_bin_number(table_hi, hi[2])
+        if frac == 0 or table_lo.empty or table_hi.empty:
+            tables.append(table_lo if frac == 0 else pd.DataFrame())
+            continue
+        rows = table_lo.index.intersection(table_hi.index)
+        cols = table_lo.columns.intersection(table_hi.columns)
+        tables.append((1 - frac) * table_lo.loc[rows, cols] + frac * table_hi.loc[rows, cols])
+    return tables[0], tables[1]
+
+def _resolved_binned(binned, target, interpolate):
+    """
+    Binned statistic and errors of one resolved FF target (a row of
+    `resolve_ff_targets`) from the per-snapshot results in binned. With
+    interpolate, tables are indexed by bin number; targets outside the FF
+    range of the control file fall back to the nearest snapshot.
+    """
+    if not interpolate:
+        return binned[target.z][:2]
+    if np.isnan(target.frac):
+        return _interpolated_binned(binned[target.z], binned[target.z], 0.0)
+    return _interpolated_binned(binned[target.z_lo], binned[target.z_hi], target.frac)
+
+def _snapshots_needed(resolved, interpolate):
+    """Distinct snapshot redshifts needed for the resolved FF targets."""
+    z_values = resolved['z'] if not interpolate else pd.concat(
+        [resolved['z'][resolved['frac'].isna()], resolved['z_lo'], resolved['z_hi']])
+    return sorted(set(z_values.dropna()))
+
+def _encode_binned(binned):
+    """
+    A `_binned_with_subbox_errors` result as one flat table for the results
+    cache: the rows of both tables with their part (0 = statistic, 1 =
+    errors) and volume bin number, and the header entries to rebuild them.
+    """
+    binned_eb, errors, log_bins = binned
+    frames, tables = [], []
+    for part, table in enumerate([binned_eb, errors]):
+        tables.append({'columns': list(table.columns), 'ordered': bool(getattr(table.index, 'ordered', False))})
+        if len(table.columns):
+            frames.append(table.reset_index(drop=True).assign(_part=part, _bin=getattr(table.index, 'codes', -1)))
+    flat = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame({'_part': [], '_bin': []})
+    meta = {'log_bins': None if log_bins is None else [float(b) for b in log_bins], 'tables': tables}
+    return flat, meta
+
+def _decode_binned(flat, header):
+    """Inverse of `_encode_binned`: tables indexed by the same 'vol_bin' intervals as `pd.cut`."""
+    if header['log_bins'] is None:
+        return pd.DataFrame(), pd.DataFrame(), None
+    log_bins = np.array(header['log_bins'])
+    categories = pd.cut(pd.Series([], dtype=float), bins=log_bins, right=False).cat.categories
+    tables = []
+    for part, entry in enumerate(header['tables']):
+        if not entry['columns']:
+            tables.append(pd.DataFrame())
+            continue
+        rows = flat[flat['_part'] == part]
+        bins = pd.Categorical.from_codes(rows['_bin'].to_numpy(dtype=np.int64), categories, ordered=entry['ordered'])
+        tables.append(rows[entry['columns']].set_axis(pd.CategoricalIndex(bins, name='vol_bin')))
+    return tables[0], tables[1], log_bins
+
+def _cached_sb_binned(eb_csv, base_directory, region_prefix, z_values, error_method, streaming):
+    """
+    Looks up the `_binned_with_subbox_errors` results of one region in the
+    results cache.
+
+    Returns:
+        tuple: ({z: result} of the cached snapshots, {z: cache key} of the others).
+    """
+    subbox_csvs = [f"{base_directory}subbox{i}/{region_prefix}_SF_SB{i}.csv"
+                   for i in range(1, config.NUM_SUBBOXES + 1)]
+    parts = {
+        'result': 'sb_binned',
+        'catalog': source_fingerprint(eb_csv),
+        'subboxes': [source_fingerprint(f) for f in subbox_csvs],
+        'n_bins': config.NUM_BINS,
+        'binning': _binning_parts(),
+        'errors': error_method,
+        'streaming': streaming,
+        'code': _results_code_fingerprint(),
+    }
+    if error_method == 'bootstrap':
+        parts['bootstrap'] = [config.N_BOOTSTRAP, config.BOOTSTRAP_SEED]
+    cached, missing = {}, {}
+    for z in z_values:
+        key = results_key({**parts, 'z': repr(float(z))})
+        hit = load_results(key)
+        if hit is None:
+            missing[z] = key
+        else:
+            cached[z] = _decode_binned(*hit)
+    return cached, missing
+
+def run_sb_analysis(error_method=None, streaming=None, targets=None, interpolate=False):
     """
     Runs the main analysis from the old SB_anal.py script.
+
+    All targets are resolved to snapshots with one sorted search per control
+    file, and every snapshot is binned once however many targets use it, so
+    FF sweeps with hundreds of targets cost about as much as the default four.
+
+    Args:
+        error_method (str): Sub-box error estimate, 'std', 'jackknife' or
+                            'bootstrap'. Defaults to `config.SB_ERROR_METHOD`.
+        streaming (bool): Read only the snapshots matching the targets
+                          from the entire-box and sub-box catalogs, chunk by
+                          chunk, instead of loading them whole. Defaults to
+                          `config.STREAMING`.
+        targets (array-like): Target filling factors. Defaults to `config.TARGET_FFS`.
+        interpolate (bool): Interpolate the binned statistics and errors
+                            between the two snapshots bracketing each target,
+                            instead of using the nearest snapshot.
+
+    Returns:
+        dict: Per target FF, the binned statistics and errors of both regions,
+              and 'resolution', the `resolve_ff_targets` row of each region.
     """
+    if error_method is None:
+        error_method = config.SB_ERROR_METHOD
+    if streaming is None:
+        streaming = config.STREAMING
+    if targets is None:
+        targets = config.TARGET_FFS
     # --- Load Data ---
     try:
-        print(f"Loading entire box (emission) data from: {config.CD_OD1_SF_EB_CSV}")
-        df_emi_eb = pd.read_csv(config.CD_OD1_SF_EB_CSV)
-        print(f"Loading entire box (absorption) data from: {config.CD_UD1_SF_EB_CSV}")
-        df_abs_eb = pd.read_csv(config.CD_UD1_SF_EB_CSV)
         print("Loading control files for redshift mapping...")
-        df_ff_emi_map = pd.read_csv(config.CD_OD1_CS_EB_CSV)
-        df_ff_abs_map = pd.read_csv(config.CD_UD1_CS_EB_CSV)
-        for df in [df_emi_eb, df_abs_eb, df_ff_emi_map, df_ff_abs_map]:
-            df.columns = df.columns.str.strip()
-            if 'redshift' in df.columns:
-                df['redshift'] = df['redshift'].round(5)
+        df_ff_emi_map = _load_redshift_rows(config.CD_OD1_CS_EB_CSV)
+        df_ff_abs_map = _load_redshift_rows(config.CD_UD1_CS_EB_CSV)
+        # The control files are small; resolving the targets first lets the
+        # streaming mode read just the snapshots that are needed
+        resolved_emi = resolve_ff_targets(build_ff_map(df_ff_emi_map), targets)
+        resolved_abs = resolve_ff_targets(build_ff_map(df_ff_abs_map), targets)
+        z_emi_all = _snapshots_needed(resolved_emi, interpolate)
+        z_abs_all = _snapshots_needed(resolved_abs, interpolate)
+        # Snapshots binned by an earlier run with the same inputs come from the
+        # results cache; catalogs are only loaded for the others
+        binned_emi, missing_emi = _cached_sb_binned(config.CD_OD1_SF_EB_CSV, config.OVERDENSE_BASE_DIR, 'CD_OD1',
+                                                    z_emi_all, error_method, streaming)
+        binned_abs, missing_abs = _cached_sb_binned(config.CD_UD1_SF_EB_CSV, config.UNDERDENSE_BASE_DIR, 'CD_UD1',
+                                                    z_abs_all, error_method, streaming)
+        if missing_emi:
+            print(f"Loading entire box (emission) data from: {config.CD_OD1_SF_EB_CSV}")
+            emi_eb_index = _load_snapshot_index(config.CD_OD1_SF_EB_CSV, list(missing_emi) if streaming else None)
+        if missing_abs:
+            print(f"Loading entire box (absorption) data from: {config.CD_UD1_SF_EB_CSV}")
+            abs_eb_index = _load_snapshot_index(config.CD_UD1_SF_EB_CSV, list(missing_abs) if streaming else None)
     except FileNotFoundError as e:
         print(f"\n---FATAL ERROR---")
         print(f"Could not find a required CSV file: {e.filename}")
         exit()
 
+    # Every catalog is indexed by snapshot once; each snapshot is then a slice lookup
+    if missing_emi or missing_abs:
+        print("Loading sub-box data...")
+    if missing_emi:
+        emi_sb_index = load_subbox_catalogs(config.OVERDENSE_BASE_DIR, 'CD_OD1',
+                                            z_values=list(missing_emi) if streaming else None)
+    if missing_abs:
+        abs_sb_index = load_subbox_catalogs(config.UNDERDENSE_BASE_DIR, 'CD_UD1',
+                                            z_values=list(missing_abs) if streaming else None)
+
+    # --- Bin every needed snapshot once ---
+    print(f"Binning {len(missing_emi)} emission and {len(missing_abs)} absorption snapshots "
+          f"for {len(resolved_emi)} FF targets ({len(binned_emi) + len(binned_abs)} cached)...")
+    for z, key in missing_emi.items():
+        binned_emi[z] = _binned_with_subbox_errors(emi_eb_index, emi_sb_index, z, error_method)
+        flat, meta = _encode_binned(binned_emi[z])
+        store_results(key, flat, meta=meta)
+    for z, key in missing_abs.items():
+        binned_abs[z] = _binned_with_subbox_errors(abs_eb_index, abs_sb_index, z, error_method)
+        flat, meta = _encode_binned(binned_abs[z])
+        store_results(key, flat, meta=meta)
+
     results = {}
     # --- Main Analysis Loop ---
-    for i, ff_target in enumerate(config.TARGET_FFS):
+    for target_emi, target_abs in zip(resolved_emi.itertuples(index=False), resolved_abs.itertuples(index=False)):
+        ff_target = target_emi.target
         print(f"--- Processing FF ≈ {ff_target} ---")
-        z_emi = find_snapshot_redshift(df_ff_emi_map, ff_target)
-        z_abs = find_snapshot_redshift(df_ff_abs_map, ff_target)
-
-        # --- Process Emission Regions ---
-        emi_data_z_eb = df_emi_eb[df_emi_eb['redshift'] == z_emi]
-        if not emi_data_z_eb.empty:
-            min_vol_emi, max_vol_emi = np.log10(emi_data_z_eb['Volume_phys'].min()), np.log10(emi_data_z_eb['Volume_phys'].max())
-            log_bins_emi = np.logspace(min_vol_emi, max_vol_emi, num=config.NUM_BINS)
-            emi_binned_eb = get_binned_statistic(emi_data_z_eb, bins=log_bins_emi)
-            sb_results_emi = []
-            overdense_sf_files_sb = [
-                f"{config.OVERDENSE_BASE_DIR}subbox{i}/CD_OD1_SF_SB{i}.csv"
-                for i in range(1, 9)
-            ]
-            for f in overdense_sf_files_sb:
-                try:
-                    df_sb = pd.read_csv(f)
-                    df_sb_z = df_sb[df_sb['redshift'].round(5) == z_emi]
-                    sb_results_emi.append(get_binned_statistic(df_sb_z, bins=log_bins_emi))
-                except FileNotFoundError:
-                    print(f"Warning: Sub-box file not found, skipping: {f}")
-            errors_emi = pd.concat(sb_results_emi).groupby(level=0, observed=True).std() if sb_results_emi else pd.DataFrame()
-        else:
-            emi_binned_eb, errors_emi = pd.DataFrame(), pd.DataFrame()
-
-        # --- Process Absorption Regions ---
-        abs_data_z_eb = df_abs_eb[df_abs_eb['redshift'] == z_abs]
-        if not abs_data_z_eb.empty:
-            min_vol_abs, max_vol_abs = np.log10(abs_data_z_eb['Volume_phys'].min()), np.log10(abs_data_z_eb['Volume_phys'].max())
-            log_bins_abs = np.logspace(min_vol_abs, max_vol_abs, num=config.NUM_BINS)
-            abs_binned_eb = get_binned_statistic(abs_data_z_eb, bins=log_bins_abs)
-            sb_results_abs = []
-            underdense_sf_files_sb = [
-                f"{config.UNDERDENSE_BASE_DIR}subbox{i}/CD_UD1_SF_SB{i}.csv"
-                for i in range(1, 9)
-            ]
-            for f in underdense_sf_files_sb:
-                try:
-                    df_sb = pd.read_csv(f)
-                    df_sb_z = df_sb[df_sb['redshift'].round(5) == z_abs]
-                    sb_results_abs.append(get_binned_statistic(df_sb_z, bins=log_bins_abs))
-                except FileNotFoundError:
-                    print(f"Warning: Sub-box file not found, skipping: {f}")
-            errors_abs = pd.concat(sb_results_abs).groupby(level=0, observed=True).std() if sb_results_abs else pd.DataFrame()
-        else:
-            abs_binned_eb, errors_abs = pd.DataFrame(), pd.DataFrame()
-        
+
+        # --- Process Emission and Absorption Regions ---
+        emi_binned_eb, errors_emi = _resolved_binned(binned_emi, target_emi, interpolate)
+        abs_binned_eb, errors_abs = _resolved_binned(binned_abs, target_abs, interpolate)
+
         results[ff_target] = {
             'emi_binned_eb': emi_binned_eb,
             'errors_emi': errors_emi,
             'abs_binned_eb': abs_binned_eb,
-            'errors_abs': errors_abs
+            'errors_abs': errors_abs,
+            'resolution': {'emi': target_emi._asdict(), 'abs': target_abs._asdict()},
         }
     return results
 
-def process_shapefinders_for_redshift(z_value):
-    # 1) Load the CSV and filter by redshift
+def _cluster_resampling_errors(df, n_bins, method, quantities=DEFAULT_QUANTITIES, strategy='log'):
+    """
+    Jackknife or bootstrap errors, resampling clusters, of the binned weighted
+    means and stds of every redshift. Rows line up with `grouped_binned_stats`.
+    """
+    df, group_values, group_edges, flat, inside = bin_catalog(df, 'z', 'vol', n_bins, strategy=strategy)
+    size = group_edges.shape[0] * (group_edges.shape[1] - 1)
+    values = np.column_stack([quantity_values(df, q)[inside] for q in quantities])
+    weights = df['vol'].to_numpy(dtype=np.float64)[inside]
+    if method == 'jackknife':
+        mean_err, std_err = cluster_jackknife_errors(flat, size, values, weights)
+    else:
+        mean_err, std_err = cluster_bootstrap_errors(flat, size, values, weights,
+                                                     config.N_BOOTSTRAP, config.BOOTSTRAP_SEED)
+    occupied = np.bincount(flat, minlength=size) > 0
+    errors = {}
+    for j, q in enumerate(quantities):
+        errors[f'{q}_mean_err'] = mean_err[occupied, j]
+        errors[f'{q}_std_err'] = std_err[occupied, j]
+    return errors
+
+def get_small_box_binned_stats(n_bins=8, errors=None, streaming=None, binning=None):
+    """
+    Volume-weighted binned statistics of the combined small-box catalog for
+    every redshift, computed in a single pass and memoized per catalog version.
+
+    Args:
+        n_bins (int): Number of volume bins per redshift (log-spaced by default).
+        errors (str): None, or 'jackknife'/'bootstrap' to add '<q>_mean_err'
+                      and '<q>_std_err' columns from resampling the clusters.
+        streaming (bool): Accumulate the statistics chunk by chunk instead of
+                          loading the catalog. Defaults to `config.STREAMING`.
+                          Cluster resampling errors need the whole catalog and
+                          are not available in this mode.
+        binning (str): Volume binning strategy (see `stats.grouped_bin_edges`).
+                       Defaults to `config.BINNING_STRATEGY`. Streaming mode
+                       only supports 'log'.
+    """
+    return _small_box_stats_entry(n_bins, errors, streaming, binning)[0]
+
+def _small_box_stats_entry(n_bins=8, errors=None, streaming=None, binning=None):
+    """Memoized (stats, snapshot index of stats) for `get_small_box_binned_stats`."""
+    if streaming is None:
+        streaming = config.STREAMING
+    if binning is None:
+        binning = config.BINNING_STRATEGY
+    if streaming and errors is not None:
+        raise ValueError("Cluster resampling errors are not available in streaming mode.")
+    if streaming and binning != 'log':
+        raise ValueError(f"Binning strategy '{binning}' is not available in streaming mode.")
+    probs = _band_probs()
+    if streaming and probs is not None:
+        raise ValueError("Weighted medians and quantiles are not available in streaming mode.")
     fn = config.SHAPEFINDERS_ALL_SMALL_BOX_CSV
-    df = pd.read_csv(fn)
-    df_z = df[(df['z'] == z_value) & (df['vol'] > 0)].copy()
-    vol = df_z['vol'].values
-
-    # 2) Define log‐spaced bins in vol (8 bins)
-    from .utils import bin_edges_for_vol, weighted_mean, weighted_std, loglog_fit
-    edges = bin_edges_for_vol(vol, n_bins=8)
-
-    # 3) Prepare containers for weighted means & stds
-    vol_mean, vol_std = [], []
-    T_mean, T_std = [], []
-    B_mean, B_std = [], []
-    L_mean, L_std = [], []
-    P_mean, P_std = [], []
-    F_mean, F_std = [], []
-    G_mean, G_std = [], []
-
-    # 4) Loop over bins
-    for i in range(len(edges) - 1):
-        vmin, vmax = edges[i], edges[i + 1]
-        mask = (vol >= vmin) & (vol < vmax)
-        if not np.any(mask):
-            continue
+    binning_parts = _binning_parts(binning)
+    key = (os.path.abspath(fn), catalog_signature(fn), n_bins, errors, streaming, config.COMPACT_CATALOG,
+           repr(binning_parts), probs)
+    if key not in _SMALL_BOX_STATS:
+        for stale in [k for k in _SMALL_BOX_STATS if k[:2] != key[:2]]:
+            del _SMALL_BOX_STATS[stale]
+        cache_key = results_key(_small_box_stats_parts(fn, n_bins, errors, streaming, binning_parts, probs))
+        cached = load_results(cache_key)
+        if cached is not None:
+            stats, header = cached
+            _SMALL_BOX_STATS[key] = (stats, columnar_snapshot_index(stats, header))
+            return _SMALL_BOX_STATS[key]
+        if streaming:
+            stats = stream_binned_stats(fn, group_col='z', vol_col='vol', n_bins=n_bins)
+        else:
+            df = load_catalog(fn, compact=True) if config.COMPACT_CATALOG else open_catalog(fn)
+            stats = _binned_small_box_stats(df, n_bins, errors, binning, probs)
+        store_results(cache_key, stats, 'z')
+        _SMALL_BOX_STATS[key] = (stats, build_snapshot_index(stats, 'z'))
+    return _SMALL_BOX_STATS[key]
+
+def _binned_small_box_stats(df, n_bins, errors, binning, probs):
+    stats = grouped_binned_stats(df, group_col='z', vol_col='vol', n_bins=n_bins, strategy=binning,
+                                 quantile_probs=probs)
+    add_rows(len(df))
+    if errors is not None:
+        stats = stats.assign(**_cluster_resampling_errors(df, n_bins, errors, strategy=binning))
+    return stats
+
+def snapshot_binned_stats(df, n_bins=8, errors=None, binning=None):
+    """
+    Binned statistics, as in `get_small_box_binned_stats`, of the rows of a
+    few snapshots of the small-box catalog, e.g. the clusters of newly
+    ingested snapshots. Every snapshot is binned on its own, so its rows alone
+    give the same statistics as the whole catalog; only bootstrap errors
+    differ, as the draws depend on the rows of the other snapshots.
+
+    Args:
+        df (pd.DataFrame): Cleaned small-box rows ('z', 'vol', 'T', ...).
+        n_bins, errors, binning: See `get_small_box_binned_stats`.
 
-        bin_data = df_z[mask]
-        vol_vals = bin_data['vol'].values
-        weights = vol_vals  # weight by volume
-
-        # Volume
-        vm = weighted_mean(vol_vals, weights)
-        vs = weighted_std(vol_vals, weights)
-        vol_mean.append(vm)
-        vol_std.append(vs)
-
-        # T, B, L
-        for arr_list, colname in zip(
-            [(T_mean, T_std), (B_mean, B_std), (L_mean, L_std)],
-            ['T', 'B', 'L']
-        ):
-            vals = bin_data[colname].values
-            arr_list[0].append(weighted_mean(vals, weights))
-            arr_list[1].append(weighted_std(vals, weights))
-
-        # Planarity P, Filamentarity F, Genus G
-        for arr_list, colname in zip(
-            [(P_mean, P_std), (F_mean, F_std), (G_mean, G_std)],
-            ['P', 'F', 'Genus']
-        ):
-            vals = bin_data[colname].values
-            arr_list[0].append(weighted_mean(vals, weights))
-            arr_list[1].append(weighted_std(vals, weights))
-
-    # 5) Convert to numpy arrays
-    vol_mean = np.array(vol_mean)
-    vol_std  = np.array(vol_std)
-    T_mean   = np.array(T_mean);   T_std   = np.array(T_std)
-    B_mean   = np.array(B_mean);   B_std   = np.array(B_std)
-    L_mean   = np.array(L_mean);   L_std   = np.array(L_std)
-    P_mean   = np.array(P_mean);   P_std   = np.array(P_std)
-    F_mean   = np.array(F_mean);   F_std   = np.array(F_std)
-    G_mean   = np.array(G_mean);   G_std   = np.array(G_std)
-
-    # 6) Compute log–log fits for T, B, L
-    mT, cT, _ = loglog_fit(vol_mean, T_mean)
-    mB, cB, _ = loglog_fit(vol_mean, B_mean)
-    mL, cL, _ = loglog_fit(vol_mean, L_mean)
-
-    # 7) Compute log–log fits for P, G
-    mP, cP, maskP = loglog_fit(vol_mean, P_mean)
-    mG, cG, maskG = loglog_fit(vol_mean, G_mean)
-    
+    Returns:
+        dict: Snapshot index of the statistics, for `process_shapefinders_for_redshift`.
+    """
+    if binning is None:
+        binning = config.BINNING_STRATEGY
+    if config.COMPACT_CATALOG:
+        df = compact_frame(df)
+    return build_snapshot_index(_binned_small_box_stats(df, n_bins, errors, binning, _band_probs()), 'z')
+
+def _binning_parts(binning=None):
+    """A binning strategy with the configuration values it depends on."""
+    if binning is None:
+        binning = config.BINNING_STRATEGY
+    if binning == 'min_count':
+        return [binning, config.MIN_BIN_COUNT]
+    if binning == 'bayesian_blocks':
+        return [binning, config.BAYESIAN_BLOCKS_FINE_BINS, config.BAYESIAN_BLOCKS_P0]
+    return [binning]
+
+def _band_probs():
+    """Quantiles to compute for the error band of `config.ERROR_BAND`, or None for mean and std only."""
+    if config.ERROR_BAND == 'std':
+        return None
+    check_band_quantiles(*config.BAND_QUANTILES)
+    return tuple(config.BAND_QUANTILES)
+
+def _robust_arrays(stats_z, keys):
+    """
+    Weighted medians, MADs and band quantiles ('<key>_median', '_mad', '_qlo'
+    and '_qhi') of the binned statistics of one redshift, when they were
+    computed; keys maps result keys to quantity names.
+    """
+    probs = _band_probs()
+    if probs is None or f'{next(iter(keys.values()))}_median' not in stats_z.columns:
+        return {}
+    lo, hi = quantile_label(probs[0]), quantile_label(probs[-1])
+    arrays = {}
+    for key, col in keys.items():
+        arrays[f'{key}_median'] = stats_z[f'{col}_median'].to_numpy()
+        arrays[f'{key}_mad'] = stats_z[f'{col}_mad'].to_numpy()
+        arrays[f'{key}_qlo'] = stats_z[f'{col}_{lo}'].to_numpy()
+        arrays[f'{key}_qhi'] = stats_z[f'{col}_{hi}'].to_numpy()
+    return arrays
+
+def _small_box_stats_parts(fn, n_bins, errors, streaming, binning_parts, probs=None):
+    """Results-cache key of `get_small_box_binned_stats`: everything its output depends on."""
+    parts = {
+        'result': 'small_box_stats',
+        'catalog': source_fingerprint(fn),
+        'n_bins': n_bins,
+        'binning': binning_parts,
+        'quantiles': probs,
+        'weights': 'vol',
+        'quantities': DEFAULT_QUANTITIES,
+        'errors': errors,
+        'streaming': streaming,
+        'compact': config.COMPACT_CATALOG,
+        'code': _results_code_fingerprint(),
+    }
+    if errors == 'bootstrap':
+        parts['bootstrap'] = [config.N_BOOTSTRAP, config.BOOTSTRAP_SEED]
+    return parts
+
+def _stats_for_redshift(stats, z_value):
+    """
+    Rows of a grouped statistics table belonging to one redshift, in bin
+    order. stats is the table itself or its snapshot index.
+    """
+    if isinstance(stats, pd.DataFrame):
+        stats = build_snapshot_index(stats, 'z')
+    return snapshot(stats, z_value)
+
+def _mean_std_errors(stats, columns):
+    """
+    Standard errors of the binned means of columns, shaped (column, bin): the
+    resampling errors when they were computed, std/sqrt(count) otherwise.
+    """
+    if all(f'{c}_mean_err' in stats.columns for c in columns):
+        return stats[[f'{c}_mean_err' for c in columns]].to_numpy().T
+    return stats[[f'{c}_std' for c in columns]].to_numpy().T / np.sqrt(stats['count'].to_numpy())
+
+def process_shapefinders_for_redshift(z_value, stats=None, errors=None, n_bins=8):
+    # 1) Look up the binned statistics of this redshift (n_bins volume bins, see config.BINNING_STRATEGY)
+    from .utils import batched_loglog_fit
+    if errors is None:
+        errors = config.SHAPEFINDER_ERROR_METHOD
+    if stats is None:
+        stats = _small_box_stats_entry(n_bins=n_bins, errors=errors)[1]
+    stats_z = _stats_for_redshift(stats, z_value)
+
+    # 2) Weighted means & stds per non-empty bin
+    vol_mean = stats_z['vol_mean'].to_numpy()
+    vol_std  = stats_z['vol_std'].to_numpy()
+    T_mean   = stats_z['T_mean'].to_numpy();     T_std   = stats_z['T_std'].to_numpy()
+    B_mean   = stats_z['B_mean'].to_numpy();     B_std   = stats_z['B_std'].to_numpy()
+    L_mean   = stats_z['L_mean'].to_numpy();     L_std   = stats_z['L_std'].to_numpy()
+    P_mean   = stats_z['P_mean'].to_numpy();     P_std   = stats_z['P_std'].to_numpy()
+    F_mean   = stats_z['F_mean'].to_numpy();     F_std   = stats_z['F_std'].to_numpy()
+    G_mean   = stats_z['Genus_mean'].to_numpy(); G_std   = stats_z['Genus_std'].to_numpy()
+
+    # 3) Log–log fits of T, B, L, P and G, solved together
+    fit_keys = ['T', 'B', 'L', 'P', 'G']
+    fit_cols = ['T', 'B', 'L', 'P', 'Genus']
+    fit = batched_loglog_fit(vol_mean, stats_z[[f'{c}_mean' for c in fit_cols]].to_numpy().T,
+                             yerr=_mean_std_errors(stats_z, fit_cols) if config.WEIGHTED_SLOPE_FITS else None)
+
+    # 4) Resampling errors of the binned means, when they were computed
+    mean_errors = {}
+    if 'T_mean_err' in stats_z.columns:
+        for key, col in [('vol', 'vol'), ('T', 'T'), ('B', 'B'), ('L', 'L'),
+                         ('P', 'P'), ('F', 'F'), ('G', 'Genus')]:
+            mean_errors[f"{key}_err"] = stats_z[f'{col}_mean_err'].to_numpy()
+
+    robust = _robust_arrays(stats_z, {'vol': 'vol', 'T': 'T', 'B': 'B', 'L': 'L', 'P': 'P', 'F': 'F', 'G': 'Genus'})
     return {
+        **mean_errors,
+        **robust,
+        "band": config.ERROR_BAND if robust else 'std',
         "z_value": z_value,
         "vol_mean": vol_mean, "vol_std": vol_std,
         "T_mean": T_mean, "T_std": T_std,
@@ -187,59 +610,35 @@ def process_shapefinders_for_redshift(z_value):
         "P_mean": P_mean, "P_std": P_std,
         "F_mean": F_mean, "F_std": F_std,
         "G_mean": G_mean, "G_std": G_std,
-        "fits": {
-            "T": (mT, cT), "B": (mB, cB), "L": (mL, cL),
-            "P": (mP, cP), "G": (mG, cG)
-        },
-        "masks": {"P": maskP, "G": maskG}
+        "fits": {k: (fit['slope'][i], fit['intercept'][i]) for i, k in enumerate(fit_keys)},
+        "fit_cov": {k: fit['cov'][i] for i, k in enumerate(fit_keys)},
+        "fit_chi2": {k: (fit['chi2'][i], fit['dof'][i]) for i, k in enumerate(fit_keys)},
+        "masks": {"P": fit['mask'][3], "G": fit['mask'][4]}
     }
 
-def process_txb_for_redshifts(z_values):
+def process_txb_for_redshifts(z_values, stats=None, n_bins=8):
     """
-    For each z in z_values, compute T×B in each volume bin.
+    For each z in z_values, compute T×B in each of n_bins volume bins.
     """
     results = {}
-    from .utils import bin_edges_for_vol, weighted_mean, weighted_std
+    if stats is None:
+        stats = _small_box_stats_entry(n_bins=n_bins)[1]
+    elif isinstance(stats, pd.DataFrame):
+        stats = build_snapshot_index(stats, 'z')
     for z in z_values:
-        # Load the CSV and filter
-        fn = config.SHAPEFINDERS_ALL_SMALL_BOX_CSV
-        df = pd.read_csv(fn)
-        df_z = df[(df['z'] == z) & (df['vol'] > 0)].copy()
-        vol = df_z['vol'].values
+        stats_z = _stats_for_redshift(stats, z)
 
-        if vol.size == 0:
+        if stats_z.empty:
             print(f"Warning: No valid data for Txb analysis at z={z}. Skipping.")
             continue
 
-        # Define bins (8 bins)
-        edges = bin_edges_for_vol(vol, n_bins=8)
-
-        vol_mean, vol_std = [], []
-        TXB_mean, TXB_std = [], []
-
-        for i in range(len(edges) - 1):
-            vmin, vmax = edges[i], edges[i + 1]
-            mask = (vol >= vmin) & (vol < vmax)
-            if not np.any(mask):
-                continue
-
-            bin_data = df_z[mask]
-            vol_vals = bin_data['vol'].values
-            weights = vol_vals
-
-            vm = weighted_mean(vol_vals, weights)
-            vs = weighted_std(vol_vals, weights)
-            vol_mean.append(vm)
-            vol_std.append(vs)
-
-            TxB_vals = (bin_data['T'].values * bin_data['B'].values)
-            TXB_mean.append(weighted_mean(TxB_vals, weights))
-            TXB_std.append(weighted_std(TxB_vals, weights))
-
+        robust = _robust_arrays(stats_z, {'vol': 'vol', 'TXB': 'TxB'})
         results[z] = {
-            "vol_mean": np.array(vol_mean),
-            "vol_std": np.array(vol_std),
-            "TXB_mean": np.array(TXB_mean),
-            "TXB_std": np.array(TXB_std)
+            **robust,
+            "band": config.ERROR_BAND if robust else 'std',
+            "vol_mean": stats_z['vol_mean'].to_numpy(),
+            "vol_std": stats_z['vol_std'].to_numpy(),
+            "TXB_mean": stats_z['TxB_mean'].to_numpy(),
+            "TXB_std": stats_z['TxB_std'].to_numpy()
         }
     return results
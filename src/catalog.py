@@ -0,0 +1,158 @@
+# src/catalog.py
+
+import hashlib
+import os
+import pandas as pd
+from . import config
+from .fingerprint import file_signature, file_hash
+from .compact import compact_frame
+from .columnar import (read_header, write_header, write_columnar, open_columnar,
+                       columnar_snapshot_index, snapshot_column)
+from .snapshots import build_snapshot_index
+
+# In-process memo: (absolute CSV path, compact) -> ((size, mtime_ns), DataFrame)
+_MEMO = {}
+
+
+def _cache_dir(csv_path, snapshot_col=None):
+    """
+    Returns the columnar cache directory of a CSV. The name carries a short
+    hash of the absolute path so that equally named CSVs never collide, and
+    the snapshot column the rows are sorted by, if any.
+    """
+    abs_path = os.path.abspath(csv_path)
+    stem = os.path.splitext(os.path.basename(abs_path))[0]
+    tag = hashlib.sha1(abs_path.encode()).hexdigest()[:8]
+    layout = f'.by_{snapshot_col}' if snapshot_col is not None else ''
+    return os.path.join(config.CATALOG_CACHE_DIR, f'{stem}.{tag}{layout}')
+
+
+def _load_with_disk_cache(csv_path, signature, snapshot_col=None, mmap=False):
+    """
+    Loads a CSV through its columnar cache (see `columnar`), rebuilding the
+    cache only when the source file has really changed.
+
+    The cache is trusted as-is when the size and mtime recorded at build time
+    still match. If they differ, the file content hash decides: an unchanged
+    hash (e.g. a file that was only touched or copied) just refreshes the
+    recorded size/mtime, anything else triggers a rebuild from the CSV.
+
+    Returns:
+        tuple: (pd.DataFrame, columnar header).
+    """
+    cache_dir = _cache_dir(csv_path, snapshot_col)
+    header = read_header(cache_dir)
+    size, mtime_ns = signature
+
+    if header is not None:
+        source = header['source']
+        if source['size'] == size and source['mtime_ns'] == mtime_ns:
+            return open_columnar(cache_dir, mmap=mmap)
+        if source['size'] == size and source['sha1'] == file_hash(csv_path):
+            source['mtime_ns'] = mtime_ns
+            write_header(cache_dir, header)
+            return open_columnar(cache_dir, mmap=mmap)
+
+    print(f"Building catalog cache for: {csv_path}")
+    df = pd.read_csv(csv_path)
+    os.makedirs(config.CATALOG_CACHE_DIR, exist_ok=True)
+    write_columnar(df, cache_dir, snapshot_col, meta={'source': {
+        'path': os.path.abspath(csv_path),
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'sha1': file_hash(csv_path),
+    }})
+    return open_columnar(cache_dir, mmap=mmap)
+
+
+def load_catalog(csv_path, compact=False):
+    """
+    Loads a processed CSV catalog, parsing the CSV at most once per process.
+
+    Subsequent calls for an unchanged file return a shallow copy of the
+    in-process memoized DataFrame; copy-on-write keeps the memo intact when a
+    caller modifies its copy, without duplicating the data. When
+    `config.USE_CATALOG_CACHE` is set, the first load goes through a binary
+    columnar cache in `config.CATALOG_CACHE_DIR`, which is rebuilt only when
+    the source CSV changes.
+
+    Args:
+        csv_path (str): Path to the processed CSV file.
+        compact (bool): Return (and memoize) the compact representation of
+                        `compact.compact_frame` instead of float64 columns.
+
+    Returns:
+        pd.DataFrame: The catalog. Raises FileNotFoundError like pd.read_csv.
+    """
+    abs_path = os.path.abspath(csv_path)
+    signature = file_signature(abs_path)
+
+    cached = _MEMO.get((abs_path, compact))
+    if cached is not None and cached[0] == signature:
+        return cached[1].copy(deep=False)
+
+    if config.USE_CATALOG_CACHE:
+        df = _load_with_disk_cache(abs_path, signature)[0]
+    else:
+        df = pd.read_csv(abs_path)
+    if compact:
+        df = compact_frame(df)
+    _MEMO[(abs_path, compact)] = (signature, df)
+    return df.copy(deep=False)
+
+
+def open_catalog(csv_path, snapshot_col=None):
+    """
+    Opens a processed CSV catalog as read-only memory maps of its columnar
+    cache, without parsing or copying it. Worker processes opening the same
+    catalog share its pages.
+
+    Args:
+        csv_path (str): Path to the processed CSV file.
+        snapshot_col (str): Redshift column. If given, the catalog is returned
+                            as a snapshot index (see `snapshots`) whose
+                            snapshots are zero-copy slices.
+
+    Returns:
+        pd.DataFrame or dict: The catalog, or its snapshot index. Without
+                              `config.USE_CATALOG_CACHE` the CSV is parsed.
+    """
+    abs_path = os.path.abspath(csv_path)
+    if not config.USE_CATALOG_CACHE:
+        df = pd.read_csv(abs_path)
+        return df if snapshot_col is None else build_snapshot_index(df, snapshot_col)
+    df, header = _load_with_disk_cache(abs_path, file_signature(abs_path), snapshot_col, mmap=True)
+    return df if snapshot_col is None else columnar_snapshot_index(df, header)
+
+
+def convert_processed_catalogs(directory=None):
+    """
+    Builds the snapshot-sorted columnar cache of every CSV catalog in
+    `config.PROCESSED_DATA_DIR`, indexed by its 'z' or 'redshift' column.
+
+    Returns:
+        list: The converted CSV paths.
+    """
+    if directory is None:
+        directory = config.PROCESSED_DATA_DIR
+    converted = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.csv'):
+            continue
+        csv_path = os.path.join(directory, name)
+        open_catalog(csv_path, snapshot_column(pd.read_csv(csv_path, nrows=0).columns))
+        converted.append(csv_path)
+    return converted
+
+
+def catalog_signature(csv_path):
+    """
+    Returns a cheap (size, mtime_ns) signature of a catalog file, suitable for
+    keying results derived from it.
+    """
+    return file_signature(os.path.abspath(csv_path))
+
+
+def clear_memo():
+    """Drops all in-process memoized catalogs."""
+    _MEMO.clear()
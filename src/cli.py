@@ -0,0 +1,375 @@
+# src/cli.py
+
+import argparse
+import os
+from . import config
+from .instrumentation import measure, write_report
+from .results_cache import print_results_cache_counters
+from .pipeline import CONTROL_FILES, REGIONS, run_pipeline
+
+
+# --- Redshift selection ---
+
+def parse_redshift_spec(spec):
+    """
+    Parses a redshift selection: comma-separated values and inclusive
+    'lo:hi' ranges, where either bound may be omitted, e.g. '10.11,12:14'.
+
+    Returns:
+        list: (lo, hi) pairs; a single value z is (z, z).
+    """
+    ranges = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if ':' in item:
+            lo, hi = item.split(':', 1)
+            ranges.append((float(lo) if lo.strip() else float('-inf'),
+                           float(hi) if hi.strip() else float('inf')))
+        else:
+            ranges.append((float(item), float(item)))
+    return ranges
+
+
+def select_redshifts(specs, available):
+    """
+    Redshifts of available matching any of the selections in specs.
+
+    Single values are matched on the canonical redshift (see `snapshots`);
+    values matching no snapshot are reported and ignored.
+
+    Args:
+        specs (list): Selections in the format of `parse_redshift_spec`, or
+                      None to select everything.
+        available (list): Redshifts to select from.
+
+    Returns:
+        list: The selected redshifts, in the order of available.
+    """
+    from .snapshots import canonical_redshift
+    if specs is None:
+        return list(available)
+    keys = canonical_redshift(list(available)) if len(available) else []
+    selected = set()
+    for spec in specs:
+        for lo, hi in parse_redshift_spec(spec):
+            lo_key, hi_key = canonical_redshift(lo), canonical_redshift(hi)
+            matches = [i for i, key in enumerate(keys) if lo_key <= key <= hi_key]
+            if not matches and lo == hi:
+                print(f"Warning: No snapshot at z={lo}; skipping it.")
+            selected.update(matches)
+    return [z for i, z in enumerate(available) if i in selected]
+
+
+def _common_redshifts():
+    try:
+        with open(config.COMMON_REDSHIFTS_TXT, 'r') as f:
+            return [float(l.strip()) for l in f if l.strip()]
+    except FileNotFoundError:
+        raise SystemExit(f"{config.COMMON_REDSHIFTS_TXT} not found; run 'combine' first.")
+
+
+def _selected_regions(regions, thresholds=None):
+    """
+    (small_box_dir, prefix) of every sub-box tree of the selected regions, at
+    the selected thresholds or at all ingested ones (see `config.ALL_THRESHOLDS`).
+    """
+    from .pipeline import _ingest_regions
+    from .thresholds import split_prefix, threshold_regions
+    if thresholds is None:
+        candidates = _ingest_regions()
+    else:
+        candidates = threshold_regions([(getattr(config, attr), prefix) for attr, prefix in REGIONS],
+                                       all_thresholds=True)
+    names = {split_prefix(prefix)[0] for prefix in regions}
+    return [(path, prefix) for path, prefix in candidates
+            if split_prefix(prefix)[0] in names
+            and (thresholds is None or split_prefix(prefix)[1] in thresholds)]
+
+
+def _raw_redshifts(regions):
+    """Redshifts of the raw snapshot files of the given sub-box trees, sorted."""
+    from .pipeline import _raw_snapshot_files, _SNAPSHOT_PATTERN
+    return sorted({
+        float(_SNAPSHOT_PATTERN.search(os.path.basename(path)).group(1))
+        for path in _raw_snapshot_files(regions)
+    })
+
+
+# --- Commands ---
+
+def cmd_run(args):
+    print("--- Starting Pipeline ---")
+    run_pipeline(dry_run=args.dry_run, force=args.force)
+    print("\n--- Analysis Complete ---")
+
+
+def cmd_ingest(args):
+    from .data_processing import process_all_subboxes
+    if args.prefetch is not None:
+        config.PREFETCH_DEPTH = args.prefetch
+    regions = _selected_regions(args.regions, args.thresholds)
+    redshifts = None
+    if args.z is not None:
+        redshifts = select_redshifts(args.z, _raw_redshifts(regions))
+        if not redshifts:
+            print("No raw snapshots match the selected redshifts.")
+            return
+    process_all_subboxes(regions, num_subboxes=args.subboxes, workers=args.workers, redshifts=redshifts)
+
+
+def cmd_combine(args):
+    from .data_processing import (create_all_thresholds_csv, create_shapefinders_all_small_box_csv,
+                                  generate_common_redshifts_txt)
+    from .pipeline import _ingest_regions
+    if config.ALL_THRESHOLDS:
+        create_all_thresholds_csv(_ingest_regions(), small_box_csv=config.SHAPEFINDERS_ALL_SMALL_BOX_CSV)
+    else:
+        create_shapefinders_all_small_box_csv(streaming=args.streaming)
+    generate_common_redshifts_txt(streaming=args.streaming)
+
+
+def cmd_control(args):
+    from .pipeline import _run_control_file
+    if args.source is not None:
+        config.CONTROL_FILE_SOURCE = args.source
+    for region in args.regions:
+        sf_attr, cs_attr = CONTROL_FILES[region]
+        _run_control_file(region, getattr(config, sf_attr), getattr(config, cs_attr))
+
+
+def cmd_sb_analysis(args):
+    from .analysis import run_sb_analysis
+    from .rendering import render_summary_plots
+    if args.bins is not None:
+        config.NUM_BINS = args.bins
+    results = run_sb_analysis(error_method=args.errors, streaming=args.streaming,
+                              targets=args.ff, interpolate=args.interpolate)
+    render_summary_plots(sb_results=results, workers=args.workers)
+
+
+def cmd_shapefinders(args):
+    from .analysis import process_shapefinders_for_redshift
+    from .rendering import render_shapefinder_plots
+    z_list = select_redshifts(args.z, _common_redshifts())
+    print(f"Processing shapefinders for {len(z_list)} redshifts")
+    results = []
+    for z in z_list:
+        with measure('shapefinders.redshift', z=z):
+            results.append(process_shapefinders_for_redshift(z, errors=args.errors, n_bins=args.bins))
+    for _ in render_shapefinder_plots(results, workers=args.workers):
+        pass
+
+
+def cmd_txb(args):
+    from .analysis import process_txb_for_redshifts
+    from .rendering import render_summary_plots
+    z_list = config.FIVE_Z_FOR_TXB if args.z is None else select_redshifts(args.z, _common_redshifts())
+    render_summary_plots(txb_results=process_txb_for_redshifts(z_list, n_bins=args.bins),
+                         workers=args.workers)
+
+
+def cmd_slopes(args):
+    from .slopes import extract_and_save_slopes
+    if args.catalog is None:
+        available = _common_redshifts()
+    else:
+        from .catalog import open_catalog
+        available = open_catalog(args.catalog, 'z')['z'].tolist()
+    extract_and_save_slopes(select_redshifts(args.z, available), out_csv=args.output,
+                            weighted=args.weighted, catalog_csv=args.catalog, n_bins=args.bins,
+                            merge=args.z is not None)
+
+
+def cmd_watch(args):
+    from .watch import watch
+    if args.settle is not None:
+        config.WATCH_SETTLE_S = args.settle
+    watch(interval=args.interval, cycles=args.cycles)
+
+
+def cmd_plot(args):
+    import pandas as pd
+    from .plotting import plot_slopes_tbl, plot_slopes_pg
+    df = pd.read_csv(args.input or config.SLOPES_CSV)
+    if args.z is not None:
+        df = df[df['z'].isin(select_redshifts(args.z, df['z'].tolist()))]
+    if args.figure in ('tbl', 'all'):
+        plot_slopes_tbl(df)
+    if args.figure in ('pg', 'all'):
+        plot_slopes_pg(df)
+
+
+# --- Parser ---
+
+def _add_redshifts(parser, default_help="all common redshifts"):
+    parser.add_argument('-z', '--z', action='append', metavar='SPEC',
+                        help="Redshifts to process: values and inclusive lo:hi ranges, comma-separated "
+                             f"or repeated, e.g. -z 10.11,12:14 (default: {default_help}).")
+
+
+def _add_workers(parser, help_text="Number of worker processes for rendering figures."):
+    parser.add_argument('-j', '--workers', type=int, default=None, help=help_text)
+
+
+def _add_binning(parser):
+    parser.add_argument('--binning', choices=['log', 'equal_count', 'min_count', 'bayesian_blocks'], default=None,
+                        help="Volume binning strategy (default: config.BINNING_STRATEGY).")
+    parser.add_argument('--min-count', type=int, default=None,
+                        help="Minimum clusters per bin with --binning min_count (default: config.MIN_BIN_COUNT).")
+
+
+def _add_band(parser):
+    parser.add_argument('--band', choices=['std', 'quantiles', 'mad'], default=None,
+                        help="Error bars: weighted mean and std, weighted median and quantile range, or "
+                             "weighted median and MAD (default: config.ERROR_BAND).")
+    parser.add_argument('--quantiles', type=float, nargs=2, default=None, metavar=('LO', 'HI'),
+                        help="Quantile range of --band quantiles (default: config.BAND_QUANTILES).")
+
+
+def _add_regions(parser):
+    parser.add_argument('--regions', nargs='+', choices=[prefix for _, prefix in REGIONS],
+                        default=[prefix for _, prefix in REGIONS], help="Regions to process (default: all).")
+
+
+def build_parser():
+    """Argument parser of `main.py`: the full pipeline and one subcommand per stage."""
+    parser = argparse.ArgumentParser(
+        description="Run the LCS / shapefinder analysis pipeline, or one stage of it.",
+        epilog="Without a subcommand, every stale stage of the pipeline is run.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="List the stages and redshifts that would rerun, without running them.")
+    parser.add_argument('--force', action='store_true',
+                        help="Rerun every stage, ignoring recorded fingerprints.")
+    parser.add_argument('--instrument', action='store_true',
+                        help="Measure time, memory, rows and I/O of every stage and write a run "
+                             "report to results/instrumentation/ (or set LCS_INSTRUMENT=1).")
+    parser.add_argument('--profile', nargs='+', metavar='STAGE', default=[],
+                        help="Run these stages (e.g. ingest, shapefinders.redshift) under cProfile; "
+                             "implies --instrument.")
+    parser.add_argument('--no-results-cache', action='store_true',
+                        help="Recompute the binned statistics instead of reading them from the "
+                             "results cache (data/cache/results/).")
+    commands = parser.add_subparsers(title='stages', dest='command', metavar='COMMAND')
+
+    p = commands.add_parser('ingest', help="Parse raw sub-box snapshot files into the per-subbox CSVs.")
+    _add_regions(p)
+    _add_redshifts(p, default_help="every raw snapshot; others are kept from the existing CSVs")
+    p.add_argument('--thresholds', type=int, nargs='+', default=None, metavar='N',
+                   help="outputN threshold trees to process (default: 1, or every threshold found "
+                        "with config.ALL_THRESHOLDS).")
+    p.add_argument('--subboxes', type=int, default=None,
+                   help="Number of sub-boxes per region (default: config.NUM_SUBBOXES).")
+    _add_workers(p, "Number of worker processes parsing files (default: config.INGEST_WORKERS).")
+    p.add_argument('--prefetch', type=int, default=None, metavar='DEPTH',
+                   help="Raw files read ahead of the parser by a pool of threads, 0 to read them in "
+                        "the parser (default: config.PREFETCH_DEPTH).")
+    p.set_defaults(func=cmd_ingest)
+
+    p = commands.add_parser('combine', help="Combine and clean the sub-box CSVs and list the common redshifts.")
+    p.add_argument('--streaming', action='store_true', default=None, help="Process in bounded-size chunks.")
+    p.set_defaults(func=cmd_combine)
+
+    p = commands.add_parser('control', help="Build the redshift vs FF control files.")
+    _add_regions(p)
+    p.add_argument('--source', choices=['auto', 'cluster_stats', 'shapefinders'], default=None,
+                   help="Source of the filling factors (default: config.CONTROL_FILE_SOURCE).")
+    p.set_defaults(func=cmd_control)
+
+    p = commands.add_parser('sb-analysis', help="Entire-box statistics with sub-box errors at target FFs.")
+    p.add_argument('--ff', type=float, nargs='+', default=None,
+                   help="Target filling factors (default: config.TARGET_FFS).")
+    p.add_argument('--bins', type=int, default=None, help="Number of volume bin edges (default: config.NUM_BINS).")
+    p.add_argument('--errors', choices=['std', 'jackknife', 'bootstrap'], default=None,
+                   help="Sub-box error estimate (default: config.SB_ERROR_METHOD).")
+    p.add_argument('--interpolate', action='store_true',
+                   help="Interpolate between the snapshots bracketing each target.")
+    p.add_argument('--streaming', action='store_true', default=None,
+                   help="Read only the snapshots matching the targets.")
+    _add_workers(p)
+    _add_binning(p)
+    p.set_defaults(func=cmd_sb_analysis)
+
+    p = commands.add_parser('shapefinders', help="Per-redshift shapefinder statistics, fits and figures.")
+    _add_redshifts(p)
+    p.add_argument('--bins', type=int, default=8, help="Number of volume bins per redshift (default: 8).")
+    p.add_argument('--errors', choices=['jackknife', 'bootstrap'], default=None,
+                   help="Cluster resampling errors (default: config.SHAPEFINDER_ERROR_METHOD).")
+    _add_workers(p)
+    _add_binning(p)
+    _add_band(p)
+    p.set_defaults(func=cmd_shapefinders)
+
+    p = commands.add_parser('txb', help="TxB against volume for a few redshifts.")
+    _add_redshifts(p, default_help="config.FIVE_Z_FOR_TXB")
+    p.add_argument('--bins', type=int, default=8, help="Number of volume bins per redshift (default: 8).")
+    _add_workers(p)
+    _add_binning(p)
+    _add_band(p)
+    p.set_defaults(func=cmd_txb)
+
+    p = commands.add_parser('slopes', help="Log-log slopes of every shapefinder against volume, per redshift.")
+    _add_redshifts(p)
+    p.add_argument('--bins', type=int, default=8, help="Number of volume bins per redshift (default: 8).")
+    p.add_argument('--weighted', action='store_true', help="Weight the fits by the standard errors of the means.")
+    p.add_argument('--catalog', default=None,
+                   help="Combined small-box catalog (default: config.SHAPEFINDERS_ALL_SMALL_BOX_CSV).")
+    p.add_argument('-o', '--output', default=None, help="Output CSV (default: config.SLOPES_CSV).")
+    _add_binning(p)
+    p.set_defaults(func=cmd_slopes)
+
+    p = commands.add_parser('plot', help="Slopes against redshift from the slopes CSV.")
+    _add_redshifts(p, default_help="all redshifts of the slopes CSV")
+    p.add_argument('--figure', choices=['tbl', 'pg', 'all'], default='all',
+                   help="T/B/L/TxB slopes, P/G slopes or both (default: all).")
+    p.add_argument('-i', '--input', default=None, help="Slopes CSV (default: config.SLOPES_CSV).")
+    p.set_defaults(func=cmd_plot)
+
+    p = commands.add_parser('watch', help="Ingest new raw snapshots as they land and replot their redshifts.")
+    p.add_argument('--interval', type=float, default=None,
+                   help="Seconds between polls (default: config.WATCH_INTERVAL_S).")
+    p.add_argument('--settle', type=float, default=None,
+                   help="Seconds a snapshot file must be left untouched before it is ingested "
+                        "(default: config.WATCH_SETTLE_S).")
+    p.add_argument('--cycles', type=int, default=None, help="Stop after this many polls (default: run until Ctrl-C).")
+    p.set_defaults(func=cmd_watch)
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs the pipeline (no subcommand) or a single stage restricted to the
+    requested redshifts, targets and bins. Single stages always run and do not
+    update the pipeline's recorded fingerprints.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.instrument or args.profile:
+        config.INSTRUMENT = True
+        config.PROFILE_STAGES = config.PROFILE_STAGES + args.profile
+    if args.no_results_cache:
+        config.RESULTS_CACHE = False
+    if getattr(args, 'binning', None) is not None:
+        config.BINNING_STRATEGY = args.binning
+    if getattr(args, 'min_count', None) is not None:
+        config.MIN_BIN_COUNT = args.min_count
+    if getattr(args, 'band', None) is not None:
+        config.ERROR_BAND = args.band
+    if getattr(args, 'quantiles', None) is not None:
+        from .stats import check_band_quantiles
+        try:
+            check_band_quantiles(*args.quantiles)
+        except ValueError as e:
+            parser.error(str(e))
+        config.BAND_QUANTILES = tuple(args.quantiles)
+
+    if args.command is None:
+        cmd_run(args)
+        return
+    config.ensure_output_dirs()
+    with measure(args.command):
+        args.func(args)
+    print_results_cache_counters()
+    if config.INSTRUMENT:
+        write_report()
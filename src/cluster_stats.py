@@ -0,0 +1,227 @@
+# src/cluster_stats.py
+
+import os
+import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from . import config
+from .snapshots import canonical_redshift
+
+# Columns of a raw Cluster_stat_copy file, in file order (see README)
+CLUSTER_STAT_COLUMNS = [
+    'rho_th', 'NC', 'Total_count', 'NIJK', 'FF', 'percolation_no', 'count_max',
+    'LCS', 'NN_max', 'count_max_vol', 'vol_max', 'NN_max_vol', 'vol_max_count',
+]
+CLUSTER_STAT_PREFIX = 'Cluster_stat_copy.z'
+
+_REDSHIFT_PATTERN = re.compile(r'^Cluster_stat_copy\.z(\d+(?:\.\d+)?)')
+_SUBBOX_PATTERN = re.compile(r'subbox(\d+)')
+_OUTPUT_PATTERN = re.compile(r'^output(\d+)$')
+
+
+def _parse_cluster_stat_path(root, path):
+    """
+    Redshift, sub-box and threshold directory of a Cluster_stat file. The
+    sub-box is taken from the file name or, failing that, from the closest
+    'subbox<i>' directory; 0 (the entire box) if there is neither.
+    """
+    name = os.path.basename(path)
+    redshift = canonical_redshift(float(_REDSHIFT_PATTERN.match(name).group(1)))
+    parts = os.path.relpath(path, root).split(os.sep)
+    subbox = 0
+    for part in reversed(parts):
+        match = _SUBBOX_PATTERN.search(part)
+        if match:
+            subbox = int(match.group(1))
+            break
+    output = next((int(m.group(1)) for m in map(_OUTPUT_PATTERN.match, parts) if m), 1)
+    return redshift, subbox, output
+
+
+def find_cluster_stat_files(region_dirs=None):
+    """
+    Lists the Cluster_stat_copy files below the raw directory of every region.
+
+    Args:
+        region_dirs (dict): Region prefix -> raw region directory. Defaults
+                            to `config.REGION_RAW_DIRS`.
+
+    Returns:
+        list: (region, output, subbox, redshift, path) tuples, sorted.
+    """
+    if region_dirs is None:
+        region_dirs = config.REGION_RAW_DIRS
+    found = []
+    for region, root in region_dirs.items():
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in filenames:
+                if name.startswith(CLUSTER_STAT_PREFIX) and _REDSHIFT_PATTERN.match(name):
+                    path = os.path.join(dirpath, name)
+                    redshift, subbox, output = _parse_cluster_stat_path(root, path)
+                    found.append((region, output, subbox, redshift, path))
+    return sorted(found)
+
+
+def read_cluster_stat_file(path):
+    """
+    Reads the rows (normally one per threshold) of a Cluster_stat_copy file.
+
+    Returns:
+        np.ndarray: Array of shape (rows, len(CLUSTER_STAT_COLUMNS)); columns
+                    missing from the file are NaN.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        values = np.loadtxt(path, comments='#', ndmin=2, dtype=np.float64)
+    out = np.full((values.shape[0], len(CLUSTER_STAT_COLUMNS)), np.nan)
+    n = min(values.shape[1], len(CLUSTER_STAT_COLUMNS))
+    out[:, :n] = values[:, :n]
+    return out
+
+
+def _read_cluster_stat_unit(path):
+    """Pool worker: file rows, or the error message instead of raising."""
+    try:
+        return read_cluster_stat_file(path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def load_cluster_stats(region_dirs=None, workers=None, files=None):
+    """
+    Loads every Cluster_stat_copy file of every region and sub-box into one
+    table, parsing the files in a pool of worker processes.
+
+    Args:
+        region_dirs (dict): Region prefix -> raw region directory. Defaults
+                            to `config.REGION_RAW_DIRS`.
+        workers (int): Number of worker processes. Defaults to `config.INGEST_WORKERS`.
+        files (list): Files to load, as listed by `find_cluster_stat_files`,
+                      instead of listing every file of region_dirs.
+
+    Returns:
+        pd.DataFrame: One row per file row, indexed by (region, output,
+                      subbox, redshift) and sorted, with CLUSTER_STAT_COLUMNS.
+                      Sub-box 0 is the entire box.
+    """
+    if workers is None:
+        workers = config.INGEST_WORKERS
+    if files is None:
+        files = find_cluster_stat_files(region_dirs)
+    paths = [f[-1] for f in files]
+    print(f"Reading {len(paths)} Cluster_stat files with {workers} worker(s)")
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+            parsed = list(executor.map(_read_cluster_stat_unit, paths,
+                                       chunksize=max(1, len(paths) // (4 * workers))))
+    else:
+        parsed = [_read_cluster_stat_unit(path) for path in paths]
+
+    keys, blocks = [], []
+    for (region, output, subbox, redshift, path), (values, error) in zip(files, parsed):
+        if error is not None:
+            print(f"    - Error reading {os.path.basename(path)}: {error}")
+            continue
+        keys += [(region, output, subbox, redshift)] * len(values)
+        blocks.append(values)
+    index = pd.MultiIndex.from_tuples(keys, names=['region', 'output', 'subbox', 'redshift'])
+    values = np.vstack(blocks) if blocks else np.empty((0, len(CLUSTER_STAT_COLUMNS)))
+    return pd.DataFrame(values, index=index, columns=CLUSTER_STAT_COLUMNS).sort_index(kind='stable')
+
+
+def control_from_cluster_stats(stats, region, subbox=0, output=1):
+    """
+    Control file (redshift vs FF) of one region straight from the filling
+    factors reported in its Cluster_stat files.
+
+    Args:
+        stats (pd.DataFrame): Output of `load_cluster_stats`.
+        region (str): Region prefix, e.g. 'CD_OD1'.
+        subbox (int): Sub-box; 0 is the entire box.
+        output (int): Threshold directory (outputN).
+
+    Returns:
+        pd.DataFrame: 'redshift' and 'FF' columns sorted by redshift, or an
+                      empty frame if the region has no such files.
+    """
+    try:
+        rows = stats.xs((region, output, subbox), level=['region', 'output', 'subbox'])
+    except KeyError:
+        return pd.DataFrame(columns=['redshift', 'FF'])
+    if rows.index.has_duplicates:
+        raise ValueError(f"Several thresholds per Cluster_stat file for {region} subbox {subbox}; "
+                         "cannot build a single control file")
+    return rows['FF'].reset_index()
+
+
+def lcs_vs_ff(stats):
+    """
+    Largest cluster statistic against filling factor for every region,
+    threshold and sub-box, each curve sorted by FF.
+
+    Returns:
+        pd.DataFrame: Columns region, output, subbox, redshift, FF, LCS and
+                      percolation_no.
+    """
+    curves = stats[['FF', 'LCS', 'percolation_no']].reset_index()
+    return curves.sort_values(['region', 'output', 'subbox', 'FF'], kind='stable').reset_index(drop=True)
+
+
+def percolation_onset(stats, lcs_threshold=None):
+    """
+    Onset of percolation of every region, threshold and sub-box.
+
+    Two estimates are given: the FF (and redshift) at which the LCS first
+    crosses lcs_threshold, interpolated linearly between the two snapshots
+    around the crossing, and the lowest FF at which the file reports a
+    percolating cluster (percolation_no > 0).
+
+    Args:
+        stats (pd.DataFrame): Output of `load_cluster_stats`.
+        lcs_threshold (float): LCS defining the onset. Defaults to
+                               `config.PERCOLATION_LCS_THRESHOLD`.
+
+    Returns:
+        pd.DataFrame: Indexed by (region, output, subbox), with columns
+                      'ff_onset', 'z_onset', 'ff_percolating' and
+                      'z_percolating'; NaN where there is no onset.
+    """
+    if lcs_threshold is None:
+        lcs_threshold = config.PERCOLATION_LCS_THRESHOLD
+    curves = lcs_vs_ff(stats)
+    keys = ['region', 'output', 'subbox']
+    groups = curves.groupby(keys, sort=False).ngroup().to_numpy()
+    ff = curves['FF'].to_numpy()
+    z = curves['redshift'].to_numpy()
+    lcs = curves['LCS'].to_numpy()
+
+    # First point of every curve at or above the threshold, and the one before it
+    above = lcs >= lcs_threshold
+    n_groups = groups.max() + 1 if len(groups) else 0
+    first = np.full(n_groups, len(curves))
+    np.minimum.at(first, groups[above], np.flatnonzero(above))
+    found = first < len(curves)
+    i = np.where(found, first, 0)
+    starts = np.searchsorted(groups, np.arange(n_groups))
+    has_prev = found & (i > starts)
+    j = np.where(has_prev, i - 1, i)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(has_prev & (lcs[i] != lcs[j]), (lcs_threshold - lcs[j]) / (lcs[i] - lcs[j]), 0.0)
+
+    percolating = curves['percolation_no'].to_numpy() > 0
+    first_perc = np.full(n_groups, len(curves))
+    np.minimum.at(first_perc, groups[percolating], np.flatnonzero(percolating))
+    found_perc = first_perc < len(curves)
+    k = np.where(found_perc, first_perc, 0)
+
+    index = pd.MultiIndex.from_frame(curves.loc[starts, keys]) if n_groups else \
+        pd.MultiIndex.from_tuples([], names=keys)
+    return pd.DataFrame({
+        'ff_onset': np.where(found, ff[j] + t * (ff[i] - ff[j]), np.nan),
+        'z_onset': np.where(found, z[j] + t * (z[i] - z[j]), np.nan),
+        'ff_percolating': np.where(found_perc, ff[k], np.nan),
+        'z_percolating': np.where(found_perc, z[k], np.nan),
+    }, index=index)
@@ -0,0 +1,167 @@
+# src/columnar.py
+
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from .snapshots import REDSHIFT_DECIMALS, build_snapshot_index, snapshot_index_from_offsets
+
+# A columnar catalog is a directory with one .npy file per column and this
+# header. The header is written last, so a directory without it is incomplete.
+HEADER_FILE = 'header.json'
+FORMAT_VERSION = 1
+
+# Units of the catalog columns; lengths are comoving Mpc/h
+UNITS = {
+    'redshift': '',
+    'z': '',
+    'FF': '',
+    'Volume_phys': '(Mpc/h)^3',
+    'vol': '(Mpc/h)^3',
+    'Area_phys': '(Mpc/h)^2',
+    'IMC_phys': 'Mpc/h',
+    'L_phys': 'Mpc/h',
+    'B_phys': 'Mpc/h',
+    'T_phys': 'Mpc/h',
+    'L': 'Mpc/h',
+    'B': 'Mpc/h',
+    'T': 'Mpc/h',
+    'Genus': '',
+    'P': '',
+    'F': '',
+}
+
+
+def read_header(directory):
+    """Header of a columnar catalog, or None if there is no complete one."""
+    try:
+        with open(os.path.join(directory, HEADER_FILE), 'r') as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return header if header.get('format_version') == FORMAT_VERSION else None
+
+
+def write_header(directory, header):
+    """Atomically replaces the header of a columnar catalog."""
+    path = os.path.join(directory, HEADER_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(header, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def write_columnar(df, directory, snapshot_col=None, meta=None):
+    """
+    Writes a catalog as a columnar directory: one flat .npy array per column
+    and a JSON header with the schema, units and snapshot offsets.
+
+    With a snapshot column, rows are stably sorted by canonical redshift (see
+    `snapshots`) and the header records where every snapshot starts, so that
+    a snapshot is a contiguous slice of every column file.
+
+    Args:
+        df (pd.DataFrame): Catalog to store. Text columns become fixed-width strings.
+        directory (str): Output directory; replaced as a whole once complete.
+        snapshot_col (str): Redshift column to sort and index by, or None to
+                            keep the row order.
+        meta (dict): Extra entries for the header, e.g. the source file.
+
+    Returns:
+        dict: The header.
+    """
+    snapshots = None
+    if snapshot_col is not None:
+        index = build_snapshot_index(df, snapshot_col)
+        df = index['table']
+        snapshots = {
+            'column': snapshot_col,
+            'decimals': index['decimals'],
+            'z': index['z'].tolist(),
+            'offsets': index['offsets'].tolist(),
+        }
+
+    tmp_dir = directory.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    schema = []
+    for col in df.columns:
+        values = df[col].to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        file_name = f'{col}.npy'
+        np.save(os.path.join(tmp_dir, file_name), np.ascontiguousarray(values), allow_pickle=False)
+        schema.append({'name': col, 'file': file_name, 'dtype': values.dtype.str, 'unit': UNITS.get(col)})
+
+    header = {
+        'format_version': FORMAT_VERSION,
+        'n_rows': len(df),
+        'columns': schema,
+        'snapshots': snapshots,
+    }
+    header.update(meta or {})
+    write_header(tmp_dir, header)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return header
+
+
+def open_columnar(directory, columns=None, mmap=True):
+    """
+    Opens a columnar catalog.
+
+    With mmap, every column is a read-only memory map of its .npy file: the
+    pages are shared by all processes that open the same catalog, and row
+    slices are views rather than copies.
+
+    Args:
+        directory (str): Columnar catalog directory.
+        columns (list): Columns to open. Defaults to all.
+        mmap (bool): Memory-map the columns instead of reading them.
+
+    Returns:
+        tuple: (pd.DataFrame, header dict). Raises FileNotFoundError if the
+               directory holds no complete catalog.
+    """
+    header = read_header(directory)
+    if header is None:
+        raise FileNotFoundError(f"No columnar catalog in {directory}")
+    data = {}
+    for entry in header['columns']:
+        if columns is None or entry['name'] in columns:
+            data[entry['name']] = np.load(os.path.join(directory, entry['file']),
+                                          mmap_mode='r' if mmap else None, allow_pickle=False)
+    return pd.DataFrame(data, copy=False), header
+
+
+def columnar_snapshot_index(df, header):
+    """
+    Snapshot index (see `snapshots.build_snapshot_index`) of a catalog opened
+    with `open_columnar`, built from the offsets in its header without
+    sorting or copying anything.
+    """
+    snapshots = header.get('snapshots')
+    if snapshots is None:
+        raise ValueError("Columnar catalog was not written with a snapshot column")
+    return snapshot_index_from_offsets(df, snapshots['column'], snapshots['z'],
+                                       snapshots['offsets'], snapshots.get('decimals', REDSHIFT_DECIMALS))
+
+
+def snapshot_column(columns):
+    """The redshift column ('z' or 'redshift') among columns, or None."""
+    return next((c for c in ['z', 'redshift'] if c in columns), None)
+
+
+def csv_to_columnar(csv_path, directory, snapshot_col=None):
+    """
+    Converts a processed CSV catalog to a columnar directory. The snapshot
+    column defaults to `snapshot_column` of the CSV.
+
+    Returns:
+        dict: The header.
+    """
+    df = pd.read_csv(csv_path)
+    if snapshot_col is None:
+        snapshot_col = snapshot_column(df.columns)
+    return write_columnar(df, directory, snapshot_col, meta={'source': os.path.abspath(csv_path)})
@@ -0,0 +1,202 @@
+# src/compact.py
+
+import numpy as np
+import pandas as pd
+from . import config
+from .stats import grouped_binned_stats, DEFAULT_QUANTITIES
+
+# Columns holding snapshot redshifts, stored as small integer codes
+SNAPSHOT_COLUMNS = ['z', 'redshift']
+# Label columns, stored as categorical codes
+LABEL_COLUMNS = ['region', 'subbox']
+# Columns kept in float64: volumes define the bin edges and bin membership,
+# and rounding them can move clusters across a bin edge
+EXACT_COLUMNS = ['vol', 'Volume_phys']
+
+REGION_PREFIXES = ['CD_OD1', 'CD_UD1']
+
+
+def snapshot_codes(z):
+    """
+    Encodes repeated redshifts as integer snapshot codes.
+
+    Returns:
+        pd.Categorical: Codes (int8 for up to 127 snapshots, int16 beyond)
+                        with the sorted float64 redshifts as lookup table.
+    """
+    return pd.Categorical(z, categories=np.unique(np.asarray(z, dtype=np.float64)))
+
+
+def compact_frame(df, float_dtype=np.float32, snapshot_columns=None):
+    """
+    Compact in-memory representation of a shapefinder catalog.
+
+    Snapshot redshift columns become categorical snapshot codes (the lookup
+    table keeps the exact float64 redshifts), label columns such as
+    region/subbox become categorical codes, and every float64 column except
+    the volumes (EXACT_COLUMNS) is stored as float_dtype. The statistics engine reads snapshot codes
+    directly and accumulates in float64.
+
+    Args:
+        df (pd.DataFrame): Catalog with float64 columns.
+        float_dtype: Storage type of the measured quantities.
+        snapshot_columns (list): Columns to encode as snapshot codes.
+                                 Defaults to SNAPSHOT_COLUMNS; the others
+                                 among them are kept as float64.
+
+    Returns:
+        pd.DataFrame: Compact copy of df with the same columns and index.
+    """
+    if snapshot_columns is None:
+        snapshot_columns = SNAPSHOT_COLUMNS
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if col in snapshot_columns and not isinstance(values.dtype, pd.CategoricalDtype):
+            out[col] = snapshot_codes(values.to_numpy())
+        elif col in LABEL_COLUMNS and not isinstance(values.dtype, pd.CategoricalDtype):
+            out[col] = pd.Categorical(values.to_numpy())
+        elif col in SNAPSHOT_COLUMNS or col in EXACT_COLUMNS:
+            out[col] = values
+        elif values.dtype == np.float64:
+            out[col] = values.to_numpy(dtype=float_dtype)
+        else:
+            out[col] = values.to_numpy()
+    return pd.DataFrame(out, index=df.index)
+
+
+def memory_usage_mb(df):
+    """Resident size of a DataFrame in MB, including object/category payloads."""
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def load_compact_subbox_catalog(num_subboxes=None):
+    """
+    Loads the cleaned sub-box catalogs of both regions into one compact
+    table, like `shapefinders_all_small_box.csv` but with categorical
+    'region' and 'subbox' columns recording where each cluster comes from.
+
+    Each sub-box table is compacted as soon as it is read, so only one
+    float64 table is resident at a time.
+    """
+    from .catalog import load_catalog
+    from .data_processing import clean_shapefinder_frame
+    if num_subboxes is None:
+        num_subboxes = config.NUM_SUBBOXES
+    regions = pd.CategoricalDtype(REGION_PREFIXES)
+    subboxes = pd.CategoricalDtype(list(range(1, num_subboxes + 1)))
+
+    frames = []
+    for base_dir, region_prefix in [(config.OVERDENSE_BASE_DIR, 'CD_OD1'),
+                                    (config.UNDERDENSE_BASE_DIR, 'CD_UD1')]:
+        for i in range(1, num_subboxes + 1):
+            f = f"{base_dir}subbox{i}/{region_prefix}_SF_SB{i}.csv"
+            try:
+                df = clean_shapefinder_frame(load_catalog(f))
+            except FileNotFoundError:
+                print(f"Warning: Sub-box file not found, skipping: {f}")
+                continue
+            # The redshift stays float64 until all snapshots are known
+            df = compact_frame(df, snapshot_columns=[])
+            df['region'] = pd.Categorical([region_prefix] * len(df), dtype=regions)
+            df['subbox'] = pd.Categorical(np.full(len(df), i), dtype=subboxes)
+            frames.append(df)
+    if not frames:
+        return None
+    combined = pd.concat(frames, ignore_index=True)
+    combined['z'] = snapshot_codes(combined['z'].to_numpy())
+    return combined
+
+
+def _loglog_slopes(stats, quantities):
+    """log-log slope of every '<q>_mean' against 'vol_mean', per redshift."""
+    from .utils import loglog_fit
+    slopes = {}
+    for z, stats_z in stats.groupby('z', sort=True):
+        vol = stats_z['vol_mean'].to_numpy()
+        slopes[z] = {q: loglog_fit(vol, stats_z[f'{q}_mean'].to_numpy())[0] for q in quantities}
+    return pd.DataFrame.from_dict(slopes, orient='index')
+
+
+def precision_audit(df, n_bins=8, quantities=None, rtol=1e-6, slope_atol=1e-3):
+    """
+    Compares binned statistics and log-log slopes of a catalog computed from
+    its float64 and its compact representation.
+
+    Args:
+        df (pd.DataFrame): Full-precision catalog with a 'z' column.
+        n_bins (int): Number of log-spaced volume bins per redshift.
+        quantities (list): Quantities to compare. Defaults to DEFAULT_QUANTITIES.
+        rtol (float): Largest acceptable relative deviation of a statistic.
+        slope_atol (float): Largest acceptable absolute deviation of a slope.
+                            Slopes of snapshots whose clusters span a narrow
+                            volume range are ill-conditioned and move by more
+                            than the statistics themselves.
+
+    Returns:
+        dict: Memory of both representations and their ratio, the largest
+              deviation of every statistic and slope, the number
+              of (z, bin) cells whose cluster count changed, and 'passed'.
+    """
+    if quantities is None:
+        quantities = DEFAULT_QUANTITIES
+    compact = compact_frame(df)
+    full_stats = grouped_binned_stats(df, 'z', 'vol', quantities, n_bins)
+    compact_stats = grouped_binned_stats(compact, 'z', 'vol', quantities, n_bins)
+
+    keys = ['z', 'bin']
+    merged = full_stats.merge(compact_stats, on=keys, how='outer', suffixes=('', '_c'), indicator=True)
+    unmatched = int((merged['_merge'] != 'both').sum())
+    merged = merged[merged['_merge'] == 'both']
+    changed_counts = int((merged['count'] != merged['count_c']).sum()) + unmatched
+
+    deviations = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for col in full_stats.columns:
+            if col in keys or col == 'count':
+                continue
+            a = merged[col].to_numpy()
+            scale = np.abs(a)
+            if col.endswith('_std'):
+                # A bin of (nearly) identical values has a std at rounding
+                # level; measure it against the size of the quantity instead
+                scale = np.maximum(scale, np.abs(merged[col[:-len('_std')] + '_mean'].to_numpy()))
+            rel = np.abs(merged[f'{col}_c'].to_numpy() - a) / scale
+            rel = rel[scale > 0]
+            deviations[col] = float(rel.max()) if rel.size else 0.0
+
+    # Slopes are compared in absolute terms, as some are close to zero
+    slope_quantities = ['T', 'B', 'L', 'P', 'Genus']
+    slope_dev = (_loglog_slopes(compact_stats, slope_quantities)
+                 - _loglog_slopes(full_stats, slope_quantities)).abs()
+    for q in slope_quantities:
+        deviations[f'slope_{q}'] = float(np.nanmax(slope_dev[q].to_numpy()))
+
+    full_mb, compact_mb = memory_usage_mb(df), memory_usage_mb(compact)
+    return {
+        'memory_mb': full_mb,
+        'compact_memory_mb': compact_mb,
+        'memory_ratio': full_mb / compact_mb,
+        'max_rel_deviation': deviations,
+        'changed_bin_counts': changed_counts,
+        'passed': (changed_counts == 0
+                   and all(v <= rtol for k, v in deviations.items() if not k.startswith('slope_'))
+                   and all(v <= slope_atol for k, v in deviations.items() if k.startswith('slope_'))),
+    }
+
+
+def audit_small_box_catalog(n_bins=8):
+    """
+    Runs `precision_audit` on the combined small-box catalog and prints a summary.
+    """
+    from .catalog import load_catalog
+    print("\n--- Compact catalog precision audit ---")
+    report = precision_audit(load_catalog(config.SHAPEFINDERS_ALL_SMALL_BOX_CSV), n_bins=n_bins)
+    print(f"Memory: {report['memory_mb']:.2f} MB -> {report['compact_memory_mb']:.2f} MB "
+          f"({report['memory_ratio']:.2f}x smaller)")
+    print(f"Bins with a changed cluster count: {report['changed_bin_counts']}")
+    for name, deviation in report['max_rel_deviation'].items():
+        print(f"  {name:<12} {deviation:.2e}")
+    print("Audit passed." if report['passed'] else "Audit FAILED: deviations exceed the tolerance.")
+    print("-" * 30)
+    return report
@@ -10,11 +10,15 @@ BOXSIZE_MPC_H = 500.0
 GRID_SIZE = 300.0
 CELL_SIZE_MPC_H = BOXSIZE_MPC_H / GRID_SIZE
 TOTAL_SIMULATION_VOLUME = BOXSIZE_MPC_H ** 3
+# Number of sub-box directories (subbox1..subboxN) per region
+NUM_SUBBOXES = 8
 
 # --- Data Directories ---
 DATA_DIR = os.path.join(ROOT_DIR, 'data')
 RAW_DATA_DIR = os.path.join(DATA_DIR, 'raw')
 PROCESSED_DATA_DIR = os.path.join(DATA_DIR, 'processed')
+CATALOG_CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+RESULTS_CACHE_DIR = os.path.join(CATALOG_CACHE_DIR, 'results')
 
 # --- Results Directories ---
 RESULTS_DIR = os.path.join(ROOT_DIR, 'results')
@@ -24,6 +28,8 @@ RESULTS_DATA_DIR = os.path.join(RESULTS_DIR, 'data')
 # --- Input Data Files ---
 # Processed CSVs
 SHAPEFINDERS_ALL_SMALL_BOX_CSV = os.path.join(PROCESSED_DATA_DIR, 'shapefinders_all_small_box.csv')
+# Sub-box catalogs of every threshold (outputN) with region, threshold and subbox columns
+SHAPEFINDERS_ALL_THRESHOLDS_CSV = os.path.join(PROCESSED_DATA_DIR, 'shapefinders_all_thresholds.csv')
 SHAPEFINDERS_ALL_SUBBOX0_CLEANED_CSV = os.path.join(PROCESSED_DATA_DIR, 'shapefinders_all_subbox0_cleaned.csv')
 EOR_SHAPEFINDER_DATA_CSV = os.path.join(PROCESSED_DATA_DIR, 'EoR_shapefinder_data.csv')
 CD_OD1_SF_EB_CSV = os.path.join(PROCESSED_DATA_DIR, 'CD_OD1_SF_EB.csv')
@@ -32,6 +38,16 @@ CD_UD1_SF_EB_CSV = os.path.join(PROCESSED_DATA_DIR, 'CD_UD1_SF_EB.csv')
 # Raw Data (example paths, adjust as needed)
 OVERDENSE_BASE_DIR = os.path.join(RAW_DATA_DIR, 'CD_overdensity_SURFGEN/output1/Shapefinder_stat/small_box/')
 UNDERDENSE_BASE_DIR = os.path.join(RAW_DATA_DIR, 'CD_underdensity_SURFGEN/output1/Shapefinder_stat/small_box/')
+# Raw directory of every region, searched for Cluster_stat_copy files and
+# for the outputN directories of the other temperature thresholds
+REGION_RAW_DIRS = {
+    'CD_OD1': os.path.join(RAW_DATA_DIR, 'CD_overdensity_SURFGEN'),
+    'CD_UD1': os.path.join(RAW_DATA_DIR, 'CD_underdensity_SURFGEN'),
+}
+# Also ingest the sub-boxes of every other outputN threshold found below
+# REGION_RAW_DIRS (prefixes CD_OD<N>/CD_UD<N>) and combine all thresholds into
+# SHAPEFINDERS_ALL_THRESHOLDS_CSV
+ALL_THRESHOLDS = True
 
 
 # --- Output Data Files ---
@@ -39,15 +55,96 @@ UNDERDENSE_BASE_DIR = os.path.join(RAW_DATA_DIR, 'CD_underdensity_SURFGEN/output
 CD_OD1_CS_EB_CSV = os.path.join(PROCESSED_DATA_DIR, 'CD_OD1_CS_EB.csv')
 CD_UD1_CS_EB_CSV = os.path.join(PROCESSED_DATA_DIR, 'CD_UD1_CS_EB.csv')
 COMMON_REDSHIFTS_TXT = os.path.join(RESULTS_DATA_DIR, 'common_redshifts.txt')
+# Log-log slopes of every redshift (`main.py slopes`)
+SLOPES_CSV = os.path.join(RESULTS_DATA_DIR, 'slopes.csv')
+# Fingerprints of the last successful run of every pipeline stage
+PIPELINE_STATE_JSON = os.path.join(RESULTS_DATA_DIR, 'pipeline_state.json')
 
 
 # --- Analysis Parameters ---
 TARGET_FFS = [0.01, 0.05, 0.1, 0.3]
+# Source of the control files: 'cluster_stats' (FF reported in the entire-box
+# Cluster_stat_copy files), 'shapefinders' (summed entire-box cluster volumes)
+# or 'auto' (Cluster_stat files when a region has them)
+CONTROL_FILE_SOURCE = 'auto'
+# LCS value marking the onset of percolation
+PERCOLATION_LCS_THRESHOLD = 0.5
 NUM_BINS = 15
+# Volume binning of the binned statistics: 'log' (log-spaced between the
+# smallest and largest cluster), 'equal_count' (about as many clusters in
+# every bin), 'min_count' (log bins merged until each holds MIN_BIN_COUNT
+# clusters) or 'bayesian_blocks' (adaptive blocks of a log histogram with
+# BAYESIAN_BLOCKS_FINE_BINS bins and change-point false-alarm rate P0)
+BINNING_STRATEGY = 'log'
+MIN_BIN_COUNT = 50
+BAYESIAN_BLOCKS_FINE_BINS = 64
+BAYESIAN_BLOCKS_P0 = 0.05
+# Sub-box error estimate in run_sb_analysis: 'std' (scatter between sub-boxes),
+# 'jackknife' (leave one sub-box out) or 'bootstrap' (resample sub-boxes)
+SB_ERROR_METHOD = 'std'
+# Errors on the per-redshift binned means from resampling clusters:
+# None, 'jackknife' or 'bootstrap'
+SHAPEFINDER_ERROR_METHOD = None
+# Weight the log-log slope fits by the standard errors of the binned means
+# (resampling errors when computed, std/sqrt(count) otherwise)
+WEIGHTED_SLOPE_FITS = False
+# Error bars of the per-redshift shapefinder and TxB figures: 'std' (weighted
+# mean and std), 'quantiles' (weighted median and the BAND_QUANTILES range) or
+# 'mad' (weighted median and 1.4826 times the weighted MAD). The medians and
+# quantiles are only computed when selected
+ERROR_BAND = 'std'
+BAND_QUANTILES = (0.16, 0.84)
+N_BOOTSTRAP = 1000
+BOOTSTRAP_SEED = 12345
 FIVE_Z_FOR_TXB = [10.11, 13.221, 14.294, 11.09, 9.938]
 
+# --- Performance Parameters ---
+# Number of worker processes used to parse raw SURFGEN files
+INGEST_WORKERS = os.cpu_count() or 1
+# Keep a binary columnar copy of processed CSVs in CATALOG_CACHE_DIR
+USE_CATALOG_CACHE = True
+# Keep analysis results (binned statistics) in RESULTS_CACHE_DIR, keyed by the
+# content of their input catalogs, the binning and the code, so that reruns
+# with unchanged inputs skip the binning. Least recently used results are
+# evicted beyond RESULTS_CACHE_MAX_MB
+RESULTS_CACHE = True
+RESULTS_CACHE_MAX_MB = 512
+# Hold the combined small-box catalog in compact form (float32 quantities,
+# integer snapshot codes); see compact.precision_audit for the precision
+COMPACT_CATALOG = False
+# Process catalogs in bounded-size chunks instead of loading them whole
+STREAMING = False
+# Peak memory budget (MB) for a chunk in streaming mode
+MEMORY_BUDGET_MB = 1024
+# Raw snapshot files are read by PREFETCH_THREADS threads up to
+# PREFETCH_DEPTH files ahead of the parser, in READ_BUFFER_KB requests, so
+# that reads from a slow (e.g. networked) filesystem overlap with parsing.
+# 0 reads every file in the parser itself
+PREFETCH_DEPTH = 8
+PREFETCH_THREADS = 4
+READ_BUFFER_KB = 1024
+# Throttles raw file reads to mimic a slow shared filesystem when testing the
+# prefetcher locally: 'LATENCY_MS,MB_PER_S', e.g. LCS_IO_THROTTLE=20,50
+IO_THROTTLE = os.environ.get('LCS_IO_THROTTLE') or None
+# Number of worker processes used to render figures
+RENDER_WORKERS = os.cpu_count() or 1
+# Watch mode (`main.py watch`): seconds between polls of the raw sub-box
+# directories, and how long a snapshot file must have been left untouched
+# before it is ingested, so that files still being written wait for a later poll
+WATCH_INTERVAL_S = 10.0
+WATCH_SETTLE_S = 2.0
+# Measure wall/CPU time, peak RSS, rows and bytes of every pipeline stage and
+# per-redshift task, and write a run report to INSTRUMENT_REPORT_DIR
+INSTRUMENT = os.environ.get('LCS_INSTRUMENT', '') not in ('', '0')
+# Stages (or per-redshift tasks) run under cProfile when instrumenting,
+# e.g. LCS_PROFILE_STAGES=ingest,shapefinders
+PROFILE_STAGES = [s for s in os.environ.get('LCS_PROFILE_STAGES', '').split(',') if s]
+INSTRUMENT_REPORT_DIR = os.path.join(RESULTS_DIR, 'instrumentation')
+
 # --- Plotting Parameters ---
 # Add any plot-specific configurations here
+# Non-interactive backend: figures are only saved to files
+PLOT_BACKEND = 'Agg'
 plt_style = {
     'font.family': 'serif',
     'mathtext.fontset': 'stix', # Changed from dejavuserif
@@ -63,6 +160,12 @@ plt_style = {
     'legend.fontsize': 10,
 }
 
-# Ensure directories exist
-os.makedirs(PLOTS_DIR, exist_ok=True)
-os.makedirs(RESULTS_DATA_DIR, exist_ok=True)
+
+def ensure_output_dirs():
+    """
+    Creates the results directories. Called when a run starts rather than on
+    import, so that importing the package (e.g. in every worker process) has
+    no side effects.
+    """
+    os.makedirs(PLOTS_DIR, exist_ok=True)
+    os.makedirs(RESULTS_DATA_DIR, exist_ok=True)
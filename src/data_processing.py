@@ -1,11 +1,28 @@
 # src/data_processing.py
 
+import io
 import os
 import re
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from . import config
-
-def create_control_file(input_sf_csv_path, output_cs_csv_path):
+from .catalog import load_catalog
+from .streaming import iter_csv_chunks, stream_group_sums, stream_unique
+from .snapshots import canonical_redshift, build_snapshot_index, snapshot_sums
+from .cluster_stats import CLUSTER_STAT_PREFIX, load_cluster_stats, control_from_cluster_stats
+from .instrumentation import add_rows
+from .prefetch import (prefetch, raw_reader, add_prefetch_counters, prefetch_counters, print_prefetch_counters,
+                       reset_prefetch_counters)
+
+# Raw Shapefinders_copy rows need at least columns 0..10 (up to the raw shapefinders)
+_SF_MIN_COLUMNS = 11
+# Columns read_shapefinder_file uses: volume, area, genus, IMC and the raw shapefinders
+_SF_USED_COLUMNS = [2, 3, 5, 6, 8, 9, 10]
+
+def create_control_file(input_sf_csv_path, output_cs_csv_path, streaming=None):
     """
     Generates a control file (redshift vs Filling Factor) from a
     shapefinder statistics file.
@@ -13,20 +30,29 @@ def create_control_file(input_sf_csv_path, output_cs_csv_path):
     Args:
         input_sf_csv_path (str): Full path to the input shapefinder CSV file.
         output_cs_csv_path (str): Full path where the output control file will be saved.
+        streaming (bool): Sum the volumes chunk by chunk instead of loading the
+                          whole file. Defaults to `config.STREAMING`.
     """
+    if streaming is None:
+        streaming = config.STREAMING
     print(f"--- Generating Control File ---")
     print(f"Reading input: {input_sf_csv_path}")
 
     try:
-        df_sf = pd.read_csv(input_sf_csv_path)
+        # Group data by redshift and sum the volume of all regions for each snapshot
+        if streaming:
+            total_region_volume = stream_group_sums(input_sf_csv_path, 'redshift', 'Volume_phys')
+            # Chunks are summed per exact redshift; merge them per snapshot
+            total_region_volume = total_region_volume.groupby(
+                canonical_redshift(total_region_volume.index.to_numpy())).sum().rename_axis('redshift')
+        else:
+            df_sf = load_catalog(input_sf_csv_path)
+            total_region_volume = snapshot_sums(build_snapshot_index(df_sf, 'redshift'), 'Volume_phys')
     except FileNotFoundError:
         print(f"FATAL ERROR: Input file not found at the specified path.")
         print("Please ensure the entire box shapefinder CSV exists before running this script.")
         return
 
-    # Group data by redshift and sum the volume of all regions for each snapshot
-    total_region_volume = df_sf.groupby('redshift')['Volume_phys'].sum()
-
     # Calculate the Filling Factor (FF)
     filling_factor = total_region_volume / config.TOTAL_SIMULATION_VOLUME
 
@@ -46,144 +72,395 @@ def create_control_file(input_sf_csv_path, output_cs_csv_path):
     print("-" * 30)
 
 
-def process_subboxes(base_directory, region_prefix, num_subboxes=8):
+def create_control_file_from_cluster_stats(region_prefix, output_cs_csv_path, stats=None):
     """
-    Processes raw shapefinder data from sub-box directories and saves to CSV
-    inside each respective sub-box directory.
+    Generates a control file (redshift vs Filling Factor) straight from the
+    FF reported in the entire-box Cluster_stat_copy files of a region,
+    without reading its shapefinder catalog.
 
     Args:
-        base_directory (str): The path to the 'small_box' directory.
-        region_prefix (str): The prefix for the output file, e.g., 'CD_OD1' or 'CD_UD1'.
-        num_subboxes (int): The number of sub-box directories to process.
+        region_prefix (str): Region, e.g. 'CD_OD1'.
+        output_cs_csv_path (str): Full path where the output control file will be saved.
+        stats (pd.DataFrame): Output of `cluster_stats.load_cluster_stats`.
+                              Defaults to loading the files of this region.
+
+    Returns:
+        bool: False if the region has no entire-box Cluster_stat files.
+    """
+    print(f"--- Generating Control File from Cluster_stat files ({region_prefix}) ---")
+    if stats is None:
+        stats = load_cluster_stats({region_prefix: config.REGION_RAW_DIRS[region_prefix]})
+    df_control = control_from_cluster_stats(stats, region_prefix)
+    if df_control.empty:
+        print(f"No entire-box Cluster_stat files found for {region_prefix}.")
+        return False
+    os.makedirs(os.path.dirname(output_cs_csv_path), exist_ok=True)
+    df_control.to_csv(output_cs_csv_path, index=False)
+    print(f"Successfully created control file: {output_cs_csv_path}")
+    print("-" * 30)
+    return True
+
+
+def _load_raw_shapefinder_rows(filepath, data=None):
+    """
+    Loads the first 11 columns of a raw Shapefinders_copy file as a 2D array.
+
+    Well-formed files are parsed in a single bulk call. Otherwise the file is
+    re-read line by line like the original per-line reader: short rows (fewer
+    than 11 columns) are dropped, and reading stops with a warning at the
+    first row whose used columns are not numbers, keeping the rows before it.
+    Columns the parser does not use are NaN in that case. If data (the file's
+    bytes, e.g. from `prefetch`) is given, the file is not opened.
+    """
+    text = data.decode('latin-1') if data is not None else None
+    with warnings.catch_warnings():
+        # An empty snapshot file is not an error, it just yields no rows
+        warnings.simplefilter('ignore', UserWarning)
+        try:
+            return np.loadtxt(filepath if text is None else io.StringIO(text), comments='#',
+                              usecols=range(_SF_MIN_COLUMNS), ndmin=2, dtype=np.float64)
+        except ValueError:
+            pass
+
+    if text is None:
+        with open(filepath, 'r') as file:
+            lines = file.readlines()
+    else:
+        lines = io.StringIO(text, newline=None).readlines()
+    rows = []
+    for line in lines:
+        values = line.split('#', 1)[0].split()
+        if len(values) < _SF_MIN_COLUMNS:
+            continue
+        row = np.full(_SF_MIN_COLUMNS, np.nan)
+        try:
+            row[_SF_USED_COLUMNS] = [float(values[c]) for c in _SF_USED_COLUMNS]
+        except ValueError as e:
+            print(f"    - Error processing {os.path.basename(filepath)}: {e}")
+            break
+        rows.append(row)
+    return np.array(rows, dtype=np.float64).reshape(-1, _SF_MIN_COLUMNS)
+
+
+def read_shapefinder_file(filepath, redshift, data=None):
+    """
+    Parses one raw Shapefinders_copy file into a DataFrame in physical units.
+
+    The T/B/L sorting, the Planarity/Filamentarity formulas and the unit
+    conversion are applied to the whole file at once, producing exactly the
+    same values as the original per-line implementation.
+
+    Args:
+        filepath (str): Path to the raw Shapefinders_copy file.
+        redshift (float): Redshift of the snapshot, parsed from the filename.
+        data (bytes): Content of the file if it was already read.
+
+    Returns:
+        pd.DataFrame: One row per cluster, with the columns of `*_SF_SB{i}.csv`.
+    """
+    values = _load_raw_shapefinder_rows(filepath, data)
+
+    # Read raw shapefinders and sort them to find T, B, L
+    shapefinders = np.sort(np.abs(values[:, 8:11]), axis=1)
+    T_grid, B_grid, L_grid = shapefinders[:, 0], shapefinders[:, 1], shapefinders[:, 2]
+
+    # Recalculate Planarity (P) and Filamentarity (F), 0 where undefined
+    sum_bt = B_grid + T_grid
+    sum_lb = L_grid + B_grid
+    with np.errstate(divide='ignore', invalid='ignore'):
+        P_val = np.where(sum_bt == 0, 0.0, (B_grid - T_grid) / sum_bt)
+        F_val = np.where(sum_lb == 0, 0.0, (L_grid - B_grid) / sum_lb)
+
+    return pd.DataFrame({
+        'redshift': np.full(len(values), redshift),
+        'Volume_phys': values[:, 2] * (config.CELL_SIZE_MPC_H ** 3),
+        'Area_phys': values[:, 3] * (config.CELL_SIZE_MPC_H ** 2),
+        'Genus': values[:, 5],
+        'IMC_phys': values[:, 6] * config.CELL_SIZE_MPC_H,
+        'L_phys': L_grid * config.CELL_SIZE_MPC_H,
+        'B_phys': B_grid * config.CELL_SIZE_MPC_H,
+        'T_phys': T_grid * config.CELL_SIZE_MPC_H,
+        'P': P_val,
+        'F': F_val,
+    })
+
+
+def _parse_snapshot_unit(unit):
+    """
+    Parses one (filepath, redshift) work unit, or (filepath, redshift, data)
+    for a prefetched file, and renders it as CSV rows.
+
+    Runs inside pool workers, so the CSV formatting is parallelised as well
+    and errors are returned as a message instead of being raised.
+
+    Returns:
+        tuple: (csv_body, header, n_rows, error) where csv_body has no header line.
+    """
+    filepath, redshift, data = unit if len(unit) == 3 else (*unit, None)
+    try:
+        if data is None and config.IO_THROTTLE:
+            # Unprefetched reads go through the slow-filesystem stand-in too
+            data = raw_reader()(filepath)
+        df = read_shapefinder_file(filepath, redshift, data)
+    except Exception as e:
+        return '', None, 0, str(e)
+    if df.empty:
+        return '', None, 0, None
+    return df.to_csv(index=False, header=False), ','.join(df.columns), len(df), None
+
+
+def _collect_subbox_jobs(base_directory, region_prefix, num_subboxes):
+    """
+    Lists the snapshot files of every sub-box of one region.
+
+    Returns:
+        list: One (subbox_index, subbox_dir, [(filepath, redshift), ...]) tuple
+              per existing sub-box directory, files in directory listing order.
     """
     print(f"\n--- Starting processing for {region_prefix} ---")
     print(f"Base directory: {base_directory}")
 
     if not os.path.isdir(base_directory):
         print(f"Error: Base directory not found at '{base_directory}'")
-        return
+        return []
 
     # A regular expression to find files containing redshift information
     redshift_pattern = re.compile(r'z(\d+\.\d+)_')
 
+    jobs = []
     # Loop through each sub-box (from 1 to 8)
     for i in range(1, num_subboxes + 1):
         subbox_dir = os.path.join(base_directory, f'subbox{i}')
-        print(f"\nProcessing subbox {i} in: {subbox_dir}")
-
         if not os.path.isdir(subbox_dir):
             print(f"  - Warning: Directory not found. Skipping subbox {i}.")
             continue
 
-        # Initialize a list to store data for the current sub-box
-        subbox_data = []
-
-        # Loop through all files in the current sub-box directory
+        units = []
         for filename in os.listdir(subbox_dir):
             match = redshift_pattern.search(filename)
-            if match:
-                try:
-                    redshift = float(match.group(1))
-                    filepath = os.path.join(subbox_dir, filename)
-
-                    with open(filepath, 'r') as file:
-                        for line in file:
-                            line = line.strip()
-                            if not line or line.startswith('#'):
-                                continue
-
-                            values = line.split()
-                            if len(values) < 11:
-                                continue
-
-                            # Read raw shapefinders and sort them to find L, B, T
-                            raw_sf1 = abs(float(values[8]))
-                            raw_sf2 = abs(float(values[9]))
-                            raw_sf3 = abs(float(values[10]))
-                            
-                            shapefinders = sorted([raw_sf1, raw_sf2, raw_sf3])
-                            T_grid, B_grid, L_grid = shapefinders[0], shapefinders[1], shapefinders[2]
-                            
-                            # Recalculate Planarity (P) and Filamentarity (F)
-                            sum_bt = B_grid + T_grid
-                            sum_lb = L_grid + B_grid
-                            P_val = 0 if sum_bt == 0 else (B_grid - T_grid) / sum_bt
-                            F_val = 0 if sum_lb == 0 else (L_grid - B_grid) / sum_lb
-
-                            # Append the processed data with physical units
-                            subbox_data.append({
-                                'redshift': redshift,
-                                'Volume_phys': float(values[2]) * (config.CELL_SIZE_MPC_H ** 3),
-                                'Area_phys': float(values[3]) * (config.CELL_SIZE_MPC_H ** 2),
-                                'Genus': float(values[5]),
-                                'IMC_phys': float(values[6]) * config.CELL_SIZE_MPC_H,
-                                'L_phys': L_grid * config.CELL_SIZE_MPC_H,
-                                'B_phys': B_grid * config.CELL_SIZE_MPC_H,
-                                'T_phys': T_grid * config.CELL_SIZE_MPC_H,
-                                'P': P_val,
-                                'F': F_val,
-                            })
-                except Exception as e:
-                    print(f"    - Error processing {filename}: {e}")
+            if match and not filename.startswith(CLUSTER_STAT_PREFIX):
+                units.append((os.path.join(subbox_dir, filename), float(match.group(1))))
+        jobs.append((i, subbox_dir, units))
+    return jobs
 
-        # After processing all files for a sub-box, create and save the CSV
-        if not subbox_data:
-            print(f"  - No data processed for subbox {i}. No CSV will be created.")
-        else:
-            df = pd.DataFrame(subbox_data)
-            # --- MODIFIED SECTION ---
-            # Construct the base filename, e.g., 'CD_OD1_SF_SB1.csv'
-            base_filename = f'{region_prefix}_SF_SB{i}.csv'
-            # Construct the full output path to save inside the subbox directory
-            output_filepath = os.path.join(subbox_dir, base_filename)
-            df.to_csv(output_filepath, index=False)
-            print(f"  - Complete. Saved {len(df)} rows to '{output_filepath}'")
-            # --- END OF MODIFICATION ---
-
-def create_shapefinders_all_small_box_csv():
+
+def _save_subbox_csv(region_prefix, i, subbox_dir, parsed_units, elapsed):
     """
-    Combines shapefinder data from all sub-boxes into a single CSV.
-    Performs cleaning and recalculates P and F.
+    Writes the parsed snapshot files of one sub-box to its CSV.
+    Returns the number of rows written.
     """
-    print("\n--- Combining and cleaning all sub-box shapefinder data ---")
-    all_dfs = []
+    parsed_units = [(body, header, n_rows) for body, header, n_rows in parsed_units if n_rows]
+    if not parsed_units:
+        print(f"  - No data processed for {region_prefix} subbox {i}. No CSV will be created.")
+        return 0
+
+    # Construct the base filename, e.g., 'CD_OD1_SF_SB1.csv'
+    base_filename = f'{region_prefix}_SF_SB{i}.csv'
+    # Construct the full output path to save inside the subbox directory
+    output_filepath = os.path.join(subbox_dir, base_filename)
+    n_rows = sum(n for _, _, n in parsed_units)
+    with open(output_filepath, 'w', newline='') as f:
+        f.write(parsed_units[0][1] + os.linesep)
+        for body, _, _ in parsed_units:
+            f.write(body)
+    if elapsed is None:
+        print(f"  - Complete. Saved {n_rows} rows to '{output_filepath}'")
+    else:
+        rate = n_rows / elapsed if elapsed > 0 else float('inf')
+        print(f"  - Complete. Saved {n_rows} rows to '{output_filepath}' "
+              f"(parsed at {rate:,.0f} rows/s)")
+    return n_rows
+
+
+def _existing_snapshot_rows(csv_path):
+    """
+    Rows of an existing sub-box CSV grouped by canonical redshift, as raw
+    CSV text, so that snapshots that are not reparsed are kept byte for byte.
 
-    for base_dir, region_prefix in [
-        (config.OVERDENSE_BASE_DIR, 'CD_OD1'),
-        (config.UNDERDENSE_BASE_DIR, 'CD_UD1')
-    ]:
-        for i in range(1, 9): # Assuming 8 subboxes
-            filepath = os.path.join(base_dir, f'subbox{i}', f'{region_prefix}_SF_SB{i}.csv')
-            if os.path.exists(filepath):
-                try:
-                    df = pd.read_csv(filepath)
-                    all_dfs.append(df)
-                except Exception as e:
-                    print(f"Warning: Could not read {filepath}: {e}")
-            else:
-                print(f"Warning: File not found, skipping: {filepath}")
+    Returns:
+        tuple: (header, {redshift: (csv_body, n_rows)}), or None if the file
+               does not exist.
+    """
+    try:
+        f = open(csv_path, 'r', newline='')
+    except FileNotFoundError:
+        return None
+    rows = {}
+    with f:
+        header = f.readline().rstrip('\r\n')
+        for line in f:
+            rows.setdefault(canonical_redshift(float(line.split(',', 1)[0])), []).append(line)
+    return header, {z: (''.join(lines), len(lines)) for z, lines in rows.items()}
 
-    if not all_dfs:
-        print("No sub-box shapefinder data found to combine.")
-        return
 
-    combined_df = pd.concat(all_dfs, ignore_index=True)
+def _prefetched_units(units, depth=None):
+    """
+    (filepath, redshift, data) work units whose files were read ahead by
+    `prefetch`, up to depth files ahead. A file that could not be read is
+    passed on without data, so that the parser reports the error as usual.
+    """
+    for (filepath, redshift), (_, data, error) in zip(units, prefetch((path for path, _ in units), depth=depth)):
+        yield (filepath, redshift, data) if error is None else (filepath, redshift)
+
+
+def _parse_snapshot_batch(units, depth):
+    """
+    Parses a batch of consecutive work units in a pool worker, reading the
+    files of the batch up to depth files ahead of the parser in the worker
+    itself, so that file contents never pass through the pool's pipe.
+
+    Returns:
+        tuple: (list of `_parse_snapshot_unit` results, prefetch counters of the batch).
+    """
+    reset_prefetch_counters()
+    parsed = [_parse_snapshot_unit(unit) for unit in _prefetched_units(units, depth)]
+    return parsed, prefetch_counters()
+
+
+def _batch_results(batches):
+    """Results of `_parse_snapshot_batch` batches in order, adding their counters to this process's."""
+    for parsed, counters in batches:
+        add_prefetch_counters(counters)
+        yield from parsed
 
+
+def process_all_subboxes(regions, num_subboxes=None, workers=None, redshifts=None):
+    """
+    Processes the raw shapefinder data of several regions, spreading the
+    individual snapshot files of every (region, subbox) over a process pool.
+
+    Results are merged in directory listing order, so the per-subbox CSVs are
+    identical to those written by a serial run regardless of the worker count.
+
+    With `config.PREFETCH_DEPTH`, the raw files are read by a pool of threads
+    ahead of the parser (see `prefetch`), so that the parser does not sit idle
+    while files are fetched from a slow filesystem. With a process pool, the
+    files are split into batches of consecutive files and every worker reads
+    ahead within its own batch. The overlap of reads and parsing, summed over
+    the processes that parsed, is printed at the end.
+
+    Args:
+        regions (list): (base_directory, region_prefix) pairs, e.g.
+                        [(config.OVERDENSE_BASE_DIR, 'CD_OD1')].
+        num_subboxes (int): The number of sub-box directories per region.
+                            Defaults to `config.NUM_SUBBOXES`.
+        workers (int): Number of worker processes. Defaults to
+                       `config.INGEST_WORKERS`; 1 parses in the current process.
+        redshifts (list): If given, only the snapshot files of these redshifts
+                          are parsed; the other snapshots of every sub-box CSV
+                          are copied from the existing file. Sub-boxes without
+                          a CSV yet are parsed completely.
+    """
+    if num_subboxes is None:
+        num_subboxes = config.NUM_SUBBOXES
+    if workers is None:
+        workers = config.INGEST_WORKERS
+
+    jobs = [
+        (region_prefix, i, subbox_dir, units)
+        for base_directory, region_prefix in regions
+        for i, subbox_dir, units in _collect_subbox_jobs(base_directory, region_prefix, num_subboxes)
+    ]
+    existing = {}
+    if redshifts is not None:
+        keys = set(canonical_redshift(np.asarray(redshifts, dtype=np.float64)).tolist())
+        for region_prefix, i, subbox_dir, units in jobs:
+            existing[(region_prefix, i)] = _existing_snapshot_rows(
+                os.path.join(subbox_dir, f'{region_prefix}_SF_SB{i}.csv'))
+
+    def needs_parse(region_prefix, i, unit):
+        return existing.get((region_prefix, i)) is None or canonical_redshift(unit[1]) in keys
+
+    all_units = [unit for region_prefix, i, _, units in jobs for unit in units
+                 if needs_parse(region_prefix, i, unit)]
+    print(f"\nParsing {len(all_units)} snapshot files from {len(jobs)} sub-boxes "
+          f"with {workers} worker(s)")
+
+    start_time = time.perf_counter()
+    reset_prefetch_counters()
+    depth = config.PREFETCH_DEPTH
+    if workers > 1 and len(all_units) > 1:
+        n_workers = min(workers, len(all_units))
+        executor = ProcessPoolExecutor(max_workers=n_workers)
+        if depth > 0:
+            # A few batches per worker keep the load balanced
+            size = -(-len(all_units) // (4 * n_workers))
+            batches = [all_units[k:k + size] for k in range(0, len(all_units), size)]
+            parsed = _batch_results(executor.map(_parse_snapshot_batch, batches, [depth] * len(batches)))
+        else:
+            parsed = executor.map(_parse_snapshot_unit, all_units)
+    else:
+        executor = None
+        parsed = map(_parse_snapshot_unit, _prefetched_units(all_units, depth) if depth > 0 else all_units)
+
+    total_rows = 0
+    try:
+        # Results arrive in submission order; save each sub-box as soon as its
+        # last file is in so that finished catalogs are not held in memory.
+        for region_prefix, i, subbox_dir, units in jobs:
+            subbox_start = time.perf_counter()
+            parsed_units = []
+            for unit in units:
+                if not needs_parse(region_prefix, i, unit):
+                    header, rows = existing[(region_prefix, i)]
+                    body, n_rows = rows.get(canonical_redshift(unit[1]), ('', 0))
+                    parsed_units.append((body, header, n_rows))
+                    continue
+                body, header, n_rows, error = next(parsed)
+                if error is not None:
+                    print(f"    - Error processing {os.path.basename(unit[0])}: {error}")
+                parsed_units.append((body, header, n_rows))
+                total_rows += n_rows
+            # Per-subbox parse rates are only meaningful when parsing serially
+            elapsed = None if executor else time.perf_counter() - subbox_start
+            _save_subbox_csv(region_prefix, i, subbox_dir, parsed_units, elapsed)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    add_rows(total_rows)
+    elapsed = time.perf_counter() - start_time
+    rate = total_rows / elapsed if elapsed > 0 else float('inf')
+    print(f"Processed {total_rows} rows in {elapsed:.2f} s ({rate:,.0f} rows/s)")
+    print_prefetch_counters()
+
+
+def process_subboxes(base_directory, region_prefix, num_subboxes=None, workers=1):
+    """
+    Processes raw shapefinder data from sub-box directories and saves to CSV
+    inside each respective sub-box directory.
+
+    Args:
+        base_directory (str): The path to the 'small_box' directory.
+        region_prefix (str): The prefix for the output file, e.g., 'CD_OD1' or 'CD_UD1'.
+        num_subboxes (int): The number of sub-box directories to process.
+                            Defaults to `config.NUM_SUBBOXES`.
+        workers (int): Number of worker processes used to parse snapshot files.
+    """
+    process_all_subboxes([(base_directory, region_prefix)], num_subboxes, workers=workers)
+
+def clean_shapefinder_frame(df):
+    """
+    Drops rows with negative physical quantities and renames the columns of a
+    sub-box shapefinder table to the names used by the analysis functions.
+    Rows are independent, so the result for a chunk of a table is the
+    corresponding chunk of the result for the whole table.
+    """
     # Clean the data: remove rows with any negative values in numerical columns
     # This specifically addresses the cleaning step observed in Spahefinder_stat.ipynb
-    numerical_columns = combined_df.select_dtypes(include=['number']).columns
+    numerical_columns = df.select_dtypes(include=['number']).columns
     # Ensure 'z' is not accidentally removed if it becomes negative due to some error, though typically redshift is positive.
     # We are specifically targeting physical quantities that shouldn't be negative.
     cols_to_check_positive = ['Volume_phys', 'Area_phys', 'Genus', 'IMC_phys', 'L_phys', 'B_phys', 'T_phys']
-    
+
     # Filter for columns that are present in the numerical columns and are expected to be positive
     actual_cols_to_check = [col for col in cols_to_check_positive if col in numerical_columns]
-    
+
     # Apply the filter
-    cleaned_df = combined_df[(combined_df[actual_cols_to_check] >= 0).all(axis=1)].copy()
+    cleaned_df = df[(df[actual_cols_to_check] >= 0).all(axis=1)].copy()
 
     # Rename columns for consistency with analysis functions
-    cleaned_df = cleaned_df.rename(columns={
+    return cleaned_df.rename(columns={
         'redshift': 'z',
         'Volume_phys': 'vol',
         'T_phys': 'T',
@@ -191,31 +468,188 @@ def create_shapefinders_all_small_box_csv():
         'L_phys': 'L'
     })
 
-    # Save the combined and cleaned DataFrame
+def _subbox_csv_paths():
+    """Yields the per-subbox shapefinder CSVs that exist, warning about missing ones."""
+    for base_dir, region_prefix in [
+        (config.OVERDENSE_BASE_DIR, 'CD_OD1'),
+        (config.UNDERDENSE_BASE_DIR, 'CD_UD1')
+    ]:
+        for i in range(1, config.NUM_SUBBOXES + 1):
+            filepath = os.path.join(base_dir, f'subbox{i}', f'{region_prefix}_SF_SB{i}.csv')
+            if os.path.exists(filepath):
+                yield filepath
+            else:
+                print(f"Warning: File not found, skipping: {filepath}")
+
+def _stream_combined_csv(output_filepath):
+    """
+    Streaming variant of the combine step: every sub-box CSV is cleaned chunk
+    by chunk and appended to the output, so only one chunk is held in memory.
+
+    Returns:
+        tuple: (original_rows, cleaned_rows)
+    """
+    n_original, n_cleaned = 0, 0
+    tmp_path = output_filepath + '.tmp'
+    with open(tmp_path, 'w', newline='') as out:
+        for filepath in _subbox_csv_paths():
+            try:
+                for chunk in iter_csv_chunks(filepath):
+                    cleaned = clean_shapefinder_frame(chunk)
+                    cleaned.to_csv(out, index=False, header=(n_original == 0))
+                    n_original += len(chunk)
+                    n_cleaned += len(cleaned)
+            except Exception as e:
+                print(f"Warning: Could not read {filepath}: {e}")
+    if n_original == 0:
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, output_filepath)
+    return n_original, n_cleaned
+
+def create_all_thresholds_csv(regions, output_filepath=None, small_box_csv=None):
+    """
+    Combines the sub-box shapefinder CSVs of every threshold into one cleaned
+    catalog with 'region', 'threshold' and 'subbox' columns, reading every
+    file once, chunk by chunk.
+
+    Args:
+        regions (list): (base_directory, region_prefix) pairs of every
+                        threshold, e.g. from `thresholds.threshold_regions`.
+        output_filepath (str): Output CSV. Defaults to
+                               `config.SHAPEFINDERS_ALL_THRESHOLDS_CSV`.
+        small_box_csv (str): If given, the rows of the configured regions
+                             (CD_OD1 and CD_UD1) are also written there, as
+                             `create_shapefinders_all_small_box_csv` does, so
+                             that both catalogs come from a single pass.
+
+    Returns:
+        tuple: (original_rows, cleaned_rows) over all thresholds.
+    """
+    from .thresholds import split_prefix
+    if output_filepath is None:
+        output_filepath = config.SHAPEFINDERS_ALL_THRESHOLDS_CSV
+    print("\n--- Combining the sub-box shapefinder data of all thresholds ---")
+    configured = {(config.OVERDENSE_BASE_DIR, 'CD_OD1'), (config.UNDERDENSE_BASE_DIR, 'CD_UD1')}
+    os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+
+    n_original, n_cleaned, n_small_box = 0, 0, 0
+    tmp_path = output_filepath + '.tmp'
+    small_box_tmp = small_box_csv + '.tmp' if small_box_csv else os.devnull
+    with open(tmp_path, 'w', newline='') as out, open(small_box_tmp, 'w', newline='') as small_box_out:
+        for base_directory, region_prefix in regions:
+            region, threshold = split_prefix(region_prefix)
+            in_small_box = small_box_csv is not None and (base_directory, region_prefix) in configured
+            for i in range(1, config.NUM_SUBBOXES + 1):
+                filepath = os.path.join(base_directory, f'subbox{i}', f'{region_prefix}_SF_SB{i}.csv')
+                if not os.path.exists(filepath):
+                    continue
+                try:
+                    for chunk in iter_csv_chunks(filepath):
+                        cleaned = clean_shapefinder_frame(chunk)
+                        if in_small_box:
+                            cleaned.to_csv(small_box_out, index=False, header=(n_small_box == 0))
+                            n_small_box += len(chunk)
+                        cleaned.assign(region=region, threshold=threshold, subbox=i).to_csv(
+                            out, index=False, header=(n_original == 0))
+                        n_original += len(chunk)
+                        n_cleaned += len(cleaned)
+                except Exception as e:
+                    print(f"Warning: Could not read {filepath}: {e}")
+
+    for tmp, path, n in [(tmp_path, output_filepath, n_original), (small_box_tmp, small_box_csv, n_small_box)]:
+        if path is None:
+            continue
+        if n == 0:
+            os.remove(tmp)
+        else:
+            os.replace(tmp, path)
+    add_rows(n_original)
+    if n_original == 0:
+        print("No sub-box shapefinder data found to combine.")
+    else:
+        print(f"Successfully combined and cleaned {n_cleaned} rows of {len(regions)} region thresholds "
+              f"to: {output_filepath}")
+        if n_small_box:
+            print(f"Successfully combined and cleaned the CD_OD1/CD_UD1 rows to: {small_box_csv}")
+    print("-" * 30)
+    return n_original, n_cleaned
+
+def create_shapefinders_all_small_box_csv(streaming=None):
+    """
+    Combines shapefinder data from all sub-boxes into a single CSV.
+    Performs cleaning and recalculates P and F.
+
+    Args:
+        streaming (bool): Clean and write the sub-box tables chunk by chunk
+                          instead of concatenating them in memory. Defaults to
+                          `config.STREAMING`. Nothing is returned in this mode.
+    """
+    if streaming is None:
+        streaming = config.STREAMING
+    print("\n--- Combining and cleaning all sub-box shapefinder data ---")
     output_filepath = config.SHAPEFINDERS_ALL_SMALL_BOX_CSV
     os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+
+    if streaming:
+        n_original, n_cleaned = _stream_combined_csv(output_filepath)
+        if n_original == 0:
+            print("No sub-box shapefinder data found to combine.")
+            return
+        add_rows(n_original)
+        print(f"Successfully combined and cleaned {n_cleaned} rows to: {output_filepath}")
+        print(f"Original rows: {n_original}, Cleaned rows: {n_cleaned}")
+        print("-" * 30)
+        return
+
+    all_dfs = []
+    for filepath in _subbox_csv_paths():
+        try:
+            df = pd.read_csv(filepath)
+            all_dfs.append(df)
+        except Exception as e:
+            print(f"Warning: Could not read {filepath}: {e}")
+
+    if not all_dfs:
+        print("No sub-box shapefinder data found to combine.")
+        return
+
+    combined_df = pd.concat(all_dfs, ignore_index=True)
+    cleaned_df = clean_shapefinder_frame(combined_df)
+    add_rows(len(combined_df))
+
+    # Save the combined and cleaned DataFrame
     cleaned_df.to_csv(output_filepath, index=False)
     print(f"Successfully combined and cleaned {len(cleaned_df)} rows to: {output_filepath}")
     print(f"Original rows: {len(combined_df)}, Cleaned rows: {len(cleaned_df)}")
     print("-" * 30)
     return cleaned_df
 
-def generate_common_redshifts_txt():
+def generate_common_redshifts_txt(streaming=None):
     """
     Generates a list of common redshifts from the combined shapefinder data
     and saves them to a text file.
+
+    Args:
+        streaming (bool): Collect the redshifts chunk by chunk instead of
+                          loading the whole catalog. Defaults to `config.STREAMING`.
     """
+    if streaming is None:
+        streaming = config.STREAMING
     print("\n--- Generating common redshifts list ---")
     try:
-        df_sf_all = pd.read_csv(config.SHAPEFINDERS_ALL_SMALL_BOX_CSV)
+        # Extract unique, sorted redshifts
+        if streaming:
+            unique_redshifts = np.unique(canonical_redshift(
+                stream_unique(config.SHAPEFINDERS_ALL_SMALL_BOX_CSV, 'z')))
+        else:
+            df_sf_all = load_catalog(config.SHAPEFINDERS_ALL_SMALL_BOX_CSV)
+            unique_redshifts = build_snapshot_index(df_sf_all, 'z')['z']
     except FileNotFoundError:
         print(f"FATAL ERROR: Combined shapefinder CSV not found at {config.SHAPEFINDERS_ALL_SMALL_BOX_CSV}.")
         print("Please ensure it's created before generating common redshifts.")
         return
 
-    # Extract unique, sorted redshifts
-    unique_redshifts = sorted(df_sf_all['z'].unique())
-
     # Save to file
     output_filepath = config.COMMON_REDSHIFTS_TXT
     os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
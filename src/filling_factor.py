@@ -0,0 +1,85 @@
+# src/filling_factor.py
+
+import numpy as np
+import pandas as pd
+
+
+def build_ff_map(df_control):
+    """
+    Sorts a control file (redshift vs FF) by filling factor for
+    `resolve_ff_targets`.
+
+    Args:
+        df_control (pd.DataFrame): Control file with 'redshift' and 'FF' columns.
+
+    Returns:
+        dict: 'ff' (sorted filling factors), 'z' (their redshifts) and 'row'
+              (their rows in the control file).
+    """
+    ff = df_control['FF'].to_numpy(dtype=np.float64)
+    order = np.argsort(ff, kind='stable')
+    return {
+        'ff': ff[order],
+        'z': df_control['redshift'].to_numpy(dtype=np.float64)[order],
+        'row': order,
+    }
+
+
+def resolve_ff_targets(ff_map, targets):
+    """
+    Resolves any number of target filling factors to snapshots with one
+    sorted search over the control file.
+
+    The nearest snapshot is the one `analysis.find_snapshot_redshift` picks
+    (on a tie, the earlier row of the control file). The bracketing
+    snapshots are those with the largest FF <= target and the smallest
+    FF >= target; both are NaN for targets outside the range of the file.
+
+    Args:
+        ff_map (dict): Output of `build_ff_map`.
+        targets (array-like): Target filling factors.
+
+    Returns:
+        pd.DataFrame: One row per target with 'target', 'z' and 'ff' of the
+                      nearest snapshot, 'distance' (|ff - target|), 'z_lo',
+                      'ff_lo', 'z_hi', 'ff_hi' of the bracketing snapshots and
+                      'frac', the interpolation weight of the upper one.
+    """
+    targets = np.atleast_1d(np.asarray(targets, dtype=np.float64))
+    ff, z, row = ff_map['ff'], ff_map['z'], ff_map['row']
+    n = len(ff)
+    if n == 0:
+        raise ValueError("Control file has no snapshots")
+
+    # First snapshot with FF >= target, and the first of the run of equal
+    # FFs just below it, so that ties resolve to the earliest row
+    hi = np.searchsorted(ff, targets, side='left')
+    below = np.clip(hi - 1, 0, n - 1)
+    lo = np.searchsorted(ff, ff[below], side='left')
+    hi_c = np.clip(hi, 0, n - 1)
+    d_lo = np.abs(targets - ff[lo])
+    d_hi = np.abs(ff[hi_c] - targets)
+    use_hi = (d_hi < d_lo) | ((d_hi == d_lo) & (row[hi_c] < row[lo]))
+    nearest = np.where(use_hi, hi_c, lo)
+
+    has_lo = hi > 0
+    has_hi = hi < n
+    exact = has_hi & (ff[hi_c] == targets)
+    lo_idx = np.where(exact, hi_c, lo)
+    in_range = exact | (has_lo & has_hi)
+    ff_lo = np.where(in_range, ff[lo_idx], np.nan)
+    ff_hi = np.where(in_range, ff[hi_c], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac = np.where(ff_hi > ff_lo, (targets - ff_lo) / (ff_hi - ff_lo), 0.0)
+
+    return pd.DataFrame({
+        'target': targets,
+        'z': z[nearest],
+        'ff': ff[nearest],
+        'distance': np.abs(ff[nearest] - targets),
+        'z_lo': np.where(in_range, z[lo_idx], np.nan),
+        'ff_lo': ff_lo,
+        'z_hi': np.where(in_range, z[hi_c], np.nan),
+        'ff_hi': ff_hi,
+        'frac': np.where(in_range, frac, np.nan),
+    })
@@ -0,0 +1,19 @@
+# src/fingerprint.py
+
+import hashlib
+import os
+
+
+def file_signature(path):
+    """Returns the (size, mtime_ns) pair used as the cheap validity check."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Returns the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,243 @@
+# src/instrumentation.py
+
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from . import config
+
+# Measurements of the current run, in the order the measured blocks ended
+_RECORDS = []
+# Records of the blocks currently running, innermost last
+_ACTIVE = []
+
+
+def is_enabled():
+    """Whether instrumentation is on (`config.INSTRUMENT`)."""
+    return config.INSTRUMENT
+
+
+# --- Process counters ---
+
+def reset_peak_rss():
+    """
+    Resets the kernel's peak RSS counter of this process, so that the next
+    reading covers one block only. Returns False where that is not supported.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _rusage(who):
+    """
+    Resource usage of this process ('self') or of its finished worker
+    processes ('children'), or None where `resource` is missing (Windows).
+    Imported here so that the modules measuring blocks import everywhere.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+
+
+def peak_rss_mb():
+    """Peak RSS of this process in MB (since the last reset, where supported), or None where unsupported."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    usage = _rusage('self')
+    if usage is None:
+        return None
+    # ru_maxrss is in KB on Linux and in bytes on macOS, and is never reset
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return usage.ru_maxrss * scale / 2 ** 20
+
+
+def children_peak_rss_mb():
+    """Largest peak RSS of any finished worker process, in MB, or None where unsupported."""
+    usage = _rusage('children')
+    if usage is None:
+        return None
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return usage.ru_maxrss * scale / 2 ** 20
+
+
+def cpu_seconds():
+    """
+    CPU time of this process and its finished worker processes; of this
+    process only where `resource` is missing.
+    """
+    self_usage, children = _rusage('self'), _rusage('children')
+    if self_usage is None:
+        return time.process_time()
+    return (self_usage.ru_utime + self_usage.ru_stime
+            + children.ru_utime + children.ru_stime)
+
+
+def io_bytes():
+    """
+    (read, written) bytes of this process so far, counting every read and
+    write call (page cache hits included), or (None, None) where unsupported.
+    """
+    try:
+        counters = {}
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                key, value = line.split(':')
+                counters[key] = int(value)
+        return counters['rchar'], counters['wchar']
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+# --- Measuring ---
+
+def add_rows(n):
+    """
+    Adds n processed rows to the innermost measured block, if any. Rows are
+    not passed on to enclosing blocks, so that nothing is counted twice.
+    """
+    if _ACTIVE:
+        _ACTIVE[-1]['rows'] = _ACTIVE[-1].get('rows', 0) + int(n)
+
+
+def _profile_path(name, labels):
+    suffix = ''.join(f'_{k}{v}' for k, v in labels.items())
+    return os.path.join(config.INSTRUMENT_REPORT_DIR, f'{name}{suffix}.prof'.replace(os.sep, '_'))
+
+
+@contextlib.contextmanager
+def measure(name, profile=None, **labels):
+    """
+    Measures a block (a pipeline stage or a per-redshift task): wall and CPU
+    time, peak RSS, bytes read and written, and the rows reported with
+    `add_rows`. Does nothing when instrumentation is off.
+
+    CPU time includes worker processes that finished inside the block; bytes
+    only count this process. Only one block is profiled at a time, so a block
+    nested in a profiled one is not profiled separately.
+
+    Args:
+        name (str): Block name used in the report.
+        profile (bool): Run the block under cProfile and dump the profile to
+                        `config.INSTRUMENT_REPORT_DIR`. Defaults to whether
+                        name is in `config.PROFILE_STAGES`.
+        **labels: Extra report fields, e.g. z=10.11.
+
+    Yields:
+        dict: The record being filled in, or None when off.
+    """
+    if not config.INSTRUMENT:
+        yield None
+        return
+    if profile is None:
+        profile = name in config.PROFILE_STAGES
+    profile = profile and not any('profile' in r for r in _ACTIVE)
+
+    record = {'name': name, **labels}
+    peak_resettable = reset_peak_rss()
+    read_start, written_start = io_bytes()
+    cpu_start = cpu_seconds()
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        record['profile'] = _profile_path(name, labels)
+    _ACTIVE.append(record)
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record['wall_s'] = time.perf_counter() - start
+        record['cpu_s'] = cpu_seconds() - cpu_start
+        _ACTIVE.pop()
+        read_end, written_end = io_bytes()
+        record['bytes_read'] = read_end - read_start if read_end is not None else None
+        record['bytes_written'] = written_end - written_start if written_end is not None else None
+        # A nested block resets the peak counter, so keep the largest peak seen
+        peaks = [p for p in (peak_rss_mb(), record.pop('_nested_peak_rss_mb', None)) if p is not None]
+        record['peak_rss_mb'] = max(peaks) if peaks else None
+        if _ACTIVE and record['peak_rss_mb'] is not None:
+            _ACTIVE[-1]['_nested_peak_rss_mb'] = max(record['peak_rss_mb'],
+                                                     _ACTIVE[-1].get('_nested_peak_rss_mb', 0.0))
+        record['peak_rss_is_per_block'] = peak_resettable
+        record['peak_rss_children_mb'] = children_peak_rss_mb()
+        if profiler is not None:
+            os.makedirs(config.INSTRUMENT_REPORT_DIR, exist_ok=True)
+            profiler.dump_stats(record['profile'])
+        _RECORDS.append(record)
+
+
+def records():
+    """Measurements of the current run so far."""
+    return list(_RECORDS)
+
+
+def clear():
+    """Drops all measurements of the current run."""
+    _RECORDS.clear()
+
+
+# --- Report ---
+
+def environment():
+    """Software and machine description stored with every report."""
+    import numpy as np
+    import pandas as pd
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def write_report(path=None):
+    """
+    Writes the measurements of the current run as JSON (with the environment)
+    and as CSV (one row per measured block) next to it.
+
+    Args:
+        path (str): JSON report path. Defaults to
+                    `config.INSTRUMENT_REPORT_DIR`/run_<timestamp>.json.
+
+    Returns:
+        str: The JSON report path, or None if nothing was measured.
+    """
+    import csv
+    if not _RECORDS:
+        return None
+    if path is None:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(config.INSTRUMENT_REPORT_DIR, f'run_{stamp}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'records': _RECORDS}, f, indent=2)
+
+    fields = []
+    for record in _RECORDS:
+        fields += [k for k in record if k not in fields]
+    with open(os.path.splitext(path)[0] + '.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(_RECORDS)
+    print(f"Instrumentation report written to {path}")
+    return path
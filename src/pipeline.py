@@ -0,0 +1,524 @@
+# src/pipeline.py
+
+import hashlib
+import json
+import os
+import re
+from . import config
+from .fingerprint import file_signature, file_hash
+from .instrumentation import measure, write_report
+from .thresholds import threshold_regions
+from .results_cache import print_results_cache_counters
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Same pattern process_subboxes uses to recognise raw snapshot files
+_SNAPSHOT_PATTERN = re.compile(r'z(\d+\.\d+)_')
+
+# Package modules imported by every source module, parsed once per process
+_PACKAGE_IMPORTS = {}
+
+# Entire-box Cluster_stat files of every region, listed once per run or poll
+_CLUSTER_STAT_FILES = {}
+
+REGIONS = [
+    ('OVERDENSE_BASE_DIR', 'CD_OD1'),
+    ('UNDERDENSE_BASE_DIR', 'CD_UD1'),
+]
+
+# Entire-box catalog and control file of every region
+CONTROL_FILES = {
+    'CD_OD1': ('CD_OD1_SF_EB_CSV', 'CD_OD1_CS_EB_CSV'),
+    'CD_UD1': ('CD_UD1_SF_EB_CSV', 'CD_UD1_CS_EB_CSV'),
+}
+
+
+# --- Fingerprints ---
+
+def _load_state():
+    try:
+        with open(config.PIPELINE_STATE_JSON, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    for key in ('files', 'stages', 'redshifts'):
+        state.setdefault(key, {})
+    return state
+
+
+def _save_state(state):
+    os.makedirs(os.path.dirname(config.PIPELINE_STATE_JSON), exist_ok=True)
+    tmp_path = config.PIPELINE_STATE_JSON + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, config.PIPELINE_STATE_JSON)
+
+
+def _file_fingerprint(path, state):
+    """
+    Content hash of a file, or None if it does not exist. The hash is only
+    recomputed when the file's size or mtime differ from the recorded ones.
+    """
+    try:
+        size, mtime_ns = file_signature(path)
+    except OSError:
+        return None
+    record = state['files'].get(path)
+    if record is not None and record[0] == size and record[1] == mtime_ns:
+        return record[2]
+    digest = file_hash(path)
+    state['files'][path] = [size, mtime_ns, digest]
+    return digest
+
+
+def _package_imports(name):
+    """Package modules imported by a module, including imports inside functions."""
+    if name in _PACKAGE_IMPORTS:
+        return _PACKAGE_IMPORTS[name]
+    import ast
+    with open(os.path.join(SRC_DIR, name), 'r') as f:
+        tree = ast.parse(f.read())
+    imported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level == 1:
+            if node.module is not None:
+                imported.add(node.module.split('.')[0] + '.py')
+            else:
+                imported.update(alias.name + '.py' for alias in node.names)
+    _PACKAGE_IMPORTS[name] = imported
+    return imported
+
+
+def _code_closure(modules):
+    """
+    The given modules and every package module they import, directly or
+    indirectly. config.py is left out: the configuration values a stage
+    depends on are part of its parameters.
+    """
+    closure, queue = set(), list(modules)
+    while queue:
+        name = queue.pop()
+        if name in closure or name == 'config.py' or not os.path.exists(os.path.join(SRC_DIR, name)):
+            continue
+        closure.add(name)
+        queue.extend(_package_imports(name))
+    return sorted(closure)
+
+
+def _stage_fingerprint(stage, inputs, state):
+    """Combined fingerprint of a stage's input files, source code and parameters."""
+    h = hashlib.sha1()
+    for path in sorted(inputs) + [os.path.join(SRC_DIR, name) for name in _code_closure(stage['code'])]:
+        h.update(path.encode())
+        h.update((_file_fingerprint(path, state) or 'missing').encode())
+    h.update(json.dumps(stage['params'](), sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+# --- Declared inputs and outputs ---
+
+def _subbox_dirs(base_directory):
+    dirs = [os.path.join(base_directory, f'subbox{i}') for i in range(1, config.NUM_SUBBOXES + 1)]
+    return [(i, d) for i, d in enumerate(dirs, start=1) if os.path.isdir(d)]
+
+
+def _configured_regions():
+    return [(getattr(config, attr), prefix) for attr, prefix in REGIONS]
+
+
+def _ingest_regions():
+    """Sub-box trees of the configured regions and, with `config.ALL_THRESHOLDS`, of every threshold."""
+    return threshold_regions(_configured_regions())
+
+
+def _raw_snapshot_files(regions=None):
+    if regions is None:
+        regions = _ingest_regions()
+    files = []
+    for base_directory, _ in regions:
+        for _, subbox_dir in _subbox_dirs(base_directory):
+            files += [os.path.join(subbox_dir, name) for name in os.listdir(subbox_dir)
+                      if _SNAPSHOT_PATTERN.search(name) and not name.startswith('Cluster_stat')]
+    return files
+
+
+def _entire_box_cluster_stats(region_prefix):
+    """
+    The entire-box, first-threshold Cluster_stat files of a region, as listed
+    by `find_cluster_stat_files`. The region's raw tree is walked once per
+    pipeline run or watch poll (see `forget_cluster_stat_files`), since
+    walking a large tree on a networked filesystem is slow.
+    """
+    if region_prefix not in _CLUSTER_STAT_FILES:
+        from .cluster_stats import find_cluster_stat_files
+        _CLUSTER_STAT_FILES[region_prefix] = [
+            f for f in find_cluster_stat_files({region_prefix: config.REGION_RAW_DIRS[region_prefix]})
+            if f[2] == 0 and f[1] == 1
+        ]
+    return _CLUSTER_STAT_FILES[region_prefix]
+
+
+def forget_cluster_stat_files():
+    """Drops the Cluster_stat listings, so that the next lookup walks the raw trees again."""
+    _CLUSTER_STAT_FILES.clear()
+
+
+def _entire_box_cluster_stat_files(region_prefix):
+    return [f[-1] for f in _entire_box_cluster_stats(region_prefix)]
+
+
+def _control_source(region_prefix):
+    if config.CONTROL_FILE_SOURCE != 'auto':
+        return config.CONTROL_FILE_SOURCE
+    return 'cluster_stats' if _entire_box_cluster_stat_files(region_prefix) else 'shapefinders'
+
+
+def _control_inputs(region_prefix, input_sf_csv_path):
+    if _control_source(region_prefix) == 'cluster_stats':
+        return _entire_box_cluster_stat_files(region_prefix)
+    return [input_sf_csv_path]
+
+
+def _subbox_csvs(existing_only=False, all_thresholds=False):
+    paths = []
+    for base_directory, region_prefix in (_ingest_regions() if all_thresholds else _configured_regions()):
+        for i, subbox_dir in _subbox_dirs(base_directory):
+            paths.append(os.path.join(subbox_dir, f'{region_prefix}_SF_SB{i}.csv'))
+    if existing_only:
+        paths = [p for p in paths if os.path.exists(p)]
+    return paths
+
+
+def _read_common_redshifts():
+    with open(config.COMMON_REDSHIFTS_TXT, 'r') as f:
+        return [float(l.strip()) for l in f if l.strip()]
+
+
+def _shapefinder_plot_paths(z):
+    return [
+        f"{config.PLOTS_DIR}/shapefinders/shapefinders_z_{z:.3f}.png",
+        f"{config.PLOTS_DIR}/shapefinders/PFG_z_{z:.3f}.png",
+    ]
+
+
+# --- Stage actions (heavy modules are imported only when a stage runs) ---
+
+def _run_control_file(region_prefix, input_sf_csv_path, output_cs_csv_path):
+    from .data_processing import create_control_file, create_control_file_from_cluster_stats
+    if _control_source(region_prefix) == 'cluster_stats':
+        from .cluster_stats import load_cluster_stats
+        stats = load_cluster_stats(files=_entire_box_cluster_stats(region_prefix))
+        create_control_file_from_cluster_stats(region_prefix, output_cs_csv_path, stats)
+    else:
+        create_control_file(input_sf_csv_path, output_cs_csv_path)
+
+
+def _run_ingest():
+    from .data_processing import process_all_subboxes
+    # All thresholds share one pool, so small trees do not leave workers idle
+    process_all_subboxes(_ingest_regions(), workers=config.INGEST_WORKERS)
+
+
+def _combined_catalogs():
+    # The all-thresholds catalog is only written from sub-box CSVs; without
+    # any, combine keeps the shipped small-box catalog and writes nothing
+    if config.ALL_THRESHOLDS and _subbox_csvs(existing_only=True, all_thresholds=True):
+        return [config.SHAPEFINDERS_ALL_SMALL_BOX_CSV, config.SHAPEFINDERS_ALL_THRESHOLDS_CSV]
+    return [config.SHAPEFINDERS_ALL_SMALL_BOX_CSV]
+
+
+def _run_combine():
+    from .data_processing import create_all_thresholds_csv, create_shapefinders_all_small_box_csv
+    if config.ALL_THRESHOLDS:
+        # One pass over the sub-box CSVs writes both catalogs
+        create_all_thresholds_csv(_ingest_regions(), small_box_csv=config.SHAPEFINDERS_ALL_SMALL_BOX_CSV)
+    else:
+        create_shapefinders_all_small_box_csv()
+
+
+def _run_common_redshifts():
+    from .data_processing import generate_common_redshifts_txt
+    generate_common_redshifts_txt()
+
+
+def _run_sb_analysis():
+    from .analysis import run_sb_analysis
+    from .rendering import render_summary_plots
+    render_summary_plots(sb_results=run_sb_analysis())
+
+
+def _run_shapefinders(z_list):
+    from .analysis import get_small_box_binned_stats, process_shapefinders_for_redshift
+    from .rendering import render_shapefinder_plots
+    with measure('shapefinders.binning'):
+        get_small_box_binned_stats(n_bins=8, errors=config.SHAPEFINDER_ERROR_METHOD)
+    results = []
+    for z in z_list:
+        with measure('shapefinders.redshift', z=z):
+            results.append(process_shapefinders_for_redshift(z))
+    with measure('shapefinders.render', redshifts=len(z_list)):
+        yield from render_shapefinder_plots(results, workers=config.RENDER_WORKERS)
+
+
+def _run_txb():
+    from .analysis import process_txb_for_redshifts
+    from .rendering import render_summary_plots
+    render_summary_plots(txb_results=process_txb_for_redshifts(config.FIVE_Z_FOR_TXB))
+
+
+def _binning_params():
+    params = {'strategy': config.BINNING_STRATEGY}
+    if config.BINNING_STRATEGY == 'min_count':
+        params['min_count'] = config.MIN_BIN_COUNT
+    elif config.BINNING_STRATEGY == 'bayesian_blocks':
+        params['fine_bins'] = config.BAYESIAN_BLOCKS_FINE_BINS
+        params['p0'] = config.BAYESIAN_BLOCKS_P0
+    return params
+
+
+def _band_params():
+    if config.ERROR_BAND == 'std':
+        return 'std'
+    return [config.ERROR_BAND, list(config.BAND_QUANTILES)]
+
+
+def _no_params():
+    return None
+
+
+def get_stages():
+    """
+    Returns the pipeline stages in execution order.
+
+    Each stage declares its input files, output files, the source modules and
+    configuration values it depends on, and the action that produces its
+    outputs. The modules those modules import are followed, so 'code' only
+    needs the modules a stage calls into. Inputs and outputs are callables because file lists such as the
+    raw snapshots are only known at run time. A stage flagged 'per_redshift'
+    tracks every redshift of `common_redshifts.txt` separately, with the
+    outputs of one redshift given by 'redshift_outputs'.
+    """
+    return [
+        {
+            'name': 'control_file_emission',
+            'inputs': lambda: _control_inputs('CD_OD1', config.CD_OD1_SF_EB_CSV),
+            'outputs': lambda: [config.CD_OD1_CS_EB_CSV],
+            'code': ['data_processing.py', 'snapshots.py', 'cluster_stats.py'],
+            'params': lambda: {'volume': config.TOTAL_SIMULATION_VOLUME, 'source': _control_source('CD_OD1')},
+            'run': lambda: _run_control_file('CD_OD1', config.CD_OD1_SF_EB_CSV, config.CD_OD1_CS_EB_CSV),
+        },
+        {
+            'name': 'control_file_absorption',
+            'inputs': lambda: _control_inputs('CD_UD1', config.CD_UD1_SF_EB_CSV),
+            'outputs': lambda: [config.CD_UD1_CS_EB_CSV],
+            'code': ['data_processing.py', 'snapshots.py', 'cluster_stats.py'],
+            'params': lambda: {'volume': config.TOTAL_SIMULATION_VOLUME, 'source': _control_source('CD_UD1')},
+            'run': lambda: _run_control_file('CD_UD1', config.CD_UD1_SF_EB_CSV, config.CD_UD1_CS_EB_CSV),
+        },
+        {
+            'name': 'ingest',
+            'inputs': _raw_snapshot_files,
+            'outputs': lambda: _subbox_csvs(all_thresholds=True),
+            'code': ['data_processing.py', 'thresholds.py', 'prefetch.py'],
+            'params': lambda: {'cell': config.CELL_SIZE_MPC_H, 'all_thresholds': config.ALL_THRESHOLDS},
+            'run': _run_ingest,
+        },
+        {
+            'name': 'combine',
+            'inputs': lambda: _subbox_csvs(existing_only=True, all_thresholds=True),
+            'outputs': _combined_catalogs,
+            'code': ['data_processing.py', 'thresholds.py'],
+            'params': lambda: {'all_thresholds': config.ALL_THRESHOLDS},
+            'run': _run_combine,
+        },
+        {
+            'name': 'common_redshifts',
+            'inputs': lambda: [config.SHAPEFINDERS_ALL_SMALL_BOX_CSV],
+            'outputs': lambda: [config.COMMON_REDSHIFTS_TXT],
+            'code': ['data_processing.py', 'snapshots.py'],
+            'params': _no_params,
+            'run': _run_common_redshifts,
+        },
+        {
+            'name': 'sb_analysis',
+            'inputs': lambda: [config.CD_OD1_SF_EB_CSV, config.CD_UD1_SF_EB_CSV,
+                               config.CD_OD1_CS_EB_CSV, config.CD_UD1_CS_EB_CSV]
+                              + _subbox_csvs(existing_only=True),
+            'outputs': lambda: [f'{config.PLOTS_DIR}/figure10_with_errors.png'],
+            'code': ['analysis.py', 'snapshots.py', 'filling_factor.py', 'stats.py', 'resampling.py',
+                     'plotting.py', 'rendering.py'],
+            'params': lambda: {'ffs': config.TARGET_FFS, 'bins': config.NUM_BINS, 'binning': _binning_params(),
+                               'errors': config.SB_ERROR_METHOD, 'style': config.plt_style},
+            'run': _run_sb_analysis,
+        },
+        {
+            'name': 'shapefinders',
+            'per_redshift': True,
+            'inputs': lambda: [config.SHAPEFINDERS_ALL_SMALL_BOX_CSV, config.COMMON_REDSHIFTS_TXT],
+            'outputs': lambda: [p for z in _read_common_redshifts() for p in _shapefinder_plot_paths(z)],
+            'redshift_outputs': _shapefinder_plot_paths,
+            'code': ['analysis.py', 'snapshots.py', 'stats.py', 'resampling.py', 'compact.py', 'utils.py', 'plotting.py', 'rendering.py'],
+            'params': lambda: {'errors': config.SHAPEFINDER_ERROR_METHOD, 'compact': config.COMPACT_CATALOG,
+                               'binning': _binning_params(), 'band': _band_params(), 'style': config.plt_style},
+            'run': _run_shapefinders,
+        },
+        {
+            'name': 'txb',
+            'inputs': lambda: [config.SHAPEFINDERS_ALL_SMALL_BOX_CSV],
+            'outputs': lambda: [f"{config.PLOTS_DIR}/TxB/TxB_vs_V.png"],
+            'code': ['analysis.py', 'snapshots.py', 'stats.py', 'compact.py', 'plotting.py', 'rendering.py'],
+            'params': lambda: {'z': config.FIVE_Z_FOR_TXB, 'compact': config.COMPACT_CATALOG,
+                               'binning': _binning_params(), 'band': _band_params(), 'style': config.plt_style},
+            'run': _run_txb,
+        },
+    ]
+
+
+# --- Per-redshift staleness ---
+
+def _redshift_fingerprints(stage, z_list, state):
+    """
+    Fingerprint of every redshift of a per-redshift stage: the stage's code
+    and parameters plus the catalog rows of that redshift. The catalog is only
+    loaded when its content changed since the last run. Rows are hashed per
+    canonical redshift, the form `common_redshifts.txt` lists them in.
+    """
+    from .snapshots import canonical_redshift
+    base = _stage_fingerprint(stage, [], state)
+    catalog_fp = _file_fingerprint(config.SHAPEFINDERS_ALL_SMALL_BOX_CSV, state)
+    recorded = state['redshifts'].get(stage['name'], {})
+    if recorded.get('catalog') == catalog_fp:
+        row_hashes = recorded.get('rows', {})
+    else:
+        from .catalog import load_catalog
+        df = load_catalog(config.SHAPEFINDERS_ALL_SMALL_BOX_CSV)
+        from pandas.util import hash_pandas_object
+        row_hashes = {
+            repr(float(z)): hashlib.sha1(hash_pandas_object(df_z, index=False).to_numpy().tobytes()).hexdigest()
+            for z, df_z in df.groupby(canonical_redshift(df['z'].to_numpy()), sort=False)
+        }
+    fingerprints = {
+        repr(z): hashlib.sha1((base + row_hashes.get(repr(canonical_redshift(z)), 'missing')).encode()).hexdigest()
+        for z in z_list
+    }
+    return fingerprints, catalog_fp, row_hashes
+
+
+def _run_per_redshift_stage(stage, state, dry_run, force, upstream_stale):
+    """Runs a per-redshift stage for its stale redshifts only."""
+    name = stage['name']
+    if dry_run and upstream_stale:
+        print(f"[{name}] would run for all redshifts (upstream stale)")
+        return
+    missing_inputs = [p for p in stage['inputs']() if not os.path.exists(p)]
+    if missing_inputs:
+        print(f"[{name}] blocked: missing input {missing_inputs[0]}")
+        return
+
+    z_list = _read_common_redshifts()
+    fingerprints, catalog_fp, row_hashes = _redshift_fingerprints(stage, z_list, state)
+    done = state['redshifts'].get(name, {}).get('done', {})
+    done = {k: v for k, v in done.items() if k in fingerprints}
+    # A redshift is stale if its fingerprint changed or one of the outputs its
+    # last run produced has gone missing (some redshifts legitimately produce none)
+    stale = [
+        z for z in z_list
+        if force or repr(z) not in done
+        or done[repr(z)]['fingerprint'] != fingerprints[repr(z)]
+        or not all(os.path.exists(p) for p in done[repr(z)]['outputs'])
+    ]
+    if dry_run:
+        if stale:
+            print(f"[{name}] would run for {len(stale)}/{len(z_list)} redshifts: "
+                  + ', '.join(f'{z:.3f}' for z in stale))
+        else:
+            print(f"[{name}] up to date ({len(z_list)} redshifts)")
+        return
+
+    # Record the per-redshift row hashes even if nothing reruns, so that an
+    # unchanged catalog is not reloaded next time
+    state['redshifts'][name] = {'catalog': catalog_fp, 'rows': row_hashes, 'done': done}
+    if not stale:
+        print(f"[{name}] up to date ({len(z_list)} redshifts)")
+        return
+
+    print(f"[{name}] running for {len(stale)}/{len(z_list)} redshifts")
+    with measure(name, redshifts=len(stale)):
+        for z in stage['run'](stale):
+            done[repr(z)] = {
+                'fingerprint': fingerprints[repr(z)],
+                'outputs': [p for p in stage['redshift_outputs'](z) if os.path.exists(p)],
+            }
+            _save_state(state)
+
+
+# --- Runner ---
+
+def run_pipeline(dry_run=False, force=False):
+    """
+    Runs every stale pipeline stage in order and records fingerprints of what
+    was used, so that an unchanged rerun skips everything.
+
+    A stage is stale when its fingerprint (inputs, code and parameters) differs
+    from the one recorded by its last successful run, or when an output is
+    missing. Stages with a missing input are reported as blocked and skipped.
+
+    When `config.INSTRUMENT` is on, every stage that runs (and every
+    per-redshift task) is measured and a run report is written at the end;
+    see `instrumentation`.
+
+    Args:
+        dry_run (bool): Only list the stages (and redshifts) that would rerun.
+        force (bool): Rerun every stage regardless of its fingerprint.
+    """
+    if not dry_run:
+        config.ensure_output_dirs()
+    forget_cluster_stat_files()
+    state = _load_state()
+    stale_outputs = set()
+
+    for stage in get_stages():
+        name = stage['name']
+        inputs = stage['inputs']()
+        upstream_stale = any(path in stale_outputs for path in inputs)
+
+        if stage.get('per_redshift'):
+            _run_per_redshift_stage(stage, state, dry_run, force, upstream_stale)
+            continue
+
+        missing_inputs = [p for p in inputs if not os.path.exists(p) and p not in stale_outputs]
+        if missing_inputs:
+            print(f"[{name}] blocked: missing input {missing_inputs[0]}")
+            continue
+
+        outputs = stage['outputs']()
+        fingerprint = _stage_fingerprint(stage, inputs, state)
+        reasons = []
+        if force:
+            reasons.append('forced')
+        if upstream_stale:
+            reasons.append('upstream stale')
+        if state['stages'].get(name) != fingerprint:
+            reasons.append('inputs changed')
+        if any(not os.path.exists(p) for p in outputs):
+            reasons.append('outputs missing')
+
+        if not reasons:
+            print(f"[{name}] up to date")
+            continue
+        if dry_run:
+            print(f"[{name}] would run ({', '.join(reasons)})")
+            stale_outputs.update(outputs)
+            continue
+
+        print(f"[{name}] running ({', '.join(reasons)})")
+        with measure(name):
+            stage['run']()
+        state['stages'][name] = fingerprint
+        _save_state(state)
+
+    if not dry_run:
+        _save_state(state)
+        print_results_cache_counters()
+        if config.INSTRUMENT:
+            write_report()
@@ -1,20 +1,35 @@
 # src/plotting.py
 
+import matplotlib
+from . import config
+# Select the backend before pyplot is imported, so that figures are rendered
+# headless and nothing ever waits on a display
+matplotlib.use(config.PLOT_BACKEND)
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 import pandas as pd
 import numpy as np
-from . import config
 from .utils import ensure_folder
 
+# Scales a MAD to the standard deviation of a normal distribution
+MAD_TO_SIGMA = 1.4826
+
+# FF targets per row of the SB analysis figure; more targets wrap onto further rows
+SB_PANELS_PER_ROW = 4
+
 def plot_sb_analysis(analysis_results):
     """
-    Plots the results from the SB analysis.
+    Plots the results from the SB analysis: a shapefinder panel above a
+    P, F, G panel for every FF target, SB_PANELS_PER_ROW targets per row.
     """
     plt.rcParams.update(config.plt_style)
 
-    fig, axes = plt.subplots(2, 4, figsize=(28, 14))
+    n_cols = max(1, min(len(analysis_results), SB_PANELS_PER_ROW))
+    n_rows = max(1, -(-len(analysis_results) // SB_PANELS_PER_ROW))
+    fig, axes = plt.subplots(2 * n_rows, n_cols, figsize=(7 * n_cols, 14 * n_rows), squeeze=False)
     fig.tight_layout(pad=6.0, h_pad=4.0, w_pad=3.0)
+    for ax in axes.flat[2 * n_cols * (n_rows - 1):]:
+        ax.set_visible(False)
 
     for i, (ff_target, data) in enumerate(analysis_results.items()):
         emi_binned_eb = data['emi_binned_eb']
@@ -23,8 +38,11 @@ def plot_sb_analysis(analysis_results):
         errors_abs = data['errors_abs']
         
         # --- Plotting Panels ---
-        ax_top = axes[0, i]
-        ax_bottom = axes[1, i]
+        row, col = divmod(i, SB_PANELS_PER_ROW)
+        ax_top = axes[2 * row, col]
+        ax_bottom = axes[2 * row + 1, col]
+        ax_top.set_visible(True)
+        ax_bottom.set_visible(True)
 
         if not emi_binned_eb.empty and not errors_emi.empty:
             common_index_emi = emi_binned_eb.index.intersection(errors_emi.index)
@@ -91,60 +109,64 @@ def plot_sb_analysis(analysis_results):
                       loc='lower right', ncol=1, frameon=False)
 
     # --- Save and Show the Final Figure ---
+    ensure_folder(config.PLOTS_DIR)
     plt.savefig(f'{config.PLOTS_DIR}/figure10_with_errors.png', dpi=300, bbox_inches='tight')
     print(f"\nPlot saved as '{config.PLOTS_DIR}/figure10_with_errors.png'")
-    plt.show()
+    plt.close(fig)
 
-def plot_shapefinders_for_redshift(data):
-    
-    from .utils import ensure_folder
-    
-    z_value = data['z_value']
+def _band(data, key, mask=None):
+    """
+    Points and error bars of a binned quantity for the error band the
+    results were computed with ('band', see `config.ERROR_BAND`): weighted
+    mean and std, weighted median and quantile range (asymmetric bars), or
+    weighted median and the MAD scaled to a normal sigma.
+    """
+    band = data.get('band', 'std')
+    if mask is None:
+        mask = slice(None)
+    if band == 'quantiles':
+        median = data[f'{key}_median'][mask]
+        return median, np.vstack([median - data[f'{key}_qlo'][mask], data[f'{key}_qhi'][mask] - median])
+    if band == 'mad':
+        return data[f'{key}_median'][mask], MAD_TO_SIGMA * data[f'{key}_mad'][mask]
+    return data[f'{key}_mean'][mask], data[f'{key}_std'][mask]
+
+def _shapefinder_fit_curves(data):
+    """Volume grid and fitted power-law curves drawn over the binned points."""
     vol_mean = data['vol_mean']
-
-    if vol_mean.size == 0:
-        print(f"Warning: No data to plot for shapefinders at z={z_value}. Skipping plot generation.")
-        return
-
-    vol_std = data['vol_std']
-    T_mean = data['T_mean']
-    T_std = data['T_std']
-    B_mean = data['B_mean']
-    B_std = data['B_std']
-    L_mean = data['L_mean']
-    L_std = data['L_std']
-    P_mean = data['P_mean']
-    P_std = data['P_std']
-    F_mean = data['F_mean']
-    F_std = data['F_std']
-    G_mean = data['G_mean']
-    G_std = data['G_std']
     fits = data['fits']
-    masks = data['masks']
-
     # 8) Prepare finer volume vector for fit curves
     vol_fit = np.logspace(np.log10(vol_mean.min()), np.log10(vol_mean.max()), 200)
-    T_fit = 10**(fits['T'][0] * np.log10(vol_fit) + fits['T'][1])
-    B_fit = 10**(fits['B'][0] * np.log10(vol_fit) + fits['B'][1])
-    L_fit = 10**(fits['L'][0] * np.log10(vol_fit) + fits['L'][1])
-    P_fit = 10**(fits['P'][0] * np.log10(vol_fit) + fits['P'][1])
-    G_fit = 10**(fits['G'][0] * np.log10(vol_fit) + fits['G'][1])
+    curves = {q: 10**(fits[q][0] * np.log10(vol_fit) + fits[q][1]) for q in ['T', 'B', 'L', 'P', 'G']}
+    return vol_fit, curves
+
+def plot_tbl_for_redshift(data):
+    """
+    Plots T, B and L against volume for one redshift and saves
+    shapefinders/shapefinders_z_<z>.png.
+    """
+    z_value = data['z_value']
+    vol, vol_err = _band(data, 'vol')
+    vol_fit, curves = _shapefinder_fit_curves(data)
 
     # 9) Plot 1: T, B, L vs Volume (two y‐axes)
     fig, ax1 = plt.subplots(figsize=(8, 6))
     ax2 = ax1.twinx()
 
-    ax1.errorbar(vol_mean, T_mean, xerr=vol_std, yerr=T_std,
+    T, T_err = _band(data, 'T')
+    ax1.errorbar(vol, T, xerr=vol_err, yerr=T_err,
                  fmt='o', color='red', capsize=3, label=r'Thickness $T$')
-    ax1.plot(vol_fit, T_fit, linestyle=':', color='red')
+    ax1.plot(vol_fit, curves['T'], linestyle=':', color='red')
 
-    ax1.errorbar(vol_mean, B_mean, xerr=vol_std, yerr=B_std,
+    B, B_err = _band(data, 'B')
+    ax1.errorbar(vol, B, xerr=vol_err, yerr=B_err,
                  fmt='s', color='blue', capsize=3, label=r'Breadth $B$')
-    ax1.plot(vol_fit, B_fit, linestyle=':', color='blue')
+    ax1.plot(vol_fit, curves['B'], linestyle=':', color='blue')
 
-    ax2.errorbar(vol_mean, L_mean, xerr=vol_std, yerr=L_std,
+    L, L_err = _band(data, 'L')
+    ax2.errorbar(vol, L, xerr=vol_err, yerr=L_err,
                  fmt='^', color='teal', capsize=3, label=r'Length $L$')
-    ax2.plot(vol_fit, L_fit, linestyle=':', color='teal')
+    ax2.plot(vol_fit, curves['L'], linestyle=':', color='teal')
 
     ax1.set_xscale('log')
     ax1.set_yscale('log')
@@ -163,27 +185,40 @@ def plot_shapefinders_for_redshift(data):
     fig.savefig(f"{config.PLOTS_DIR}/shapefinders/shapefinders_z_{z_value:.3f}.png")
     plt.close(fig)
 
+def plot_pfg_for_redshift(data):
+    """
+    Plots P, F and Genus against volume for one redshift and saves
+    shapefinders/PFG_z_<z>.png.
+    """
+    z_value = data['z_value']
+    masks = data['masks']
+    vol_fit, curves = _shapefinder_fit_curves(data)
+
     # 10) Plot 2: P, F, Genus vs Volume
     fig, ax1 = plt.subplots(figsize=(8, 6))
     ax2 = ax1.twinx()
 
-    ax1.errorbar(vol_mean[masks['P']], P_mean[masks['P']],
-                 xerr=vol_std[masks['P']], yerr=P_std[masks['P']],
+    vol, vol_err = _band(data, 'vol', masks['P'])
+    P, P_err = _band(data, 'P', masks['P'])
+    ax1.errorbar(vol, P, xerr=vol_err, yerr=P_err,
                  fmt='o', color='red', capsize=3, label=r'Planarity $P$')
-    ax1.plot(vol_fit, P_fit, linestyle='--', color='red')
+    ax1.plot(vol_fit, curves['P'], linestyle='--', color='red')
 
-    ax1.errorbar(vol_mean, F_mean, xerr=vol_std, yerr=F_std,
+    vol, vol_err = _band(data, 'vol')
+    F, F_err = _band(data, 'F')
+    ax1.errorbar(vol, F, xerr=vol_err, yerr=F_err,
                  fmt='s', color='blue', capsize=3, label=r'Filamentarity $F$')
     # Join F points with a dashed line
-    sorted_idx = np.argsort(vol_mean)
-    vol_sorted = vol_mean[sorted_idx]
-    F_sorted = F_mean[sorted_idx]
+    sorted_idx = np.argsort(vol)
+    vol_sorted = vol[sorted_idx]
+    F_sorted = F[sorted_idx]
     ax1.plot(vol_sorted, F_sorted, linestyle='-', color='blue', alpha=0.7)
 
-    ax2.errorbar(vol_mean[masks['G']], G_mean[masks['G']],
-                 xerr=vol_std[masks['G']], yerr=G_std[masks['G']],
+    vol, vol_err = _band(data, 'vol', masks['G'])
+    G, G_err = _band(data, 'G', masks['G'])
+    ax2.errorbar(vol, G, xerr=vol_err, yerr=G_err,
                  fmt='^', color='teal', capsize=3, label=r'Genus')
-    ax2.plot(vol_fit, G_fit, linestyle=':', color='teal', alpha=0.9)
+    ax2.plot(vol_fit, curves['G'], linestyle=':', color='teal', alpha=0.9)
 
     ax1.set_xscale('log')
     ax1.set_yscale('log')
@@ -201,8 +236,11 @@ def plot_shapefinders_for_redshift(data):
     fig.savefig(f"{config.PLOTS_DIR}/shapefinders/PFG_z_{z_value:.3f}.png")
     plt.close(fig)
 
+def print_slopes(data):
+    """Prints the fitted log-log slopes of one redshift."""
+    fits = data['fits']
     # 11) Print slopes
-    print(f"[z={z_value}] Slopes:")
+    print(f"[z={data['z_value']}] Slopes:")
     print(f"  mT  = {fits['T'][0]:.3f}")
     print(f"  mB  = {fits['B'][0]:.3f}")
     print(f"  mL  = {fits['L'][0]:.3f}")
@@ -210,6 +248,19 @@ def plot_shapefinders_for_redshift(data):
     print(f"  mG  = {fits['G'][0]:.3f}")
     print("")
 
+def plot_shapefinders_for_redshift(data):
+    """
+    Plots both shapefinder figures of one redshift and prints the slopes.
+    See `rendering.render_shapefinder_plots` for rendering many redshifts
+    in parallel.
+    """
+    if data['vol_mean'].size == 0:
+        print(f"Warning: No data to plot for shapefinders at z={data['z_value']}. Skipping plot generation.")
+        return
+    plot_tbl_for_redshift(data)
+    plot_pfg_for_redshift(data)
+    print_slopes(data)
+
 def plot_txb_for_redshifts(results):
     """
     For each z in z_values, compute T×B in each volume bin and plot
@@ -218,7 +269,9 @@ def plot_txb_for_redshifts(results):
     plt.figure(figsize=(8, 6))
 
     for z, data in results.items():
-        plt.errorbar(data['vol_mean'], data['TXB_mean'], xerr=data['vol_std'], yerr=data['TXB_std'],
+        vol, vol_err = _band(data, 'vol')
+        TXB, TXB_err = _band(data, 'TXB')
+        plt.errorbar(vol, TXB, xerr=vol_err, yerr=TXB_err,
                      fmt='o-', capsize=3, label=f"z={z:.3f}")
 
     plt.xscale('log')
@@ -233,3 +286,89 @@ def plot_txb_for_redshifts(results):
     plt.savefig(f"{config.PLOTS_DIR}/TxB/TxB_vs_V.png")
     plt.close()
     print(f"Saved TxB plot to {config.PLOTS_DIR}/TxB/TxB_vs_V.png")
+
+def _binned_slopes(df, columns, n_bins=8):
+    """
+    Mean and standard deviation of slope columns in n_bins equal-width bins
+    of integer redshift, skipping empty bins.
+    """
+    z_int = df['z'].astype(int)
+    bins = np.linspace(z_int.min(), z_int.max(), n_bins + 1)  # Use float to ensure unique edges
+    grouped = df[columns].groupby(pd.cut(z_int, bins=bins, include_lowest=True), observed=True)
+    means = grouped.mean()
+    # Population std, as for equally weighted slopes
+    stds = grouped.std(ddof=0)
+    centers = np.array([interval.mid for interval in means.index])
+    return centers, means, stds
+
+def plot_slopes_tbl(df):
+    """
+    Plots the T, B, TxB (left axis) and L (right axis) slopes against
+    redshift, binned in integer redshift with the scatter as error bars.
+
+    Args:
+        df (pd.DataFrame): Slopes table of `slopes.extract_and_save_slopes`.
+    """
+    z_centers, means, stds = _binned_slopes(df, ['mT', 'mB', 'mTxB', 'mL'])
+
+    fig, ax1 = plt.subplots(figsize=(8, 6))
+    ax2 = ax1.twinx()
+
+    # Left y-axis: mT, mB, mTxB
+    ax1.errorbar(z_centers, means['mT'], yerr=stds['mT'], fmt='o-', label='$m_T$')
+    ax1.errorbar(z_centers, means['mB'], yerr=stds['mB'], fmt='s-', label='$m_B$')
+    ax1.errorbar(z_centers, means['mTxB'], yerr=stds['mTxB'], fmt='d:',
+                 label=r'$m_{T\times B} = m_B \times m_T$')
+
+    # Right y-axis: mL
+    ax2.errorbar(z_centers, means['mL'], yerr=stds['mL'], fmt='^--', color='tab:purple',
+                 label='$m_L$')
+
+    ax1.set_xlabel('Redshift Bin Center')
+    ax1.set_ylabel(r'Slopes: $m_T$, $m_B$, $m_{T\times B}$')
+    ax2.set_ylabel(r'Slope: $m_L$', color='tab:purple')
+    ax2.tick_params(axis='y', labelcolor='tab:purple')
+
+    # Combine legends from both axes
+    lines1, labels1 = ax1.get_legend_handles_labels()
+    lines2, labels2 = ax2.get_legend_handles_labels()
+    ax1.legend(lines1 + lines2, labels1 + labels2, loc='best')
+
+    plt.title('Slope vs Redshift (Binned, with Std Dev)')
+    plt.tight_layout()
+
+    ensure_folder(f"{config.PLOTS_DIR}/slopes/TBL")
+    fig.savefig(f"{config.PLOTS_DIR}/slopes/TBL/slopes_TBL.png")
+    plt.close(fig)
+    print(f"Saved T,B,L,TxB slopes vs redshift to {config.PLOTS_DIR}/slopes/TBL/slopes_TBL.png")
+
+def plot_slopes_pg(df):
+    """
+    Plots the planarity and genus slopes against integer redshift.
+
+    Args:
+        df (pd.DataFrame): Slopes table of `slopes.extract_and_save_slopes`.
+    """
+    grouped = df[['mP', 'mG']].groupby(df['z'].astype(int).rename('z_int')).mean().reset_index()
+
+    fig, ax1 = plt.subplots(figsize=(8, 6))
+    ax2 = ax1.twinx()
+
+    ax1.plot(grouped['z_int'], grouped['mP'], 'o-', color='tab:red', label='mP')
+    ax2.plot(grouped['z_int'], grouped['mG'], '^--', color='tab:blue', label='mG')
+
+    ax1.set_xlabel('Integer Redshift')
+    ax1.set_ylabel(r'Slope $m_P$ (Planarity)')
+    ax2.set_ylabel(r'Slope $m_G$ (Genus)')
+
+    lines1, labels1 = ax1.get_legend_handles_labels()
+    lines2, labels2 = ax2.get_legend_handles_labels()
+    ax1.legend(lines1 + lines2, labels1 + labels2, loc='best')
+
+    plt.title('Slopes mP and mG vs Redshift')
+    plt.tight_layout()
+
+    ensure_folder(f"{config.PLOTS_DIR}/slopes/PG")
+    fig.savefig(f"{config.PLOTS_DIR}/slopes/PG/slopes_PG.png")
+    plt.close(fig)
+    print(f"Saved Planarity/Genus slopes vs redshift to {config.PLOTS_DIR}/slopes/PG/slopes_PG.png")
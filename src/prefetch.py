@@ -0,0 +1,169 @@
+# src/prefetch.py
+
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from . import config
+
+# Raw file reads of this process: files and bytes read, time spent in the
+# reads (summed over the reader threads), time the consumer spent waiting for
+# data, and wall time of the prefetched sequences
+_COUNTERS = {'files': 0, 'bytes': 0, 'read_s': 0.0, 'wait_s': 0.0, 'wall_s': 0.0}
+
+
+def read_file(path, buffer_size=None):
+    """
+    Reads a whole file in requests of buffer_size bytes (default
+    `config.READ_BUFFER_KB`), the unit a networked filesystem fetches at once.
+    """
+    if buffer_size is None:
+        buffer_size = config.READ_BUFFER_KB * 1024
+    chunks = []
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            chunk = f.read(buffer_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def throttled_reader(latency_s, bandwidth_mb_s, buffer_size=None):
+    """
+    A `read_file` that behaves like a slow shared filesystem, for testing the
+    prefetcher on a local disk: every file costs latency_s before its first
+    byte and every request is limited to bandwidth_mb_s. Sleeping releases
+    the GIL like a blocking read does, so overlapping reads overlap here too.
+    """
+    if buffer_size is None:
+        buffer_size = config.READ_BUFFER_KB * 1024
+
+    def read(path):
+        time.sleep(latency_s)
+        chunks = []
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                chunk = f.read(buffer_size)
+                if not chunk:
+                    break
+                time.sleep(len(chunk) / (bandwidth_mb_s * 1024 ** 2))
+                chunks.append(chunk)
+        return b''.join(chunks)
+    return read
+
+
+def parse_throttle(spec):
+    """(latency_s, bandwidth_mb_s) of a 'LATENCY_MS,MB_PER_S' spec such as '20,50', or None."""
+    if not spec:
+        return None
+    latency_ms, bandwidth = (float(v) for v in spec.split(','))
+    return latency_ms / 1000.0, bandwidth
+
+
+def raw_reader():
+    """File reader for raw snapshot files: `read_file`, throttled per `config.IO_THROTTLE`."""
+    throttle = parse_throttle(config.IO_THROTTLE)
+    if throttle is None:
+        return read_file
+    return throttled_reader(*throttle)
+
+
+def _timed_read(reader, path):
+    start = time.perf_counter()
+    try:
+        data, error = reader(path), None
+    except OSError as e:
+        data, error = None, e
+    return data, error, time.perf_counter() - start
+
+
+def prefetch(paths, depth=None, threads=None, reader=None):
+    """
+    Reads files in a bounded pool of threads, up to depth files ahead of the
+    consumer, so that the reads of the next files overlap with the processing
+    of the current one. Files are yielded in order; at most depth of them are
+    held in memory.
+
+    Args:
+        paths (iterable): Files to read, consumed lazily.
+        depth (int): Read-ahead depth in files. Defaults to `config.PREFETCH_DEPTH`.
+        threads (int): Reader threads. Defaults to `config.PREFETCH_THREADS`.
+        reader (callable): path -> bytes. Defaults to `raw_reader()`.
+
+    Yields:
+        tuple: (path, data, error): the file's bytes, or None and the OSError
+               raised by the read.
+    """
+    if depth is None:
+        depth = config.PREFETCH_DEPTH
+    if threads is None:
+        threads = config.PREFETCH_THREADS
+    if reader is None:
+        reader = raw_reader()
+    paths = iter(paths)
+    pending = deque()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(threads, depth))) as executor:
+        def fill():
+            while len(pending) < max(1, depth):
+                path = next(paths, None)
+                if path is None:
+                    return
+                pending.append((path, executor.submit(_timed_read, reader, path)))
+
+        try:
+            fill()
+            while pending:
+                path, future = pending.popleft()
+                wait_start = time.perf_counter()
+                data, error, read_s = future.result()
+                _COUNTERS['wait_s'] += time.perf_counter() - wait_start
+                _COUNTERS['read_s'] += read_s
+                _COUNTERS['files'] += 1
+                _COUNTERS['bytes'] += len(data) if data is not None else 0
+                # Queue the next reads before handing this file over
+                fill()
+                yield path, data, error
+        finally:
+            for _, future in pending:
+                future.cancel()
+            _COUNTERS['wall_s'] += time.perf_counter() - start
+
+
+def overlap_efficiency(counters=None):
+    """
+    Share of the read time the consumer did not have to wait for: 1 when
+    every read was hidden behind processing, 0 when reads and processing
+    took turns. None if nothing was read.
+    """
+    c = _COUNTERS if counters is None else counters
+    if c['read_s'] <= 0:
+        return None
+    return max(0.0, 1.0 - c['wait_s'] / c['read_s'])
+
+
+def prefetch_counters():
+    """Files, bytes, read, wait and wall time of this process, and the overlap efficiency."""
+    return {**_COUNTERS, 'overlap_efficiency': overlap_efficiency()}
+
+
+def add_prefetch_counters(counters):
+    """Adds the reads of another process, e.g. a pool worker's `prefetch_counters()`, to this one's."""
+    for name in _COUNTERS:
+        _COUNTERS[name] += counters[name]
+
+
+def reset_prefetch_counters():
+    for name in _COUNTERS:
+        _COUNTERS[name] = type(_COUNTERS[name])(0)
+
+
+def print_prefetch_counters():
+    """Prints the reads of this process and the workers it added, if there were any."""
+    c = _COUNTERS
+    if not c['files']:
+        return
+    efficiency = overlap_efficiency()
+    print(f"Read {c['files']} raw files ({c['bytes'] / 1024 ** 2:.1f} MB) ahead of the parser: "
+          f"{c['read_s']:.2f} s of reads, {c['wait_s']:.2f} s waited, overlap efficiency "
+          + (f"{efficiency:.0%}" if efficiency is not None else "n/a"))
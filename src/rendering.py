@@ -0,0 +1,107 @@
+# src/rendering.py
+
+from concurrent.futures import ProcessPoolExecutor
+from . import config
+from .plotting import (
+    plt,
+    plot_sb_analysis,
+    plot_tbl_for_redshift,
+    plot_pfg_for_redshift,
+    plot_txb_for_redshifts,
+    print_slopes
+)
+
+
+def _render(job):
+    """
+    Renders one figure job, a (plot function, precomputed data) pair. The
+    plot style is applied per job so that a figure looks the same whichever
+    process renders it and whatever was rendered before.
+    """
+    plot_func, data = job
+    with plt.rc_context(config.plt_style):
+        plot_func(data)
+
+
+def render_jobs(jobs, workers=None):
+    """
+    Renders figure jobs, in a pool of worker processes when workers > 1.
+
+    Every job only needs its precomputed data, so no analysis is repeated in
+    the workers.
+
+    Args:
+        jobs (list): (plot function, data) pairs. The functions must be
+                     module-level so that they can be sent to a worker.
+        workers (int): Number of worker processes. Defaults to `config.RENDER_WORKERS`.
+
+    Yields:
+        int: Index of every job once its figure is written, in job order.
+    """
+    if workers is None:
+        workers = config.RENDER_WORKERS
+    jobs = list(jobs)
+    if workers <= 1 or len(jobs) <= 1:
+        for i, job in enumerate(jobs):
+            _render(job)
+            yield i
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        futures = [executor.submit(_render, job) for job in jobs]
+        for i, future in enumerate(futures):
+            future.result()
+            yield i
+
+
+def shapefinder_jobs(data):
+    """
+    Figure jobs (shapefinders_z_*.png and PFG_z_*.png) of one redshift, or
+    none if the redshift has no binned data.
+    """
+    if data['vol_mean'].size == 0:
+        print(f"Warning: No data to plot for shapefinders at z={data['z_value']}. Skipping plot generation.")
+        return []
+    return [(plot_tbl_for_redshift, data), (plot_pfg_for_redshift, data)]
+
+
+def render_shapefinder_plots(results, workers=None):
+    """
+    Renders the per-redshift shapefinder figures of many redshifts in parallel.
+
+    Args:
+        results (iterable): Outputs of `analysis.process_shapefinders_for_redshift`.
+        workers (int): Number of worker processes. Defaults to `config.RENDER_WORKERS`.
+
+    Yields:
+        float: Each redshift once all its figures are written, in input order.
+    """
+    jobs, last_job = [], []
+    for data in results:
+        z_jobs = shapefinder_jobs(data)
+        if z_jobs:
+            print_slopes(data)
+        jobs.extend(z_jobs)
+        last_job.append((data['z_value'], len(jobs) - 1))
+
+    # Jobs finish in order, so a redshift is complete once its last job is
+    n_done = 0
+    for i in render_jobs(jobs, workers):
+        while n_done < len(last_job) and last_job[n_done][1] <= i:
+            yield last_job[n_done][0]
+            n_done += 1
+    for z_value, _ in last_job[n_done:]:
+        yield z_value
+
+
+def render_summary_plots(sb_results=None, txb_results=None, workers=None):
+    """
+    Renders figure10_with_errors.png and the TxB figure from precomputed
+    results, in parallel when both are given.
+    """
+    jobs = []
+    if sb_results is not None:
+        jobs.append((plot_sb_analysis, sb_results))
+    if txb_results is not None:
+        jobs.append((plot_txb_for_redshifts, txb_results))
+    for _ in render_jobs(jobs, workers):
+        pass
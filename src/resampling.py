@@ -0,0 +1,167 @@
+# src/resampling.py
+
+import numpy as np
+
+# Upper limit on the number of array elements materialised per resampling batch
+MAX_BATCH_ELEMENTS = 2 ** 24
+
+
+def unit_bin_sums(unit, flat, n_units, size, values, weights):
+    """
+    Accumulates the weighted sums needed for binned means and stds, separately
+    for every resampling unit (e.g. sub-box).
+
+    Args:
+        unit (np.ndarray): Unit index (0..n_units-1) of every row.
+        flat (np.ndarray): Bin index (0..size-1) of every row.
+        n_units (int): Number of resampling units.
+        size (int): Number of bins.
+        values (np.ndarray): Row values, shape (n_rows, n_quantities).
+        weights (np.ndarray): Row weights, shape (n_rows,).
+
+    Returns:
+        tuple: (S0, S1, S2) with S0 = sum(w) of shape (n_units, size) and
+               S1 = sum(w*x), S2 = sum(w*x**2) of shape (n_units, size, n_quantities).
+    """
+    idx = unit * size + flat
+    n = n_units * size
+    S0 = np.bincount(idx, weights=weights, minlength=n).reshape(n_units, size)
+    S1 = np.empty((n_units, size, values.shape[1]))
+    S2 = np.empty_like(S1)
+    for q in range(values.shape[1]):
+        wx = weights * values[:, q]
+        S1[:, :, q] = np.bincount(idx, weights=wx, minlength=n).reshape(n_units, size)
+        S2[:, :, q] = np.bincount(idx, weights=wx * values[:, q], minlength=n).reshape(n_units, size)
+    return S0, S1, S2
+
+
+def moments_from_sums(S0, S1, S2):
+    """
+    Weighted means and stds from (S0, S1, S2) sums. S0 broadcasts against the
+    trailing quantity axis of S1 and S2.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        S0 = S0[..., None]
+        mean = S1 / S0
+        var = np.maximum(S2 / S0 - mean ** 2, 0.0)
+    return mean, np.sqrt(var)
+
+
+def jackknife_errors(S0, S1, S2):
+    """
+    Delete-one-unit jackknife errors of the binned weighted means and stds.
+
+    All leave-one-out estimates are obtained at once by subtracting each
+    unit's sums from the totals.
+
+    Returns:
+        tuple: (mean_err, std_err), each of shape (size, n_quantities).
+    """
+    n_units = S0.shape[0]
+    mean_i, std_i = moments_from_sums(S0.sum(axis=0) - S0, S1.sum(axis=0) - S1, S2.sum(axis=0) - S2)
+    factor = (n_units - 1) / n_units
+    mean_err = np.sqrt(factor * ((mean_i - mean_i.mean(axis=0)) ** 2).sum(axis=0))
+    std_err = np.sqrt(factor * ((std_i - std_i.mean(axis=0)) ** 2).sum(axis=0))
+    return mean_err, std_err
+
+
+def bootstrap_errors(S0, S1, S2, n_resamples=1000, seed=None):
+    """
+    Bootstrap errors of the binned weighted means and stds, resampling whole
+    units with replacement.
+
+    Each resample is a vector of multiplicities over the units, so a batch of
+    resamples is a single matrix product with the per-unit sums.
+
+    Returns:
+        tuple: (mean_err, std_err), each of shape (size, n_quantities).
+    """
+    rng = np.random.default_rng(seed)
+    n_units, size, n_q = S1.shape
+    batch = max(1, MAX_BATCH_ELEMENTS // max(1, size * n_q))
+    means, stds = [], []
+    for start in range(0, n_resamples, batch):
+        r = min(batch, n_resamples - start)
+        counts = rng.multinomial(n_units, np.full(n_units, 1.0 / n_units), size=r).astype(np.float64)
+        mean, std = moments_from_sums(counts @ S0,
+                                      np.tensordot(counts, S1, axes=(1, 0)),
+                                      np.tensordot(counts, S2, axes=(1, 0)))
+        means.append(mean)
+        stds.append(std)
+    return _spread(np.concatenate(means)), _spread(np.concatenate(stds))
+
+
+def cluster_jackknife_errors(flat, size, values, weights):
+    """
+    Delete-one-cluster jackknife errors of the binned weighted means and stds.
+
+    The leave-one-out estimate of every cluster follows in closed form from
+    the bin totals, so the cost is linear in the number of clusters.
+
+    Returns:
+        tuple: (mean_err, std_err), each of shape (size, n_quantities).
+    """
+    n_q = values.shape[1]
+    T0 = np.bincount(flat, weights=weights, minlength=size)
+    n = np.bincount(flat, minlength=size).astype(np.float64)
+    factor = np.where(n > 0, (n - 1) / np.maximum(n, 1), np.nan)
+    mean_err = np.empty((size, n_q))
+    std_err = np.empty((size, n_q))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        S0_i = T0[flat] - weights
+        for q in range(n_q):
+            x = values[:, q]
+            wx = weights * x
+            T1 = np.bincount(flat, weights=wx, minlength=size)
+            T2 = np.bincount(flat, weights=wx * x, minlength=size)
+            mean_i = (T1[flat] - wx) / S0_i
+            std_i = np.sqrt(np.maximum((T2[flat] - wx * x) / S0_i - mean_i ** 2, 0.0))
+            for est, out in ((mean_i, mean_err), (std_i, std_err)):
+                est_bar = np.bincount(flat, weights=est, minlength=size) / n
+                ss = np.bincount(flat, weights=(est - est_bar[flat]) ** 2, minlength=size)
+                out[:, q] = np.sqrt(factor * ss)
+    return mean_err, std_err
+
+
+def cluster_bootstrap_errors(flat, size, values, weights, n_resamples=1000, seed=None):
+    """
+    Bootstrap errors of the binned weighted means and stds, resampling
+    individual clusters.
+
+    Uses the Poisson bootstrap (independent Poisson(1) multiplicities per
+    cluster), which allows a batch of resamples to be accumulated with a
+    single bincount per quantity. Cost is O(n_resamples * n_clusters).
+
+    Returns:
+        tuple: (mean_err, std_err), each of shape (size, n_quantities).
+    """
+    rng = np.random.default_rng(seed)
+    n_rows, n_q = values.shape
+    batch = max(1, MAX_BATCH_ELEMENTS // max(1, n_rows))
+    means, stds = [], []
+    for start in range(0, n_resamples, batch):
+        r = min(batch, n_resamples - start)
+        mult = rng.poisson(1.0, size=(r, n_rows)).astype(np.float64)
+        idx = (np.arange(r)[:, None] * size + flat).ravel()
+        w = (mult * weights).ravel()
+        S0 = np.bincount(idx, weights=w, minlength=r * size).reshape(r, size)
+        S1 = np.empty((r, size, n_q))
+        S2 = np.empty_like(S1)
+        for q in range(n_q):
+            x = np.broadcast_to(values[:, q], (r, n_rows)).ravel()
+            S1[:, :, q] = np.bincount(idx, weights=w * x, minlength=r * size).reshape(r, size)
+            S2[:, :, q] = np.bincount(idx, weights=w * x * x, minlength=r * size).reshape(r, size)
+        mean, std = moments_from_sums(S0, S1, S2)
+        means.append(mean)
+        stds.append(std)
+    return _spread(np.concatenate(means)), _spread(np.concatenate(stds))
+
+
+def _spread(estimates):
+    """Standard deviation over the resample axis, ignoring empty resamples."""
+    valid = np.isfinite(estimates)
+    n = valid.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(valid, estimates, 0.0).sum(axis=0) / n
+        ss = np.where(valid, (estimates - mean) ** 2, 0.0).sum(axis=0)
+        return np.where(n > 1, np.sqrt(ss / (n - 1)), np.nan)
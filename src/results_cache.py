@@ -0,0 +1,170 @@
+# src/results_cache.py
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from . import config
+from .fingerprint import file_signature, file_hash
+
+# Persistent cache of analysis results (binned statistics) in RESULTS_CACHE_DIR.
+# Every entry is a columnar directory (see `columnar`) named after the hash of
+# its key. The index records the size and last use of every entry, for LRU
+# eviction, and the content hashes of the source files keys refer to.
+INDEX_FILE = 'index.json'
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Lookups of this process
+_COUNTERS = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+
+def _index_path():
+    return os.path.join(config.RESULTS_CACHE_DIR, INDEX_FILE)
+
+
+def _read_index():
+    try:
+        with open(_index_path(), 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    index.setdefault('entries', {})
+    index.setdefault('sources', {})
+    return index
+
+
+def _write_index(index):
+    """Atomically replaces the index."""
+    os.makedirs(config.RESULTS_CACHE_DIR, exist_ok=True)
+    path = _index_path()
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _entry_dir(key):
+    return os.path.join(config.RESULTS_CACHE_DIR, key)
+
+
+def _dir_bytes(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+def source_fingerprint(path):
+    """
+    Content hash of a source file for use in result keys, or None if it does
+    not exist. Like the pipeline fingerprints, the hash is only recomputed
+    when the file's size or mtime differ from the recorded ones, so a catalog
+    rewritten with the same content keeps its cached results.
+    """
+    abs_path = os.path.abspath(path)
+    try:
+        size, mtime_ns = file_signature(abs_path)
+    except OSError:
+        return None
+    index = _read_index()
+    record = index['sources'].get(abs_path)
+    if record is not None and record[0] == size and record[1] == mtime_ns:
+        return record[2]
+    digest = file_hash(abs_path)
+    index['sources'][abs_path] = [size, mtime_ns, digest]
+    _write_index(index)
+    return digest
+
+
+def code_fingerprint(modules):
+    """Hash of the source of the given package modules, e.g. ['stats.py']."""
+    h = hashlib.sha1()
+    for name in modules:
+        h.update(name.encode())
+        h.update(file_hash(os.path.join(SRC_DIR, name)).encode())
+    return h.hexdigest()
+
+
+def results_key(parts):
+    """Cache key of a result described by a JSON-serializable dict."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+
+def load_results(key):
+    """
+    Looks up a cached result and marks it as used.
+
+    Returns:
+        tuple: (pd.DataFrame, columnar header), or None on a miss or when
+               `config.RESULTS_CACHE` is off.
+    """
+    from .columnar import open_columnar
+    if not config.RESULTS_CACHE:
+        return None
+    try:
+        df, header = open_columnar(_entry_dir(key), mmap=False)
+    except FileNotFoundError:
+        _COUNTERS['misses'] += 1
+        return None
+    _COUNTERS['hits'] += 1
+    index = _read_index()
+    if key not in index['entries']:
+        index['entries'][key] = {'bytes': _dir_bytes(_entry_dir(key))}
+    index['entries'][key]['last_used'] = time.time()
+    _write_index(index)
+    return df, header
+
+
+def store_results(key, df, snapshot_col=None, meta=None):
+    """
+    Stores a result table under key (see `columnar.write_columnar` for
+    snapshot_col and meta), then evicts the least recently used entries
+    until the cache fits in `config.RESULTS_CACHE_MAX_MB`.
+    """
+    from .columnar import write_columnar
+    if not config.RESULTS_CACHE:
+        return
+    directory = _entry_dir(key)
+    os.makedirs(config.RESULTS_CACHE_DIR, exist_ok=True)
+    write_columnar(df, directory, snapshot_col, meta={'results_key': key, **(meta or {})})
+    _COUNTERS['stores'] += 1
+    index = _read_index()
+    index['entries'][key] = {'bytes': _dir_bytes(directory), 'last_used': time.time()}
+    _evict(index, config.RESULTS_CACHE_MAX_MB * 1024 ** 2)
+    _write_index(index)
+
+
+def _evict(index, max_bytes):
+    """Drops entries of index, least recently used first, until they fit in max_bytes."""
+    entries = index['entries']
+    for key in [k for k in entries if not os.path.isdir(_entry_dir(k))]:
+        del entries[key]
+    total = sum(entry['bytes'] for entry in entries.values())
+    for key in sorted(entries, key=lambda k: entries[k]['last_used']):
+        if total <= max_bytes:
+            break
+        total -= entries.pop(key)['bytes']
+        shutil.rmtree(_entry_dir(key), ignore_errors=True)
+        _COUNTERS['evictions'] += 1
+
+
+def clear_results_cache():
+    """Deletes every cached result."""
+    shutil.rmtree(config.RESULTS_CACHE_DIR, ignore_errors=True)
+
+
+def results_cache_counters():
+    """Hits, misses, stores and evictions of this process."""
+    return dict(_COUNTERS)
+
+
+def reset_results_cache_counters():
+    for name in _COUNTERS:
+        _COUNTERS[name] = 0
+
+
+def print_results_cache_counters():
+    """Prints the lookups of this process, if there were any."""
+    c = _COUNTERS
+    if c['hits'] or c['misses']:
+        print(f"Results cache: {c['hits']} hits, {c['misses']} misses, "
+              f"{c['stores']} stored, {c['evictions']} evicted")
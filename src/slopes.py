@@ -0,0 +1,92 @@
+# src/slopes.py
+
+import os
+import numpy as np
+import pandas as pd
+from . import config
+from .catalog import open_catalog
+from .utils import batched_loglog_fit, ensure_folder
+from .stats import grouped_binned_stats
+from .snapshots import build_snapshot_index, canonical_redshift, snapshot
+
+SLOPE_QUANTITIES = ['T', 'B', 'L', 'P', 'F', 'Genus', 'TxB']
+SLOPE_NAMES = ['mT', 'mB', 'mL', 'mP', 'mF', 'mG', 'mTxB']
+
+
+def extract_and_save_slopes(z_values, out_csv=None, weighted=False, catalog_csv=None, n_bins=8, binning=None,
+                            merge=False):
+    """
+    For each z in z_values, compute slopes mT, mB, mL, mP, mF, mG, mTxB
+    and write them to out_csv, together with their 1-sigma errors and the
+    chi^2 of every fit. All fits are solved in one batch.
+
+    Args:
+        z_values (list): Redshifts to fit.
+        out_csv (str): Output CSV. Defaults to `config.SLOPES_CSV`.
+        weighted (bool): Weight the bins by the standard errors of their means.
+        catalog_csv (str): Combined small-box catalog. Defaults to
+                           `config.SHAPEFINDERS_ALL_SMALL_BOX_CSV`.
+        n_bins (int): Number of volume bins per redshift.
+        binning (str): Volume binning strategy (see `stats.grouped_bin_edges`).
+                       Defaults to `config.BINNING_STRATEGY`.
+        merge (bool): Keep the rows of an existing out_csv for the redshifts
+                      that were not refit, instead of replacing the file.
+
+    Returns:
+        pd.DataFrame: The slopes, one row per redshift of z_values.
+    """
+    if out_csv is None:
+        out_csv = config.SLOPES_CSV
+    if catalog_csv is None:
+        catalog_csv = config.SHAPEFINDERS_ALL_SMALL_BOX_CSV
+    if binning is None:
+        binning = config.BINNING_STRATEGY
+
+    # Binned weighted means for every redshift at once
+    df = open_catalog(catalog_csv)
+    stats = grouped_binned_stats(df, group_col='z', vol_col='vol', n_bins=n_bins, strategy=binning)
+    index = build_snapshot_index(stats, 'z')
+    # Adaptive strategies may make more bins than requested
+    n_bins = max(n_bins, int(stats['bin'].max()) + 1 if len(stats) else 0)
+
+    # Stack (redshift, quantity, bin); bins missing at a redshift stay NaN
+    vol = np.full((len(z_values), 1, n_bins), np.nan)
+    means = np.full((len(z_values), len(SLOPE_QUANTITIES), n_bins), np.nan)
+    sems = np.full_like(means, np.nan)
+    for i, z in enumerate(z_values):
+        stats_z = snapshot(index, z)
+        bins = stats_z['bin'].to_numpy()
+        vol[i, 0, bins] = stats_z['vol_mean'].to_numpy()
+        means[i][:, bins] = stats_z[[f'{q}_mean' for q in SLOPE_QUANTITIES]].to_numpy().T
+        sems[i][:, bins] = (stats_z[[f'{q}_std' for q in SLOPE_QUANTITIES]].to_numpy()
+                            / np.sqrt(stats_z['count'].to_numpy())[:, None]).T
+
+    fit = batched_loglog_fit(vol, means, yerr=sems if weighted else None)
+    slope_err = np.sqrt(fit['cov'][..., 0, 0])
+
+    results = pd.DataFrame({'z': z_values})
+    for j, name in enumerate(SLOPE_NAMES):
+        results[name] = fit['slope'][:, j]
+    for j, name in enumerate(SLOPE_NAMES):
+        results[f'{name}_err'] = slope_err[:, j]
+        results[f'{name}_chi2'] = fit['chi2'][:, j]
+
+    for row in results.itertuples():
+        print(f"Slopes at z={row.z:.3f}: mT={row.mT:.3f}, mB={row.mB:.3f}, mL={row.mL:.3f}, "
+              f"mP={row.mP:.3f}, mF={row.mF:.3f}, mG={row.mG:.3f}, mTxB={row.mTxB:.3f}")
+
+    ensure_folder(os.path.dirname(os.path.abspath(out_csv)))
+    table = _merge_slopes(results, out_csv) if merge else results
+    table.to_csv(out_csv, index=False)
+    print(f"Wrote {'the refit' if merge else 'all'} slopes to {out_csv}")
+    return results
+
+
+def _merge_slopes(results, out_csv):
+    """The slopes of an existing out_csv with the rows of the refit redshifts replaced by results, sorted by z."""
+    if not os.path.exists(out_csv):
+        return results
+    existing = pd.read_csv(out_csv, float_precision='round_trip')
+    refit = np.isin(canonical_redshift(existing['z'].to_numpy()), canonical_redshift(results['z'].to_numpy()))
+    merged = pd.concat([existing[~refit], results], ignore_index=True)
+    return merged.sort_values('z', kind='stable', ignore_index=True)
@@ -0,0 +1,84 @@
+# src/snapshots.py
+
+import numpy as np
+import pandas as pd
+
+# Redshifts are compared after rounding to this many decimals, which absorbs
+# the float noise between tables written by different tools (CD, EoR and
+# sub-box catalogs) while keeping snapshots apart
+REDSHIFT_DECIMALS = 5
+
+
+def canonical_redshift(z, decimals=REDSHIFT_DECIMALS):
+    """Canonical snapshot key(s) of one redshift or an array of redshifts."""
+    if np.ndim(z) == 0:
+        return float(np.round(float(z), decimals))
+    return np.round(np.asarray(z, dtype=np.float64), decimals)
+
+
+def build_snapshot_index(df, col='z', decimals=REDSHIFT_DECIMALS):
+    """
+    Sorts a catalog by canonical redshift so that every snapshot is a
+    contiguous block of rows, and records where each block starts and ends.
+
+    Rows keep their original order within a snapshot (stable sort), so a
+    snapshot slice holds the same rows, in the same order, as a boolean
+    `df[df[col] == z]` selection.
+
+    Args:
+        df (pd.DataFrame): Catalog with a redshift column.
+        col (str): Redshift column, e.g. 'z' or 'redshift'.
+        decimals (int): Rounding that defines the canonical key.
+
+    Returns:
+        dict: 'table' (the sorted catalog with a fresh RangeIndex), 'z' (the
+              sorted canonical redshifts), 'offsets' (row offsets, one more
+              than the number of snapshots), 'codes' (snapshot number of
+              every row) and 'lookup' (canonical redshift -> snapshot number).
+    """
+    keys = canonical_redshift(df[col].to_numpy(), decimals)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    z_values, starts = np.unique(sorted_keys, return_index=True)
+    offsets = np.append(starts, len(sorted_keys))
+    return snapshot_index_from_offsets(df.iloc[order].reset_index(drop=True), col,
+                                       z_values, offsets, decimals)
+
+
+def snapshot_index_from_offsets(table, col, z_values, offsets, decimals=REDSHIFT_DECIMALS):
+    """
+    Snapshot index of a table that is already sorted by canonical redshift,
+    from its snapshot redshifts and row offsets (e.g. as stored by `columnar`).
+    """
+    z_values = np.asarray(z_values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    return {
+        'table': table,
+        'column': col,
+        'decimals': decimals,
+        'z': z_values,
+        'offsets': offsets,
+        'codes': np.repeat(np.arange(len(z_values)), np.diff(offsets)),
+        'lookup': {float(z): i for i, z in enumerate(z_values)},
+    }
+
+
+def snapshot(index, z):
+    """
+    Rows of one snapshot as a contiguous slice of the sorted catalog, found
+    by a dictionary lookup of the canonical redshift. Unknown redshifts give
+    an empty frame with the catalog's columns.
+    """
+    i = index['lookup'].get(canonical_redshift(z, index['decimals']))
+    if i is None:
+        return index['table'].iloc[0:0]
+    return index['table'].iloc[index['offsets'][i]:index['offsets'][i + 1]]
+
+
+def snapshot_sums(index, value_col):
+    """
+    Per-snapshot sum of one column, like `df.groupby(col)[value_col].sum()`
+    but keyed by canonical redshift.
+    """
+    sums = index['table'][value_col].groupby(index['codes'], sort=False).sum()
+    return pd.Series(sums.to_numpy(), index=pd.Index(index['z'], name=index['column']), name=value_col)
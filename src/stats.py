@@ -0,0 +1,456 @@
+# src/stats.py
+
+import numpy as np
+import pandas as pd
+
+# Quantities computed from other catalog columns when they are requested
+DERIVED_QUANTITIES = {
+    'TxB': lambda df: df['T'].to_numpy() * df['B'].to_numpy(),
+}
+
+DEFAULT_QUANTITIES = ['vol', 'T', 'B', 'L', 'P', 'F', 'Genus', 'TxB']
+
+
+def grouped_log_bin_edges(vol, codes, n_groups, n_bins=8):
+    """
+    Per-group equivalent of `utils.bin_edges_for_vol`: n_bins+1 log-spaced
+    edges from each group's minimum to maximum volume.
+
+    Returns:
+        np.ndarray: Edges of shape (n_groups, n_bins + 1). Groups without rows get NaN.
+    """
+    v_min = np.full(n_groups, np.inf)
+    v_max = np.full(n_groups, -np.inf)
+    np.minimum.at(v_min, codes, vol)
+    np.maximum.at(v_max, codes, vol)
+    empty = ~np.isfinite(v_min)
+    v_min[empty] = np.nan
+    v_max[empty] = np.nan
+    return np.logspace(np.log10(v_min), np.log10(v_max), n_bins + 1, axis=-1)
+
+
+def assign_bins(vol, codes, edges):
+    """
+    Assigns every row to the bin [edges[g, b], edges[g, b+1]) of its group g.
+
+    The bin is first estimated from the log-spaced position of the volume and
+    then corrected against the actual edges, so membership is exactly that of
+    `(vol >= edges[b]) & (vol < edges[b + 1])` at O(N) cost.
+
+    Returns:
+        np.ndarray: Bin index per row, -1 for rows outside every bin.
+    """
+    n_bins = edges.shape[1] - 1
+    row_edges_lo = edges[codes, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_lo = np.log10(row_edges_lo)
+        log_step = (np.log10(edges[codes, -1]) - log_lo) / n_bins
+        guess = np.floor((np.log10(vol) - log_lo) / log_step)
+    guess = np.nan_to_num(guess, nan=0.0, posinf=n_bins - 1, neginf=0.0)
+    b = np.clip(guess, 0, n_bins - 1).astype(np.intp)
+
+    # Correct the estimate by at most one bin in either direction
+    b = np.where(vol < edges[codes, b], b - 1, b)
+    b = np.where(vol >= edges[codes, np.clip(b + 1, 0, n_bins)], b + 1, b)
+
+    b_safe = np.clip(b, 0, n_bins - 1)
+    inside = ((b >= 0) & (b < n_bins)
+              & (vol >= edges[codes, b_safe]) & (vol < edges[codes, b_safe + 1]))
+    return np.where(inside, b, -1)
+
+
+def assign_bins_to_edges(vol, codes, edges):
+    """
+    Assigns every row to the bin [edges[g, b], edges[g, b+1]) of its group g
+    for arbitrary increasing edges, such as those of `grouped_bin_edges`.
+
+    Edges may repeat (empty bins) and rows of a group may be padded with NaN
+    after its last edge. The bin is the number of edges not above the
+    volume, minus one, counted in one vectorized pass per edge column.
+
+    Returns:
+        np.ndarray: Bin index per row, -1 for rows outside every bin.
+    """
+    n_bins = edges.shape[1] - 1
+    b = np.full(len(vol), -1, dtype=np.intp)
+    for j in range(n_bins + 1):
+        b += vol >= edges[codes, j]
+    b_safe = np.clip(b, 0, n_bins - 1)
+    inside = (b >= 0) & (b < n_bins) & (vol < edges[codes, b_safe + 1])
+    return np.where(inside, b, -1)
+
+
+def _group_order(codes, n_groups):
+    """
+    Row order grouping the rows by group, and the offsets of every group in
+    it. Group codes fit in 16 bits for any realistic number of snapshots, for
+    which numpy's stable sort is a linear-time radix sort.
+    """
+    small = codes.astype(np.uint16) if n_groups <= np.iinfo(np.uint16).max else codes
+    order = np.argsort(small, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=n_groups))])
+    return order, offsets
+
+
+def _compact_edges(edges, keep):
+    """
+    Keeps the selected edges of every group, moved to the front of its row
+    in order, and pads the rest of the row with NaN.
+    """
+    order = np.argsort(~keep, axis=1, kind='stable')
+    out = np.take_along_axis(edges, order, axis=1)
+    out[np.arange(edges.shape[1]) >= keep.sum(axis=1)[:, None]] = np.nan
+    return out
+
+
+def grouped_quantile_bin_edges(vol, codes, n_groups, n_bins=8):
+    """
+    Equal-count bin edges per group: the minimum volume, the volumes of rank
+    k * n / n_bins and the maximum volume of each group, found by linear-time
+    selection (`np.partition`) rather than sorting.
+
+    Volumes shared by many clusters give repeated edges, i.e. empty bins.
+
+    Returns:
+        np.ndarray: Edges of shape (n_groups, n_bins + 1). Groups without rows get NaN.
+    """
+    edges = np.full((n_groups, n_bins + 1), np.nan)
+    order, offsets = _group_order(codes, n_groups)
+    for g in range(n_groups):
+        v = vol[order[offsets[g]:offsets[g + 1]]]
+        if len(v) == 0:
+            continue
+        kth = np.unique(np.concatenate([[0, len(v) - 1], np.arange(1, n_bins) * len(v) // n_bins]))
+        part = np.partition(v, kth)
+        edges[g] = part[np.concatenate([[0], np.arange(1, n_bins) * len(v) // n_bins, [len(v) - 1]])]
+    return edges
+
+
+def merge_sparse_bins(edges, counts, min_count):
+    """
+    Merges adjacent bins of every group, from the smallest volumes up, until
+    each holds at least min_count rows; a sparse remainder at the large-volume
+    end joins the last full bin. Vectorized over groups.
+
+    Args:
+        edges (np.ndarray): Edges of shape (n_groups, n_bins + 1).
+        counts (np.ndarray): Rows per bin, shape (n_groups, n_bins).
+        min_count (int): Minimum number of rows per merged bin.
+
+    Returns:
+        np.ndarray: Merged edges, same shape, padded with NaN (see `assign_bins_to_edges`).
+    """
+    n_groups, n_bins = counts.shape
+    keep = np.zeros((n_groups, n_bins + 1), dtype=bool)
+    keep[:, 0] = keep[:, -1] = True
+    acc = np.zeros(n_groups)
+    for j in range(n_bins - 1):
+        acc += counts[:, j]
+        close = acc >= min_count
+        keep[:, j + 1] = close
+        acc[close] = 0
+    # A remainder below min_count joins the bin before it
+    remainder = acc + counts[:, -1]
+    interior = keep[:, 1:-1]
+    has_interior = interior.any(axis=1)
+    last = n_bins - 1 - np.argmax(interior[:, ::-1], axis=1)
+    drop = (remainder < min_count) & has_interior
+    keep[np.nonzero(drop)[0], last[drop]] = False
+    return _compact_edges(edges, keep)
+
+
+def bayesian_block_edges(edges, counts, p0=0.05):
+    """
+    Bayesian-blocks partition (Scargle et al. 2013, binned event data) of a
+    fine histogram of every group: adjacent fine bins are joined into blocks
+    of roughly constant density in log volume, with the block count set by
+    the false-alarm probability p0 rather than by hand.
+
+    The dynamic programme runs over the fine bins, vectorized over groups,
+    so its cost does not depend on the number of rows.
+
+    Args:
+        edges (np.ndarray): Fine log-spaced edges, shape (n_groups, n_fine + 1).
+        counts (np.ndarray): Rows per fine bin, shape (n_groups, n_fine).
+        p0 (float): False-alarm probability of a change point.
+
+    Returns:
+        np.ndarray: Block edges, same shape, padded with NaN (see `assign_bins_to_edges`).
+    """
+    n_groups, n_fine = counts.shape
+    n_total = np.maximum(counts.sum(axis=1), 1)
+    ncp_prior = 4 - np.log(73.53 * p0 * n_total ** -0.478)
+    cum = np.concatenate([np.zeros((n_groups, 1)), np.cumsum(counts, axis=1)], axis=1)
+    best = np.zeros((n_groups, n_fine + 1))
+    start = np.zeros((n_groups, n_fine + 1), dtype=np.intp)
+    for r in range(1, n_fine + 1):
+        # Blocks made of the fine bins l..r-1, for every l
+        n_k = cum[:, r:r + 1] - cum[:, :r]
+        width = r - np.arange(r)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fitness = np.where(n_k > 0, n_k * (np.log(n_k) - np.log(width)), 0.0)
+        total = best[:, :r] + fitness - ncp_prior[:, None]
+        start[:, r] = np.argmax(total, axis=1)
+        best[:, r] = total[np.arange(n_groups), start[:, r]]
+
+    # Walk the change points back from the last fine bin
+    keep = np.zeros((n_groups, n_fine + 1), dtype=bool)
+    pos = np.full(n_groups, n_fine)
+    rows = np.arange(n_groups)
+    for _ in range(n_fine):
+        keep[rows, pos] = True
+        pos = np.where(pos > 0, start[rows, pos], 0)
+    keep[:, 0] = True
+    return _compact_edges(edges, keep)
+
+
+def grouped_bin_edges(vol, codes, n_groups, n_bins=8, strategy='log', min_count=None):
+    """
+    Volume bin edges of every group for a binning strategy:
+
+    - 'log': n_bins log-spaced bins between the group's extremes.
+    - 'equal_count': n_bins bins holding about the same number of rows.
+    - 'min_count': n_bins log-spaced bins, merged until every bin holds at
+      least min_count rows (default `config.MIN_BIN_COUNT`).
+    - 'bayesian_blocks': adaptive blocks of a fine log histogram with
+      `config.BAYESIAN_BLOCKS_FINE_BINS` bins.
+
+    Returns:
+        np.ndarray: Edges of shape (n_groups, n_edges). Apart from 'log',
+                    rows may be padded with NaN and need `assign_bins_to_edges`.
+    """
+    from . import config
+    if strategy == 'log':
+        return grouped_log_bin_edges(vol, codes, n_groups, n_bins)
+    if strategy == 'equal_count':
+        return grouped_quantile_bin_edges(vol, codes, n_groups, n_bins)
+    if strategy not in ('min_count', 'bayesian_blocks'):
+        raise ValueError(f"Unknown binning strategy: {strategy}")
+
+    if strategy == 'bayesian_blocks':
+        n_bins = config.BAYESIAN_BLOCKS_FINE_BINS
+    edges = grouped_log_bin_edges(vol, codes, n_groups, n_bins)
+    bins = assign_bins(vol, codes, edges)
+    inside = bins >= 0
+    counts = np.bincount(codes[inside] * n_bins + bins[inside],
+                         minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+    if strategy == 'min_count':
+        return merge_sparse_bins(edges, counts, config.MIN_BIN_COUNT if min_count is None else min_count)
+    return bayesian_block_edges(edges, counts, config.BAYESIAN_BLOCKS_P0)
+
+
+def volume_bin_edges(vol, n_bins=8, strategy='log'):
+    """
+    Bin edges of a single snapshot's volumes for a binning strategy (see
+    `grouped_bin_edges`), as an increasing array without padding or repeats.
+    """
+    vol = np.asarray(vol, dtype=np.float64)
+    edges = grouped_bin_edges(vol, np.zeros(len(vol), dtype=np.intp), 1, n_bins, strategy)[0]
+    return np.unique(edges[np.isfinite(edges)])
+
+
+def group_codes(column):
+    """
+    Sorted distinct values of a grouping column and the group index of every
+    row. Categorical columns (e.g. snapshot codes) are used as they are,
+    dropping categories without rows.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        used, codes = np.unique(column.cat.codes.to_numpy(), return_inverse=True)
+        return column.cat.categories.to_numpy()[used], codes
+    return np.unique(column.to_numpy(), return_inverse=True)
+
+
+def bin_catalog(df, group_col='z', vol_col='vol', n_bins=8, edges=None, strategy='log'):
+    """
+    Assigns every row of a catalog to a (group, volume bin) pair.
+
+    Rows with non-positive volume are dropped. Each group gets the bins of
+    the binning strategy (see `grouped_bin_edges`), by default `n_bins`
+    log-spaced bins between its minimum and maximum volume, unless explicit
+    edges are given for it.
+
+    Args:
+        df (pd.DataFrame): Catalog with one row per cluster.
+        group_col (str): Column defining the groups, e.g. 'z' or 'redshift'.
+        vol_col (str): Volume column used for binning.
+        n_bins (int): Number of bins per group.
+        edges (dict): Optional explicit bin edges per group value.
+        strategy (str): 'log', 'equal_count', 'min_count' or 'bayesian_blocks'.
+
+    Returns:
+        tuple: (df_pos, group_values, group_edges, flat, inside) where df_pos
+               is the catalog restricted to positive volumes, group_edges has
+               shape (n_groups, n_bins + 1) (more columns for bayesian
+               blocks; unused edges are NaN), and flat holds the bin id
+               `group * n_bins + bin` of the rows selected by the mask inside.
+    """
+    df = df[df[vol_col] > 0]
+    vol = df[vol_col].to_numpy(dtype=np.float64)
+    group_values, codes = group_codes(df[group_col])
+    n_groups = len(group_values)
+
+    if edges is not None:
+        n_bins = len(next(iter(edges.values()))) - 1
+    group_edges = grouped_bin_edges(vol, codes, n_groups, n_bins, strategy)
+    n_bins = group_edges.shape[1] - 1
+    if edges is not None:
+        for g, value in enumerate(group_values):
+            if value in edges:
+                group_edges[g] = edges[value]
+
+    if not n_groups:
+        bins = np.empty(0, dtype=np.intp)
+    elif strategy == 'log' and edges is None:
+        bins = assign_bins(vol, codes, group_edges)
+    else:
+        bins = assign_bins_to_edges(vol, codes, group_edges)
+    inside = bins >= 0
+    flat = codes[inside] * n_bins + bins[inside]
+    return df, group_values, group_edges, flat, inside
+
+
+def quantity_values(df, q):
+    """Values of a catalog column, or of a derived quantity such as 'TxB'."""
+    if q in DERIVED_QUANTITIES and q not in df.columns:
+        return np.asarray(DERIVED_QUANTITIES[q](df), dtype=np.float64)
+    return df[q].to_numpy(dtype=np.float64)
+
+
+def quantile_label(p):
+    """Column suffix of a quantile, e.g. 'p16' for 0.16."""
+    return f'p{100 * p:g}'
+
+
+def check_band_quantiles(lo, hi):
+    """Raises ValueError unless (lo, hi) is a quantile range around the median, 0 <= lo <= 0.5 <= hi <= 1."""
+    if not 0 <= lo <= 0.5 <= hi <= 1:
+        raise ValueError(f"Band quantiles must satisfy 0 <= LO <= 0.5 <= HI <= 1, got {lo:g} and {hi:g}")
+
+
+def binned_weighted_quantiles(values, weights, bins, n_bins, probs):
+    """
+    Weighted quantiles of values within every bin, for all bins at once: one
+    sort by (bin, value) and one search of the cumulative weights per
+    quantile. A quantile p of a bin is its smallest value whose cumulative
+    weight reaches p times the bin's total weight (the weighted inverted
+    CDF, as `np.quantile(..., weights=w, method='inverted_cdf')`).
+
+    Args:
+        values, weights (np.ndarray): One entry per row.
+        bins (np.ndarray): Bin index (0 to n_bins - 1) of every row.
+        n_bins (int): Number of bins.
+        probs (list): Quantile probabilities in [0, 1].
+
+    Returns:
+        np.ndarray: Quantiles of shape (len(probs), n_bins), NaN for empty bins.
+    """
+    order = np.lexsort((values, bins))
+    v, cw = values[order], np.cumsum(weights[order])
+    counts = np.bincount(bins, minlength=n_bins)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    occupied = counts > 0
+    base = np.where(starts > 0, cw[np.maximum(starts - 1, 0)], 0.0)[occupied] if len(cw) else np.zeros(0)
+    total = cw[ends[occupied] - 1] - base
+    out = np.full((len(probs), n_bins), np.nan)
+    for i, p in enumerate(probs):
+        idx = np.searchsorted(cw, base + p * total, side='left')
+        out[i, occupied] = v[np.clip(idx, starts[occupied], ends[occupied] - 1)]
+    return out
+
+
+def _robust_columns(df, quantities, flat, inside, w, n_groups, n_bins, probs):
+    """
+    Weighted median, MAD (weighted median absolute deviation from the
+    weighted median) and the quantiles probs of every quantity, per
+    (group, bin) id of flat. Rows are sorted one snapshot at a time.
+    """
+    size = n_groups * n_bins
+    order, offsets = _group_order(flat // n_bins, n_groups)
+    values = {q: quantity_values(df, q)[inside] for q in quantities}
+    out = {q: np.full((len(probs) + 2, size), np.nan) for q in quantities}
+    for g in range(n_groups):
+        rows = order[offsets[g]:offsets[g + 1]]
+        if len(rows) == 0:
+            continue
+        bins, w_g = flat[rows] - g * n_bins, w[rows]
+        cols = slice(g * n_bins, (g + 1) * n_bins)
+        for q in quantities:
+            x = values[q][rows]
+            result = binned_weighted_quantiles(x, w_g, bins, n_bins, [0.5] + list(probs))
+            median = result[0]
+            mad = binned_weighted_quantiles(np.abs(x - median[bins]), w_g, bins, n_bins, [0.5])[0]
+            out[q][0, cols], out[q][1, cols], out[q][2:, cols] = median, mad, result[1:]
+    return out
+
+
+def grouped_binned_stats(df, group_col='z', vol_col='vol', quantities=None,
+                         n_bins=8, edges=None, weighted=True, strategy='log', quantile_probs=None):
+    """
+    Computes binned means and standard deviations of several quantities for
+    every group (normally every redshift) of a catalog in one vectorized pass.
+
+    Each group gets its own volume bins, by default `n_bins` log-spaced bins
+    between the group's minimum and maximum volume as in
+    `utils.bin_edges_for_vol`; see `grouped_bin_edges` for the other
+    strategies. Rows with non-positive volume are ignored.
+
+    Args:
+        df (pd.DataFrame): Catalog with one row per cluster.
+        group_col (str): Column defining the groups, e.g. 'z' or 'redshift'.
+        vol_col (str): Volume column used for binning and as the weight.
+        quantities (list): Columns (or keys of DERIVED_QUANTITIES) to summarise.
+                           Defaults to DEFAULT_QUANTITIES.
+        n_bins (int): Number of bins per group.
+        edges (dict): Optional explicit bin edges per group value, overriding
+                      the strategy's edges for those groups.
+        weighted (bool): Volume-weighted statistics if True, plain ones otherwise.
+        strategy (str): Binning strategy, see `grouped_bin_edges`.
+        quantile_probs (list): If given, also compute the weighted median,
+                               MAD and these weighted quantiles of every
+                               quantity (see `binned_weighted_quantiles`),
+                               robust to single dominant clusters.
+
+    Returns:
+        pd.DataFrame: One row per non-empty (group, bin), sorted by group then
+                      bin, with columns group_col, 'bin', 'vol_lo', 'vol_hi',
+                      'count' and '<q>_mean', '<q>_std' for every quantity,
+                      plus '<q>_median', '<q>_mad' and '<q>_p<100 p>' with
+                      quantile_probs.
+    """
+    if quantities is None:
+        quantities = DEFAULT_QUANTITIES
+
+    df, group_values, group_edges, flat, inside = bin_catalog(df, group_col, vol_col, n_bins, edges, strategy)
+    n_groups, n_bins = group_edges.shape[0], group_edges.shape[1] - 1
+    size = n_groups * n_bins
+
+    w = df[vol_col].to_numpy(dtype=np.float64)[inside] if weighted else np.ones(flat.size)
+    counts = np.bincount(flat, minlength=size)
+    sum_w = np.bincount(flat, weights=w, minlength=size)
+    occupied = counts > 0
+
+    out = {
+        group_col: np.repeat(group_values, n_bins)[occupied],
+        'bin': np.tile(np.arange(n_bins), n_groups)[occupied],
+        'vol_lo': group_edges[:, :-1].ravel()[occupied],
+        'vol_hi': group_edges[:, 1:].ravel()[occupied],
+        'count': counts[occupied],
+    }
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for q in quantities:
+            x = quantity_values(df, q)[inside]
+            mean = np.bincount(flat, weights=w * x, minlength=size) / sum_w
+            # Two-pass variance, like utils.weighted_std
+            var = np.bincount(flat, weights=w * (x - mean[flat]) ** 2, minlength=size) / sum_w
+            out[f'{q}_mean'] = mean[occupied]
+            out[f'{q}_std'] = np.sqrt(var[occupied])
+    if quantile_probs is not None:
+        robust = _robust_columns(df, quantities, flat, inside, w, n_groups, n_bins, quantile_probs)
+        for q in quantities:
+            out[f'{q}_median'] = robust[q][0, occupied]
+            out[f'{q}_mad'] = robust[q][1, occupied]
+            for i, p in enumerate(quantile_probs):
+                out[f'{q}_{quantile_label(p)}'] = robust[q][2 + i, occupied]
+    return pd.DataFrame(out)
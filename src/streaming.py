@@ -0,0 +1,156 @@
+# src/streaming.py
+
+import numpy as np
+import pandas as pd
+from . import config
+from .stats import DEFAULT_QUANTITIES, assign_bins, quantity_values
+from .snapshots import REDSHIFT_DECIMALS, canonical_redshift
+
+# In-memory size of a parsed chunk relative to its raw DataFrame footprint,
+# leaving room for the masks and temporaries created while processing it
+_CHUNK_OVERHEAD = 4
+_SAMPLE_ROWS = 1000
+
+
+def chunk_rows_for_budget(csv_path, budget_mb=None, usecols=None):
+    """
+    Number of CSV rows per chunk that keeps processing within a memory budget.
+
+    The per-row footprint is measured on a small sample of the file.
+
+    Args:
+        csv_path (str): CSV file to be streamed.
+        budget_mb (float): Peak memory budget in MB. Defaults to `config.MEMORY_BUDGET_MB`.
+        usecols (list): Columns that will be read.
+    """
+    if budget_mb is None:
+        budget_mb = config.MEMORY_BUDGET_MB
+    sample = pd.read_csv(csv_path, nrows=_SAMPLE_ROWS, usecols=usecols)
+    bytes_per_row = sample.memory_usage(deep=True, index=False).sum() / max(len(sample), 1)
+    return max(_SAMPLE_ROWS, int(budget_mb * 2 ** 20 / (bytes_per_row * _CHUNK_OVERHEAD)))
+
+
+def iter_csv_chunks(csv_path, budget_mb=None, usecols=None):
+    """Yields a CSV as consecutive DataFrame chunks sized for the memory budget."""
+    chunksize = chunk_rows_for_budget(csv_path, budget_mb, usecols)
+    with pd.read_csv(csv_path, chunksize=chunksize, usecols=usecols) as reader:
+        for chunk in reader:
+            chunk.columns = chunk.columns.str.strip()
+            yield chunk
+
+
+def stream_group_sums(csv_path, group_col, value_col, budget_mb=None):
+    """
+    Per-group sum of one column, e.g. the total cluster volume per redshift.
+
+    Returns:
+        pd.Series: Sums indexed by sorted group value, like `groupby(...).sum()`.
+    """
+    total = None
+    for chunk in iter_csv_chunks(csv_path, budget_mb, usecols=[group_col, value_col]):
+        part = chunk.groupby(group_col)[value_col].sum()
+        total = part if total is None else total.add(part, fill_value=0)
+    if total is None:
+        return pd.Series(dtype=float, name=value_col)
+    return total.sort_index()
+
+
+def stream_unique(csv_path, col, budget_mb=None):
+    """Sorted unique values of one column."""
+    values = set()
+    for chunk in iter_csv_chunks(csv_path, budget_mb, usecols=[col]):
+        values.update(chunk[col].unique())
+    return sorted(values)
+
+
+def stream_select_redshifts(csv_path, z_values, budget_mb=None, col='redshift',
+                            decimals=REDSHIFT_DECIMALS):
+    """
+    Reads only the rows whose canonical redshift (see `snapshots`) is one of
+    z_values. Memory is bounded by the selected snapshots plus one chunk.
+    """
+    wanted = canonical_redshift(np.asarray(list(z_values), dtype=float), decimals)
+    parts = [chunk[np.isin(canonical_redshift(chunk[col].to_numpy(), decimals), wanted)]
+             for chunk in iter_csv_chunks(csv_path, budget_mb)]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+def stream_binned_stats(csv_path, group_col='z', vol_col='vol', quantities=None,
+                        n_bins=8, budget_mb=None):
+    """
+    Out-of-core version of `stats.grouped_binned_stats` with log-spaced bins.
+
+    Three passes over the file, each holding a single chunk in memory:
+    per-group volume range (for the bin edges), weighted sums (for the
+    means), and weighted squared deviations from the means (for the stds,
+    using the same two-pass formula as the in-memory engine).
+
+    Returns:
+        pd.DataFrame: Same layout as `stats.grouped_binned_stats`.
+    """
+    if quantities is None:
+        quantities = DEFAULT_QUANTITIES
+
+    def positive_chunks():
+        for chunk in iter_csv_chunks(csv_path, budget_mb):
+            yield chunk[chunk[vol_col] > 0]
+
+    # Pass 1: volume range of every group
+    v_min, v_max = None, None
+    for chunk in positive_chunks():
+        grouped = chunk.groupby(group_col)[vol_col]
+        lo, hi = grouped.min(), grouped.max()
+        if v_min is None:
+            v_min, v_max = lo, hi
+        else:
+            v_min = v_min.combine(lo, min, fill_value=np.inf)
+            v_max = v_max.combine(hi, max, fill_value=-np.inf)
+    if v_min is None or v_min.empty:
+        return pd.DataFrame()
+    v_min, v_max = v_min.sort_index(), v_max.sort_index()
+    group_values = v_min.index.to_numpy()
+    edges = np.logspace(np.log10(v_min.to_numpy()), np.log10(v_max.to_numpy()), n_bins + 1, axis=-1)
+    n_groups = len(group_values)
+    size = n_groups * n_bins
+
+    def binned_chunks():
+        for chunk in positive_chunks():
+            codes = np.searchsorted(group_values, chunk[group_col].to_numpy())
+            bins = assign_bins(chunk[vol_col].to_numpy(dtype=np.float64), codes, edges)
+            inside = bins >= 0
+            yield chunk[inside], codes[inside] * n_bins + bins[inside]
+
+    # Pass 2: counts and weighted sums
+    counts = np.zeros(size, dtype=np.int64)
+    sum_w = np.zeros(size)
+    sum_wx = np.zeros((len(quantities), size))
+    for chunk, flat in binned_chunks():
+        w = chunk[vol_col].to_numpy(dtype=np.float64)
+        counts += np.bincount(flat, minlength=size)
+        sum_w += np.bincount(flat, weights=w, minlength=size)
+        for j, q in enumerate(quantities):
+            sum_wx[j] += np.bincount(flat, weights=w * quantity_values(chunk, q), minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sum_wx / sum_w
+
+    # Pass 3: weighted squared deviations from the bin means
+    sum_wdev = np.zeros((len(quantities), size))
+    for chunk, flat in binned_chunks():
+        w = chunk[vol_col].to_numpy(dtype=np.float64)
+        for j, q in enumerate(quantities):
+            dev = quantity_values(chunk, q) - mean[j, flat]
+            sum_wdev[j] += np.bincount(flat, weights=w * dev ** 2, minlength=size)
+
+    occupied = counts > 0
+    out = {
+        group_col: np.repeat(group_values, n_bins)[occupied],
+        'bin': np.tile(np.arange(n_bins), n_groups)[occupied],
+        'vol_lo': edges[:, :-1].ravel()[occupied],
+        'vol_hi': edges[:, 1:].ravel()[occupied],
+        'count': counts[occupied],
+    }
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for j, q in enumerate(quantities):
+            out[f'{q}_mean'] = mean[j, occupied]
+            out[f'{q}_std'] = np.sqrt(sum_wdev[j] / sum_w)[occupied]
+    return pd.DataFrame(out)
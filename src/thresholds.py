@@ -0,0 +1,77 @@
+# src/thresholds.py
+
+import os
+import re
+from . import config
+
+# Sub-box shapefinder files of a threshold, below its outputN directory
+SMALL_BOX_SUBDIR = os.path.join('Shapefinder_stat', 'small_box')
+
+_OUTPUT_PATTERN = re.compile(r'^output(\d+)$')
+_PREFIX_PATTERN = re.compile(r'^(.*?)(\d+)$')
+
+
+def split_prefix(region_prefix):
+    """('CD_OD', 1) for 'CD_OD1': region name and threshold of a file prefix."""
+    match = _PREFIX_PATTERN.match(region_prefix)
+    if match is None:
+        return region_prefix, 1
+    return match.group(1), int(match.group(2))
+
+
+def threshold_prefix(region_prefix, threshold):
+    """File prefix of a region at another threshold, e.g. 'CD_OD3' for ('CD_OD1', 3)."""
+    return f'{split_prefix(region_prefix)[0]}{threshold}'
+
+
+def discover_thresholds(region_dirs=None):
+    """
+    Finds the outputN threshold trees of every region that hold sub-box
+    shapefinder files.
+
+    Args:
+        region_dirs (dict): Region prefix -> raw region directory. Defaults
+                            to `config.REGION_RAW_DIRS`.
+
+    Returns:
+        list: (threshold, region_prefix, small_box_dir) tuples, sorted by
+              threshold and then in the order of region_dirs. The prefix
+              carries the threshold, e.g. 'CD_UD6' for output6.
+    """
+    if region_dirs is None:
+        region_dirs = config.REGION_RAW_DIRS
+    found = []
+    for order, (region_prefix, root) in enumerate(region_dirs.items()):
+        try:
+            entries = os.listdir(root)
+        except FileNotFoundError:
+            continue
+        for name in entries:
+            match = _OUTPUT_PATTERN.match(name)
+            small_box_dir = os.path.join(root, name, SMALL_BOX_SUBDIR)
+            if match and os.path.isdir(small_box_dir):
+                threshold = int(match.group(1))
+                found.append((threshold, order, threshold_prefix(region_prefix, threshold),
+                              small_box_dir + os.sep))
+    return [(threshold, prefix, path) for threshold, _, prefix, path in sorted(found)]
+
+
+def threshold_regions(configured, all_thresholds=None):
+    """
+    Sub-box trees to ingest and combine, as (base_directory, region_prefix)
+    pairs: the configured ones first (normally output1, e.g.
+    `config.OVERDENSE_BASE_DIR`), followed by every other discovered
+    threshold when all_thresholds is set.
+
+    Args:
+        configured (list): (base_directory, region_prefix) pairs.
+        all_thresholds (bool): Add the discovered thresholds. Defaults to
+                               `config.ALL_THRESHOLDS`.
+    """
+    if all_thresholds is None:
+        all_thresholds = config.ALL_THRESHOLDS
+    regions = list(configured)
+    if all_thresholds:
+        known = {prefix for _, prefix in regions}
+        regions += [(path, prefix) for _, prefix, path in discover_thresholds() if prefix not in known]
+    return regions
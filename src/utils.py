@@ -18,15 +18,78 @@ def loglog_fit(x, y):
     Perform a linear fit in log10‐space: log10(y) = m * log10(x) + c.
     Returns: (slope, intercept, mask) where mask = (x>0 & y>0).
     """
-    mask = (x > 0) & (y > 0)
-    logx = np.log10(x[mask])
-    logy = np.log10(y[mask])
-    if len(logx) < 2: # np.polyfit requires at least 2 points for degree 1 fit
+    fit = batched_loglog_fit(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    if fit['n'] < 2: # a line needs at least 2 points
         # Handle cases where there are insufficient valid data points
-        print(f"Warning: Insufficient valid data points ({len(logx)}) for log-log fit. Returning NaN slopes/intercepts.")
-        return np.nan, np.nan, mask
-    slope, intercept = np.polyfit(logx, logy, 1)
-    return slope, intercept, mask
+        print(f"Warning: Insufficient valid data points ({fit['n']}) for log-log fit. Returning NaN slopes/intercepts.")
+    return float(fit['slope']), float(fit['intercept']), fit['mask']
+
+def batched_loglog_fit(x, y, yerr=None, mask=None):
+    """
+    Fits log10(y) = m * log10(x) + c to many series at once, with a closed-form
+    (optionally weighted) least-squares solve over the last axis.
+
+    Points with non-positive or non-finite x or y (or error) are left out, so
+    series of different lengths can be stacked with NaN padding. Series with
+    fewer than 2 valid points get NaN results.
+
+    Args:
+        x (np.ndarray): Abscissae, broadcastable to y, e.g. (n_z, 1, n_bins).
+        y (np.ndarray): Ordinates, e.g. (n_z, n_quantities, n_bins).
+        yerr (np.ndarray): Optional 1-sigma errors of y. If given, points are
+                           weighted by 1/sigma^2 of log10(y) and the
+                           covariance uses these absolute errors; otherwise it
+                           is scaled by the residual variance like np.polyfit.
+        mask (np.ndarray): Optional boolean array of points to use.
+
+    Returns:
+        dict: 'slope', 'intercept', 'cov' (..., 2, 2) of (slope, intercept),
+              'chi2' (weighted sum of squared log residuals), 'dof' (n - 2),
+              'n' (points used) and 'mask' (points used, shaped like y).
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        valid = (x > 0) & (y > 0) & np.isfinite(x) & np.isfinite(y)
+        if mask is not None:
+            valid &= mask
+        logx = np.where(valid, np.log10(np.where(valid, x, 1.0)), 0.0)
+        logy = np.where(valid, np.log10(np.where(valid, y, 1.0)), 0.0)
+        if yerr is None:
+            w = valid.astype(float)
+        else:
+            # Error propagation to log10(y)
+            sigma = np.broadcast_to(np.asarray(yerr, dtype=float), y.shape) / (y * np.log(10))
+            valid &= np.isfinite(sigma) & (sigma > 0)
+            w = np.where(valid, 1.0 / np.where(valid, sigma, 1.0) ** 2, 0.0)
+
+        n = valid.sum(axis=-1)
+        sw = w.sum(axis=-1)
+        # Centring on the weighted mean keeps the normal equations well conditioned
+        x0 = (w * logx).sum(axis=-1) / sw
+        y0 = (w * logy).sum(axis=-1) / sw
+        dx = np.where(valid, logx - x0[..., None], 0.0)
+        dy = np.where(valid, logy - y0[..., None], 0.0)
+        sxx = (w * dx * dx).sum(axis=-1)
+        slope = (w * dx * dy).sum(axis=-1) / sxx
+        intercept = y0 - slope * x0
+        resid = dy - slope[..., None] * dx
+        chi2 = (w * resid ** 2).sum(axis=-1)
+        dof = n - 2
+
+        var_slope = 1.0 / sxx
+        cov = np.empty(slope.shape + (2, 2))
+        cov[..., 0, 0] = var_slope
+        cov[..., 0, 1] = cov[..., 1, 0] = -x0 * var_slope
+        cov[..., 1, 1] = 1.0 / sw + x0 ** 2 * var_slope
+        if yerr is None:
+            scale = np.where(dof > 0, chi2 / np.maximum(dof, 1), np.nan)
+            cov *= scale[..., None, None]
+
+    bad = n < 2
+    slope, intercept, chi2 = (np.where(bad, np.nan, a) for a in (slope, intercept, chi2))
+    cov[bad] = np.nan
+    return {'slope': slope, 'intercept': intercept, 'cov': cov,
+            'chi2': chi2, 'dof': dof, 'n': n, 'mask': valid}
 
 def get_common_redshifts(file1, file2, colname1='redshift', colname2='z'):
     """
@@ -54,5 +117,5 @@ def bin_edges_for_vol(vol_array, n_bins=8):
 def ensure_folder(path):
     """Helper to create folder if it doesn't exist."""
     import os
-    if not os.path.isdir(path):
-        os.makedirs(path)
+    # exist_ok: render workers may create the same folder concurrently
+    os.makedirs(path, exist_ok=True)
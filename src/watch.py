@@ -0,0 +1,401 @@
+# src/watch.py
+
+import io
+import os
+import time
+import pandas as pd
+from . import config
+from .data_processing import (_parse_snapshot_unit, _existing_snapshot_rows, clean_shapefinder_frame,
+                              create_control_file)
+from .cluster_stats import (CLUSTER_STAT_COLUMNS, CLUSTER_STAT_PREFIX, read_cluster_stat_file,
+                            _parse_cluster_stat_path)
+from .snapshots import canonical_redshift
+from .thresholds import split_prefix
+from .instrumentation import measure, write_report
+from .pipeline import (CONTROL_FILES, _SNAPSHOT_PATTERN, _configured_regions, _ingest_regions, _subbox_dirs,
+                       _entire_box_cluster_stat_files, _control_source, _combined_catalogs, _run_combine,
+                       _run_common_redshifts, _run_control_file, forget_cluster_stat_files)
+
+
+# --- Polling ---
+
+def _subbox_csv(subbox_dir, region_prefix, i):
+    return os.path.join(subbox_dir, f'{region_prefix}_SF_SB{i}.csv')
+
+
+def _signature(stat):
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _scan_snapshots(regions):
+    """
+    Lists the raw snapshot files of every sub-box of regions, as
+    process_subboxes does.
+
+    Returns:
+        dict: path -> (region_prefix, subbox, subbox_dir, redshift, (size, mtime_ns)),
+              with regions and sub-boxes in order.
+    """
+    found = {}
+    for base_directory, region_prefix in regions:
+        for i, subbox_dir in _subbox_dirs(base_directory):
+            for entry in sorted(os.scandir(subbox_dir), key=lambda e: e.name):
+                match = _SNAPSHOT_PATTERN.search(entry.name)
+                if match and not entry.name.startswith(CLUSTER_STAT_PREFIX) and entry.is_file():
+                    found[entry.path] = (region_prefix, i, subbox_dir, float(match.group(1)),
+                                         _signature(entry.stat()))
+    return found
+
+
+def _csv_redshifts(csv_path):
+    """Canonical redshifts of the rows of a sub-box CSV, or an empty set if it does not exist."""
+    try:
+        f = open(csv_path, 'r')
+    except FileNotFoundError:
+        return set()
+    with f:
+        f.readline()
+        return {canonical_redshift(float(line.split(',', 1)[0])) for line in f if line.strip()}
+
+
+def initial_watch_state(regions=None):
+    """
+    What the existing outputs already hold: a raw snapshot file counts as
+    ingested when its sub-box CSV has rows of its redshift and is newer than
+    the file (and as rewritten when the CSV is older), an entire-box
+    Cluster_stat file when the control file of its region is newer.
+    Everything else is picked up by the first poll, so snapshots that landed
+    while nothing was watching are not missed.
+
+    Args:
+        regions (list): (base_directory, region_prefix) pairs to watch.
+                        Defaults to the ingest regions of the pipeline,
+                        rediscovered at every poll so that new outputN
+                        threshold trees are picked up as well.
+
+    Returns:
+        dict: Watch state for `watch_cycle`.
+    """
+    forget_cluster_stat_files()
+    files, csv_redshifts = {}, {}
+    snapshot_files = _scan_snapshots(regions or _ingest_regions())
+    for path, (region_prefix, i, subbox_dir, z, signature) in snapshot_files.items():
+        csv_path = _subbox_csv(subbox_dir, region_prefix, i)
+        if csv_path not in csv_redshifts:
+            csv_redshifts[csv_path] = _csv_redshifts(csv_path)
+        if canonical_redshift(z) in csv_redshifts[csv_path]:
+            # A file rewritten after its rows were ingested is known, but stale
+            files[path] = signature if signature[1] <= os.stat(csv_path).st_mtime_ns else None
+
+    cluster_stats, sources = {}, {}
+    for region_prefix, (sf_attr, cs_attr) in CONTROL_FILES.items():
+        try:
+            built = os.stat(getattr(config, cs_attr)).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        for path in _entire_box_cluster_stat_files(region_prefix):
+            signature = _signature(os.stat(path))
+            if signature[1] <= built:
+                cluster_stats[path] = signature
+        try:
+            sources[getattr(config, sf_attr)] = _signature(os.stat(getattr(config, sf_attr)))
+        except FileNotFoundError:
+            pass
+    return {'regions': regions, 'files': files, 'cluster_stats': cluster_stats, 'sources': sources}
+
+
+def _settled(signature):
+    """True once a file has not been written to for `config.WATCH_SETTLE_S` seconds."""
+    return time.time() - signature[1] / 1e9 >= config.WATCH_SETTLE_S
+
+
+# --- Incremental updates ---
+
+def _update_subbox_csv(region_prefix, i, subbox_dir, appended, replaced):
+    """
+    Adds parsed snapshots to a sub-box CSV: new snapshot files are appended,
+    the rows of rewritten ones (replaced maps their canonical redshifts to the
+    reparsed rows) are spliced in place of the old rows.
+
+    Args:
+        appended (list): (csv_body, header, n_rows) of new snapshot files.
+        replaced (dict): Canonical redshift -> (csv_body, header, n_rows).
+    """
+    csv_path = _subbox_csv(subbox_dir, region_prefix, i)
+    units = [unit for unit in appended + list(replaced.values()) if unit[2]]
+    existing = _existing_snapshot_rows(csv_path) if replaced else None
+    if existing is not None:
+        header, rows = existing
+        for z, (body, _, n_rows) in replaced.items():
+            rows[z] = (body, n_rows)
+        tmp_path = csv_path + '.tmp'
+        with open(tmp_path, 'w', newline='') as f:
+            f.write(header + os.linesep)
+            for body, _ in rows.values():
+                f.write(body)
+            for body, _, _ in appended:
+                f.write(body)
+        os.replace(tmp_path, csv_path)
+    elif units:
+        exists = os.path.exists(csv_path)
+        with open(csv_path, 'a', newline='') as f:
+            if not exists:
+                f.write(units[0][1] + os.linesep)
+            for body, _, _ in units:
+                f.write(body)
+    n_rows = sum(n for _, _, n in units)
+    if n_rows:
+        print(f"  - {region_prefix} subbox {i}: {n_rows} rows written to '{csv_path}'")
+
+
+def _cleaned_rows(units):
+    """Cleaned catalog rows of parsed snapshot files, read back as the combine step reads the CSVs."""
+    units = [unit for unit in units if unit[2]]
+    if not units:
+        return None
+    text = units[0][1] + '\n' + ''.join(body for body, _, _ in units)
+    return clean_shapefinder_frame(pd.read_csv(io.StringIO(text)))
+
+
+def _append_csv(df, path):
+    exists = os.path.exists(path)
+    df.to_csv(path, mode='a', index=False, header=not exists)
+
+
+def _append_to_catalogs(parsed):
+    """
+    Appends the cleaned rows of new snapshot files to the combined small-box
+    catalog and, with `config.ALL_THRESHOLDS`, the all-thresholds catalog.
+
+    Args:
+        parsed (list): ((region_prefix, subbox), parsed unit) pairs.
+    """
+    configured = {prefix for _, prefix in _configured_regions()}
+    for (region_prefix, i), units in _group_units(parsed).items():
+        cleaned = _cleaned_rows(units)
+        if cleaned is None:
+            continue
+        if region_prefix in configured:
+            _append_csv(cleaned, config.SHAPEFINDERS_ALL_SMALL_BOX_CSV)
+        if config.ALL_THRESHOLDS:
+            region, threshold = split_prefix(region_prefix)
+            _append_csv(cleaned.assign(region=region, threshold=threshold, subbox=i),
+                        config.SHAPEFINDERS_ALL_THRESHOLDS_CSV)
+
+
+def _group_units(parsed):
+    groups = {}
+    for (region_prefix, i), unit in parsed:
+        groups.setdefault((region_prefix, i), []).append(unit)
+    return groups
+
+
+def _update_common_redshifts(redshifts):
+    """Adds redshifts to `common_redshifts.txt`, which stays sorted and free of duplicates."""
+    path = config.COMMON_REDSHIFTS_TXT
+    try:
+        with open(path, 'r') as f:
+            listed = {float(l.strip()) for l in f if l.strip()}
+    except FileNotFoundError:
+        listed = set()
+    added = set(redshifts) - listed
+    if not added:
+        return []
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        for z in sorted(listed | added):
+            f.write(f"{z}\n")
+    print(f"Added {len(added)} redshift(s) to: {path}")
+    return sorted(added)
+
+
+def _merge_control_rows(output_cs_csv_path, ff_by_redshift):
+    """Sets the FF of some redshifts in an existing control file, keeping it sorted by redshift."""
+    # Round-trip parsing, so that the other rows are written back unchanged
+    df_control = pd.read_csv(output_cs_csv_path, float_precision='round_trip').set_index('redshift')['FF']
+    for z, ff in ff_by_redshift.items():
+        df_control.loc[z] = ff
+    df_control.sort_index().reset_index().to_csv(output_cs_csv_path, index=False)
+    print(f"Updated {len(ff_by_redshift)} redshift(s) of control file: {output_cs_csv_path}")
+
+
+def _update_control_files(state):
+    """
+    Brings the control files up to date: the FF of new or rewritten
+    entire-box Cluster_stat files is merged into the control file, which is
+    only rebuilt if it does not exist yet; a control file built from an
+    entire-box shapefinder catalog is rebuilt when the catalog changes.
+    """
+    ff_col = CLUSTER_STAT_COLUMNS.index('FF')
+    for region_prefix, (sf_attr, cs_attr) in CONTROL_FILES.items():
+        sf_csv, cs_csv = getattr(config, sf_attr), getattr(config, cs_attr)
+        if _control_source(region_prefix) == 'cluster_stats':
+            changed = {}
+            for path in _entire_box_cluster_stat_files(region_prefix):
+                signature = _signature(os.stat(path))
+                if state['cluster_stats'].get(path) != signature and _settled(signature):
+                    changed[path] = signature
+            if not changed:
+                continue
+            if not os.path.exists(cs_csv):
+                _run_control_file(region_prefix, sf_csv, cs_csv)
+                state['cluster_stats'].update(changed)
+                continue
+            ff_by_redshift = {}
+            for path, signature in changed.items():
+                state['cluster_stats'][path] = signature
+                try:
+                    values = read_cluster_stat_file(path)
+                except Exception as e:
+                    print(f"    - Error reading {os.path.basename(path)}: {e}")
+                    continue
+                if len(values) != 1:
+                    print(f"    - Skipping {os.path.basename(path)}: {len(values)} thresholds in one file")
+                    continue
+                z = _parse_cluster_stat_path(config.REGION_RAW_DIRS[region_prefix], path)[0]
+                ff_by_redshift[z] = values[0, ff_col]
+            if ff_by_redshift:
+                _merge_control_rows(cs_csv, ff_by_redshift)
+        else:
+            try:
+                signature = _signature(os.stat(sf_csv))
+            except FileNotFoundError:
+                continue
+            if state['sources'].get(sf_csv) != signature and _settled(signature):
+                create_control_file(sf_csv, cs_csv)
+                state['sources'][sf_csv] = signature
+
+
+def _replot_redshifts(redshifts, snapshot_files, parsed_by_path):
+    """
+    Recomputes the binned statistics, fits and figures of a few redshifts
+    from the snapshot files of those redshifts alone, so the cost does not
+    grow with the number of snapshots in the catalog.
+    """
+    from .analysis import snapshot_binned_stats, process_shapefinders_for_redshift
+    from .rendering import render_shapefinder_plots
+    configured = {prefix for _, prefix in _configured_regions()}
+    units = []
+    for path, (region_prefix, _, _, z, _) in snapshot_files.items():
+        if region_prefix in configured and canonical_redshift(z) in redshifts:
+            unit = parsed_by_path.get(path)
+            units.append(unit if unit is not None else _parse_snapshot_unit((path, z))[:3])
+    cleaned = _cleaned_rows(units)
+    if cleaned is None:
+        return
+    stats = snapshot_binned_stats(cleaned, errors=config.SHAPEFINDER_ERROR_METHOD)
+    results = [process_shapefinders_for_redshift(z, stats=stats) for z in sorted(redshifts)]
+    for _ in render_shapefinder_plots(results, workers=config.RENDER_WORKERS):
+        pass
+
+
+def watch_cycle(state):
+    """
+    One poll: ingests the raw snapshot files that are new or were rewritten
+    since the last poll, updates the sub-box CSVs, the combined catalogs,
+    `common_redshifts.txt` and the control files, and replots the redshifts
+    of the ingested snapshots.
+
+    New snapshot files are parsed with process_subboxes' parser and their
+    rows appended everywhere, so a poll only touches the new snapshots. A
+    rewritten file replaces the rows of its redshift in its sub-box CSV; the
+    combined catalogs have no sub-box column to splice by, so they are then
+    rebuilt with the combine stage.
+
+    Args:
+        state (dict): From `initial_watch_state`; updated in place.
+
+    Returns:
+        list: The canonical redshifts that were ingested.
+    """
+    forget_cluster_stat_files()
+    snapshot_files = _scan_snapshots(state['regions'] or _ingest_regions())
+    new, rewritten = [], []
+    for path, (region_prefix, i, subbox_dir, z, signature) in snapshot_files.items():
+        if state['files'].get(path) == signature or not _settled(signature):
+            continue
+        (rewritten if path in state['files'] else new).append(path)
+
+    _update_control_files(state)
+    if not new and not rewritten:
+        return []
+
+    start_time = time.perf_counter()
+    print(f"\nIngesting {len(new)} new and {len(rewritten)} rewritten snapshot file(s)")
+    rewritten_keys = {(snapshot_files[p][0], snapshot_files[p][1], canonical_redshift(snapshot_files[p][3]))
+                      for p in rewritten}
+    # A rewritten file reparses every file of its redshift in its sub-box, as ingest --z does
+    to_parse = [p for p, (region_prefix, i, _, z, _) in snapshot_files.items()
+                if p in new or (region_prefix, i, canonical_redshift(z)) in rewritten_keys]
+
+    parsed_by_path, by_subbox = {}, {}
+    for path in to_parse:
+        region_prefix, i, subbox_dir, z, signature = snapshot_files[path]
+        body, header, n_rows, error = _parse_snapshot_unit((path, z))
+        if error is not None:
+            print(f"    - Error processing {os.path.basename(path)}: {error}")
+        parsed_by_path[path] = (body, header, n_rows)
+        appended, replaced = by_subbox.setdefault((region_prefix, i, subbox_dir), ([], {}))
+        key = canonical_redshift(z)
+        if (region_prefix, i, key) in rewritten_keys:
+            previous = replaced.get(key, ('', header, 0))
+            replaced[key] = (previous[0] + body, previous[1] or header, previous[2] + n_rows)
+        else:
+            appended.append((body, header, n_rows))
+
+    for (region_prefix, i, subbox_dir), (appended, replaced) in by_subbox.items():
+        _update_subbox_csv(region_prefix, i, subbox_dir, appended, replaced)
+
+    if rewritten or not all(os.path.exists(p) for p in _combined_catalogs()):
+        _run_combine()
+        _run_common_redshifts()
+    else:
+        _append_to_catalogs([((snapshot_files[p][0], snapshot_files[p][1]), parsed_by_path[p]) for p in new])
+    for path in to_parse:
+        state['files'][path] = snapshot_files[path][4]
+
+    configured = {prefix for _, prefix in _configured_regions()}
+    redshifts = {canonical_redshift(snapshot_files[p][3]) for p in to_parse
+                 if snapshot_files[p][0] in configured and parsed_by_path[p][2]}
+    _update_common_redshifts(redshifts)
+    if redshifts:
+        _replot_redshifts(redshifts, snapshot_files, parsed_by_path)
+    elapsed = time.perf_counter() - start_time
+    print(f"Ingested {len(to_parse)} snapshot file(s) in {elapsed:.2f} s; updated redshifts: "
+          + (', '.join(f'{z:.3f}' for z in sorted(redshifts)) or 'none'))
+    return sorted(redshifts)
+
+
+def watch(interval=None, cycles=None):
+    """
+    Watches the raw sub-box directories and ingests SURFGEN snapshots as they
+    land, until interrupted (Ctrl-C) or after a number of polls.
+
+    Every poll costs a directory listing plus the work of the snapshots that
+    arrived since the last one (see `watch_cycle`), so the latency of a new
+    snapshot does not grow with the number already ingested. The pipeline's
+    recorded fingerprints are not updated: the next `main.py` run rebuilds
+    the catalogs and summary figures from the sub-box CSVs.
+
+    Args:
+        interval (float): Seconds between polls. Defaults to `config.WATCH_INTERVAL_S`.
+        cycles (int): Stop after this many polls; None watches forever.
+    """
+    if interval is None:
+        interval = config.WATCH_INTERVAL_S
+    config.ensure_output_dirs()
+    state = initial_watch_state()
+    print(f"Watching {len(_ingest_regions())} region threshold(s) every {interval:g} s "
+          f"({sum(1 for s in state['files'].values() if s)} snapshot files already ingested)")
+    n = 0
+    try:
+        while cycles is None or n < cycles:
+            with measure('watch.cycle'):
+                watch_cycle(state)
+            n += 1
+            if cycles is None or n < cycles:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    if config.INSTRUMENT:
+        write_report()